@@ -0,0 +1,60 @@
+"""Per-target timeouts and degraded thresholds learned from latency history.
+
+Fixed limits treat a site 5 ms away like a region 300 ms away. Each probe
+kind keeps a rolling window of every target's recent response times and,
+once it has enough samples, derives from their p99:
+
+    timeout     = p99 * ADAPTIVE_TIMEOUT_K,  between ADAPTIVE_TIMEOUT_MIN and the kind's default
+    degraded_ms = p99 * ADAPTIVE_DEGRADED_K, between ADAPTIVE_DEGRADED_MIN_MS and the timeout
+
+Fast targets then fail fast and slow-but-normal ones stop being flagged.
+"""
+import os
+import threading
+from collections import deque
+
+ADAPTIVE_TIMEOUT_K = float(os.environ.get("ADAPTIVE_TIMEOUT_K", "4"))
+ADAPTIVE_DEGRADED_K = float(os.environ.get("ADAPTIVE_DEGRADED_K", "2"))
+ADAPTIVE_TIMEOUT_MIN = float(os.environ.get("ADAPTIVE_TIMEOUT_MIN", "2"))  # seconds
+ADAPTIVE_DEGRADED_MIN_MS = int(os.environ.get("ADAPTIVE_DEGRADED_MIN_MS", "250"))
+ADAPTIVE_WINDOW = int(os.environ.get("ADAPTIVE_WINDOW", "200"))  # Samples kept per target
+ADAPTIVE_MIN_SAMPLES = 20
+
+
+class LatencyLimits:
+    """Learned timeout and degraded threshold for every target of one probe kind"""
+
+    def __init__(self, default_timeout, window=ADAPTIVE_WINDOW):
+        self.default_timeout = default_timeout  # seconds; also the upper bound
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}  # key -> deque of response times in ms
+
+    def observe(self, key, status):
+        """Learn from a result that was not a failure"""
+        if status.get("status") == "down" or status.get("response_time") is None:
+            return
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(status["response_time"])
+
+    def limits(self, key):
+        """Learned {"timeout", "degraded_ms", "p99_ms", "samples"}, or None until enough samples"""
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None or len(samples) < ADAPTIVE_MIN_SAMPLES:
+                return None
+            ordered = sorted(samples)
+        p99 = ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)]
+        timeout = min(max(p99 * ADAPTIVE_TIMEOUT_K / 1000, ADAPTIVE_TIMEOUT_MIN), self.default_timeout)
+        degraded_ms = min(max(int(p99 * ADAPTIVE_DEGRADED_K), ADAPTIVE_DEGRADED_MIN_MS), int(timeout * 1000))
+        return {"timeout": round(timeout, 2), "degraded_ms": degraded_ms, "p99_ms": p99, "samples": len(ordered)}
+
+    def stats(self):
+        """Learned limits for every target that has them"""
+        with self._lock:
+            keys = list(self._samples)
+        learned = {key: self.limits(key) for key in keys}
+        return {key: limits for key, limits in learned.items() if limits}
@@ -1,16 +1,36 @@
-from flask import Flask, render_template, jsonify, request, make_response
+from flask import Flask, render_template, jsonify, request
 import requests
 import time
-import dns.resolver
 import threading
 from datetime import datetime
-import json
+import hmac
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import sqlite3
-from ping3 import ping
+import signal
+import sys
 import socket
+from urllib.parse import urlsplit
 from endpoints import EC2_ENDPOINTS, AZURE_ENDPOINTS
+from probe_common import (
+    BROWSER_HEADERS, HTTP_PROBE_MAX_BYTES, HTTP_TIMEOUT, TCP_TIMEOUT,
+    classify_website, completed_at, probe_plan, tcp_status, icmp_status,
+)
+from async_probe import AsyncProbeEngine
+from dns_cache import dns_cache, address_family
+from tcp_multiplex import TCPMultiplexer, MultiplexProbeExecutor
+from icmp_probe import ICMPPinger, ICMPProbeExecutor
+from pipeline import ProbePipeline, ProbeKind
+from hedging import HedgePolicy
+from breaker import CircuitBreaker
+from adaptive_limits import LatencyLimits
+from retention import RetentionWorker
+from history_store import (
+    HistoryWriter, ReadPool, LegacyHistoryMigration, PHASE_COLUMNS, insert_checks, migrate, connect as connect_db,
+    history_page, parse_cursor, rollup_uptime, update_rollups, STATUSES, UPTIME_WINDOWS,
+)
+from scheduler import TargetScheduler
+from sharded import ShardSupervisor
+from distributed import Coordinator, COORDINATOR_TOKEN
+from http_pool import get_session, track_connections, tracked_connections, evict_idle_connections
 
 app = Flask(__name__)
 app.config.update(
@@ -23,43 +43,30 @@ app.config.update(
 DB_PATH = os.path.join(os.path.dirname(__file__), "status_history.db")
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            url TEXT,
-            status TEXT,
-            status_code TEXT,
-            response_time INTEGER,
-            checked_at TEXT
-        )
-        """
-    )
-    conn.commit()
+    conn = connect_db(DB_PATH)
+    migrate(conn)
     conn.close()
 
-def store_status(status: dict):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        """
-        INSERT INTO history (name, url, status, status_code, response_time, checked_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
+# Rows are queued and written in batches by one writer thread; routes read
+# through a pool of read-only connections (see history_store.py)
+history_writer = HistoryWriter(lambda: connect_db(DB_PATH), insert_checks, after_insert=update_rollups)
+read_pool = ReadPool(lambda: DB_PATH)
+history_migration = LegacyHistoryMigration(lambda: connect_db(DB_PATH))
+retention = RetentionWorker(lambda: connect_db(DB_PATH))
+
+def store_status(kind: str, status: dict):
+    history_writer.add(
         (
+            kind,
             status.get("name"),
-            status.get("url"),
+            # EC2 and Azure results carry their hostname in "ip"/"endpoint"
+            status.get("url") or status.get("ip") or status.get("endpoint"),
             status.get("status"),
             str(status.get("status_code")),
             status.get("response_time"),
-            status.get("last_checked"),
-        ),
+            status.get("checked_at_ms") or status.get("last_checked"),
+        ) + tuple(status.get(column) for column in PHASE_COLUMNS)
     )
-    conn.commit()
-    conn.close()
 
 # Add cache control headers to prevent API response caching
 def add_cache_headers(response):
@@ -196,25 +203,116 @@ status_data = {}
 ec2_status_data_lock = threading.Lock()
 ec2_status_data = {}
 
+# Latest ICMP echo results for the EC2 and Azure endpoints, by the same keys
+ec2_icmp_data_lock = threading.Lock()
+ec2_icmp_data = {}
+azure_icmp_data_lock = threading.Lock()
+azure_icmp_data = {}
+
+# Probe engine: "threads" runs checks on the pipeline's shared worker pool,
+# "asyncio" runs every catalog on one shared event loop
+PROBE_ENGINE = os.environ.get("PROBE_ENGINE", "threads")
+PROBE_WORKERS = int(os.environ.get("PROBE_WORKERS", "50"))
+# Probes allowed in flight at once, across every catalog and engine
+PROBE_CONCURRENCY = int(os.environ.get("PROBE_CONCURRENCY", "2000"))
+ASYNC_PROBE_CONCURRENCY = int(os.environ.get("ASYNC_PROBE_CONCURRENCY", "2000"))
+
+# Scheduling: "targets" probes every target on its own staggered slot,
+# "adaptive" does the same but follows each target's health, and
+# "sweep" probes each catalog all at once every interval
+SCHEDULER_MODE = os.environ.get("SCHEDULER_MODE", "targets")
+
+# Worker processes that split the catalogs between them; 0 probes in the web process
+PROBE_SHARDS = int(os.environ.get("PROBE_SHARDS", "0"))
+
+# "standalone" probes locally; "coordinator" leaves probing to worker nodes
+# started with distributed.py and merges the results they push
+PROBE_ROLE = os.environ.get("PROBE_ROLE", "standalone")
+
+# Hedge slow probes at a learned latency percentile and confirm new "down" results
+PROBE_HEDGING = os.environ.get("PROBE_HEDGING", "1") == "1"
+
+# Back off from targets that keep failing (see breaker.py)
+CIRCUIT_BREAKER = os.environ.get("CIRCUIT_BREAKER", "1") == "1"
+
+# Learn per-target timeouts and degraded thresholds from latency history
+ADAPTIVE_LIMITS = os.environ.get("ADAPTIVE_LIMITS", "1") == "1"
+
+# Force refreshes within this many seconds of the last finished sweep reuse its results
+FORCE_REFRESH_MIN_AGE = float(os.environ.get("FORCE_REFRESH_MIN_AGE", "10"))
+
+async_engine_lock = threading.Lock()
+async_engine = None
+
+# TCP engine for the EC2/Azure sweeps: same choices as PROBE_ENGINE, plus
+# "selectors", which multiplexes every connect on one epoll/kqueue thread
+TCP_PROBE_ENGINE = os.environ.get("TCP_PROBE_ENGINE", PROBE_ENGINE)
+
+tcp_multiplexer_lock = threading.Lock()
+tcp_multiplexer = None
+
+# Ping the EC2/Azure endpoints from one ICMP socket alongside their TCP checks
+ICMP_PROBES = os.environ.get("ICMP_PROBES", "0") == "1"
+
+icmp_pinger = None
+
+def probe_executor(engine=None):
+    """Return the executor a sweep submits its checks to, based on PROBE_ENGINE"""
+    global async_engine
+    if (engine or PROBE_ENGINE) == "asyncio":
+        with async_engine_lock:
+            if async_engine is None:
+                async_engine = AsyncProbeEngine(concurrency=ASYNC_PROBE_CONCURRENCY)
+        return async_engine.executor()
+    return pipeline.thread_executor()
+
+def tcp_probe_executor():
+    """Return the executor the EC2/Azure sweeps submit to, based on TCP_PROBE_ENGINE"""
+    global tcp_multiplexer
+    if TCP_PROBE_ENGINE == "selectors":
+        with tcp_multiplexer_lock:
+            if tcp_multiplexer is None:
+                tcp_multiplexer = TCPMultiplexer()
+        targets = {check_tcp_connectivity: ec2_tcp_target, check_azure_connectivity: azure_tcp_target}
+        return MultiplexProbeExecutor(tcp_multiplexer, targets)
+    return probe_executor(TCP_PROBE_ENGINE)
+
+def icmp_probe_executor():
+    """Return the executor the ICMP sweeps submit to"""
+    targets = {check_ec2_icmp: ec2_tcp_target, check_azure_icmp: azure_tcp_target}
+    return ICMPProbeExecutor(icmp_pinger, targets, icmp_status)
+
 def check_website_status(site):
     """Check the status of a single website"""
     name = site["name"]
     url = site["url"]
     icon = site["icon"]
-    
-    # Headers to make requests look more like a real browser
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
+    method, mode = probe_plan(site)
+    timeout = site.get("timeout", HTTP_TIMEOUT)
 
     try:
         start_time = time.time()
-        response = requests.get(url, timeout=15, headers=headers)
+        track_connections()
+        # Stream so the call returns once headers arrive and the body is read on our terms
+        response = get_session().request(method, url, timeout=timeout, headers=BROWSER_HEADERS, stream=True)
+        headers_time = int((time.time() - start_time) * 1000)
+        # Summed over every redirect hop, so earlier hops' setup is not counted as TTFB
+        connection_reused, phases = tracked_connections()
+        phases = phases or {}
+        dns_time, connect_time, tls_time = (
+            int(phases[phase] * 1000) if phase in phases else None for phase in ("dns", "connect", "tls")
+        )
+        # Time to first byte counts from the request going out, after any connection setup
+        ttfb = max(headers_time - (dns_time or 0) - (connect_time or 0) - (tls_time or 0), 0)
+        with response:
+            if mode == "full":
+                response.content  # Download and decompress the whole body
+            elif mode == "bounded":
+                read_bytes = 0
+                for chunk in response.raw.stream(8192, decode_content=False):
+                    read_bytes += len(chunk)
+                    if read_bytes >= HTTP_PROBE_MAX_BYTES:
+                        break
         response_time = int((time.time() - start_time) * 1000)  # Convert to ms
 
         status = {
@@ -223,32 +321,19 @@ def check_website_status(site):
             "icon": icon,
             "status_code": response.status_code,
             "response_time": response_time,
-            "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "dns_time": dns_time,
+            "connect_time": connect_time,
+            "tls_time": tls_time,
+            "ttfb": ttfb,
+            "download_time": response_time - headers_time,
+            "probe_mode": mode,
+            "redirects": len(response.history),
+            "connection_reused": connection_reused,
+            **completed_at(),
         }
 
         # Determine status based on response code and time
-        if response.status_code >= 500:
-            status["status"] = "down"
-            status["message"] = f"Server error (HTTP {response.status_code})"
-        elif response.status_code == 429:
-            status["status"] = "degraded"
-            status["message"] = "Rate limited"
-        elif response.status_code >= 400 and response.status_code != 403:
-            status["status"] = "degraded"
-            status["message"] = f"Client error (HTTP {response.status_code})"
-        elif response_time > 15000:  # 15 seconds
-            status["status"] = "down"
-            status["message"] = f"Very slow response ({response_time} ms)"
-        elif response_time > 5000:  # 5 seconds
-            status["status"] = "degraded"
-            status["message"] = f"Slow response ({response_time} ms)"
-        elif response.status_code == 403:
-            # Many sites return 403 for automated requests - consider operational if fast
-            status["status"] = "operational" if response_time < 5000 else "degraded"
-            status["message"] = f"Access restricted (HTTP 403) - {response_time} ms"
-        else:
-            status["status"] = "operational"
-            status["message"] = f"OK - {response_time} ms"
+        status["status"], status["message"] = classify_website(response.status_code, response_time, site.get("degraded_ms"))
 
     except requests.exceptions.Timeout:
         status = {
@@ -258,8 +343,8 @@ def check_website_status(site):
             "status": "down",
             "status_code": "Timeout",
             "response_time": None,
-            "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "message": "Connection timeout (15s)",
+            **completed_at(),
+            "message": f"Connection timeout ({timeout:g}s)",
         }
     except requests.exceptions.ConnectionError:
         status = {
@@ -269,7 +354,7 @@ def check_website_status(site):
             "status": "down",
             "status_code": "Connection Error",
             "response_time": None,
-            "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **completed_at(),
             "message": "Connection failed",
         }
     except Exception as e:
@@ -280,333 +365,244 @@ def check_website_status(site):
             "status": "down",
             "status_code": "Error",
             "response_time": None,
-            "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **completed_at(),
             "message": f"Unknown error: {str(e)[:50]}",
         }
 
     return status
 
+def ec2_tcp_target(endpoint):
+    """Return the hostname to probe and the base status dict for an EC2 endpoint"""
+    status = {
+        "name": endpoint["name"],
+        "ip": endpoint["ip"],  # This is actually a hostname now
+        "icon": endpoint["icon"],
+    }
+    return endpoint["ip"], status
+
+def azure_tcp_target(endpoint):
+    """Return the hostname to probe and the base status dict for an Azure endpoint"""
+    status = {
+        "name": endpoint["name"],
+        "endpoint": endpoint["endpoint"],
+        "region": endpoint["region"],
+        "icon": endpoint["icon"],
+    }
+    return endpoint["endpoint"], status
+
 def check_tcp_connectivity(endpoint):
     """Check the status of an EC2 endpoint using TCP connectivity check"""
-    name = endpoint["name"]
-    hostname = endpoint["ip"]  # This is actually a hostname now
-    icon = endpoint["icon"]
-    
-    try:
-        start_time = time.time()
-        
-        # Use TCP connectivity check instead of ICMP ping (more reliable for cloud services)
-        # Most AWS services listen on port 443 (HTTPS)
-        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        test_socket.settimeout(10)  # 10 second timeout
-        
-        try:
-            # Try to connect to port 443 (HTTPS) - most AWS services support this
-            result = test_socket.connect_ex((hostname, 443))
-            test_socket.close()
-            
-            total_time = int((time.time() - start_time) * 1000)  # Total time in ms
-            
-            status = {
-                "name": name,
-                "ip": hostname,  # Keep the hostname in the ip field for consistency
-                "icon": icon,
-                "response_time": total_time,
-                "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
-            
-            if result == 0:
-                # Successful connection
-                status["connection_time"] = total_time
-                
-                # Determine status based on connection time
-                if total_time > 5000:  # 5 seconds
-                    status["status"] = "degraded"
-                    status["message"] = f"High latency ({total_time} ms)"
-                elif total_time > 2000:  # 2 seconds
-                    status["status"] = "degraded"
-                    status["message"] = f"Elevated latency ({total_time} ms)"
-                else:
-                    status["status"] = "operational"
-                    status["message"] = f"TCP connection OK ({total_time} ms)"
-            else:
-                # Connection failed
-                status["status"] = "down"
-                status["connection_time"] = None
-                
-                # Try to determine why connection failed
-                try:
-                    socket.gethostbyname(hostname)
-                    status["message"] = f"TCP connection failed (port 443 blocked or service down)"
-                except socket.gaierror:
-                    status["message"] = "DNS resolution failed"
-                    
-        except socket.timeout:
-            status = {
-                "name": name,
-                "ip": hostname,
-                "icon": icon,
-                "status": "down",
-                "response_time": 10000,  # Timeout time
-                "connection_time": None,
-                "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "message": "TCP connection timeout (10s)",
-            }
-        except Exception as e:
-            status = {
-                "name": name,
-                "ip": hostname,
-                "icon": icon,
-                "status": "down",
-                "response_time": None,
-                "connection_time": None,
-                "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "message": f"TCP connection error: {str(e)[:30]}",
-            }
-            
-    except Exception as e:
-        status = {
-            "name": name,
-            "ip": hostname,
-            "icon": icon,
-            "status": "down",
-            "response_time": None,
-            "ping_time": None,
-            "connection_time": None,
-            "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "message": f"Error: {str(e)[:50]}",
-        }
-    
-    return status
+    # Use TCP connectivity check instead of ICMP ping (more reliable for cloud services)
+    # Most AWS services listen on port 443 (HTTPS)
+    return check_tcp_port(*ec2_tcp_target(endpoint), timeout=endpoint.get("timeout", TCP_TIMEOUT), degraded_ms=endpoint.get("degraded_ms"))
 
 def check_azure_connectivity(endpoint):
     """Check the status of an Azure endpoint using TCP connectivity check"""
-    name = endpoint["name"]
-    hostname = endpoint["endpoint"]
-    region = endpoint["region"]
-    icon = endpoint["icon"]
-    
+    # Azure Storage blob service typically uses port 443 (HTTPS)
+    return check_tcp_port(*azure_tcp_target(endpoint), timeout=endpoint.get("timeout", TCP_TIMEOUT), degraded_ms=endpoint.get("degraded_ms"))
+
+def check_tcp_port(hostname, status, port=443, timeout=TCP_TIMEOUT, degraded_ms=None):
+    """Resolve hostname, then time a TCP connect to it, filling in the status dict.
+
+    DNS resolution and the TCP handshake are timed separately so that a slow
+    resolver does not show up as network latency.
+    """
+    outcome = {"dns_time": None, "connect_time": None, "error": None, "timeout": timeout}
+    start_time = time.time()
+
     try:
-        start_time = time.time()
-        
-        # Use TCP connectivity check to Azure Storage endpoints
-        # Azure Storage blob service typically uses port 443 (HTTPS)
-        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        test_socket.settimeout(10)  # 10 second timeout
-        
+        address = dns_cache.resolve(hostname)[0]
+        resolved_time = time.time()
+        outcome["dns_time"] = int((resolved_time - start_time) * 1000)
+
+        test_socket = socket.socket(address_family(address), socket.SOCK_STREAM)
+        test_socket.settimeout(timeout)
         try:
-            # Try to connect to port 443 (HTTPS) - Azure Storage blob service
-            result = test_socket.connect_ex((hostname, 443))
+            result = test_socket.connect_ex((address, port))
+        finally:
             test_socket.close()
-            
-            total_time = int((time.time() - start_time) * 1000)  # Total time in ms
-            
-            status = {
-                "name": name,
-                "endpoint": hostname,
-                "region": region,
-                "icon": icon,
-                "response_time": total_time,
-                "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
-            
-            if result == 0:
-                # Successful connection
-                status["connection_time"] = total_time
-                
-                # Determine status based on connection time
-                if total_time > 5000:  # 5 seconds
-                    status["status"] = "degraded"
-                    status["message"] = f"High latency ({total_time} ms)"
-                elif total_time > 2000:  # 2 seconds
-                    status["status"] = "degraded"
-                    status["message"] = f"Elevated latency ({total_time} ms)"
-                else:
-                    status["status"] = "operational"
-                    status["message"] = f"TCP connection OK ({total_time} ms)"
-            else:
-                # Connection failed
-                status["status"] = "down"
-                status["connection_time"] = None
-                
-                # Try to determine why connection failed
-                try:
-                    socket.gethostbyname(hostname)
-                    status["message"] = f"TCP connection failed (port 443 blocked or service down)"
-                except socket.gaierror:
-                    status["message"] = "DNS resolution failed"
-                    
-        except socket.timeout:
-            status = {
-                "name": name,
-                "endpoint": hostname,
-                "region": region,
-                "icon": icon,
-                "status": "down",
-                "response_time": 10000,  # Timeout time
-                "connection_time": None,
-                "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "message": "TCP connection timeout (10s)",
-            }
-        except Exception as e:
-            status = {
-                "name": name,
-                "endpoint": hostname,
-                "region": region,
-                "icon": icon,
-                "status": "down",
-                "response_time": None,
-                "connection_time": None,
-                "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "message": f"TCP connection error: {str(e)[:30]}",
-            }
-            
-    except Exception as e:
-        status = {
-            "name": name,
-            "endpoint": hostname,
-            "region": region,
-            "icon": icon,
-            "status": "down",
-            "response_time": None,
-            "ping_time": None,
-            "connection_time": None,
-            "last_checked": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "message": f"Error: {str(e)[:50]}",
-        }
-    
-    return status
 
-def update_azure_status_data():
-    """Update status data for all Azure endpoints using parallel processing."""
-    global azure_status_data
-    start_time = time.time()
-    print(f"\n🔄 Updating Azure status data... [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]")
-    
-    new_status_data = {}
-    tasks = {}
-    
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        # Flatten the list of endpoints to check
-        all_endpoints = [endpoint for region in AZURE_ENDPOINTS.values() for endpoint in region["endpoints"]]
-        
-        # Submit all tasks
-        for endpoint in all_endpoints:
-            future = executor.submit(check_azure_connectivity, endpoint)
-            tasks[future] = endpoint["name"]
-            
-        # Collect results as they complete
-        for future in as_completed(tasks):
-            endpoint_name = tasks[future]
-            try:
-                result = future.result()
-                new_status_data[endpoint_name] = result
-            except Exception as e:
-                print(f"   - Error checking {endpoint_name}: {e}")
-
-    # Thread-safe update
-    with azure_status_data_lock:
-        azure_status_data = new_status_data
-    
-    update_duration = time.time() - start_time
-    total_endpoints = len(new_status_data)
-    operational_count = len([s for s in new_status_data.values() if s['status'] == 'operational'])
-    degraded_count = len([s for s in new_status_data.values() if s['status'] == 'degraded'])
-    down_count = len([s for s in new_status_data.values() if s['status'] == 'down'])
-    
-    print(f"📊 Azure update complete: {total_endpoints} endpoints checked in {update_duration:.2f}s")
-    print(f"   Status: {operational_count} operational, {degraded_count} degraded, {down_count} down")
+        done_time = time.time()
+        outcome["response_time"] = int((done_time - start_time) * 1000)  # Total time in ms
+        if result == 0:
+            outcome["connect_time"] = int((done_time - resolved_time) * 1000)
+        else:
+            outcome["error"] = "refused"
+    except socket.gaierror:
+        outcome["response_time"] = int((time.time() - start_time) * 1000)
+        outcome["error"] = "dns"
+    except socket.timeout:
+        outcome["response_time"] = int(timeout * 1000)  # Timeout time
+        outcome["error"] = "timeout"
+    except Exception as e:
+        outcome["response_time"] = None
+        outcome["error"] = "other"
+        outcome["detail"] = e
+
+    return tcp_status(status, outcome, port, degraded_ms)
+
+def check_ec2_icmp(endpoint):
+    """Ping an EC2 endpoint and report RTT, jitter and packet loss"""
+    hostname, status = ec2_tcp_target(endpoint)
+    return icmp_status(status, icmp_pinger.submit(hostname).result())
+
+def check_azure_icmp(endpoint):
+    """Ping an Azure endpoint and report RTT, jitter and packet loss"""
+    hostname, status = azure_tcp_target(endpoint)
+    return icmp_status(status, icmp_pinger.submit(hostname).result())
+
+def with_icmp(statuses, icmp_data, icmp_lock):
+    """Yield (key, status) with the endpoint's latest ICMP result under "icmp" when pinging is on"""
+    if not ICMP_PROBES:
+        yield from statuses
+        return
+    with icmp_lock:
+        icmp = dict(icmp_data)
+    for key, status in statuses:
+        yield key, {**status, "icmp": icmp.get(key)}
+
+def website_targets():
+    """Yield (key, website, extra fields) for every website on every page"""
+    for page_num, page_data in PAGES.items():
+        for website in page_data['websites']:
+            yield f"{page_num}_{website['name']}", website, {'page': page_num, 'page_name': page_data['name']}
+
+def ec2_targets():
+    """Yield (key, endpoint, extra fields) for every EC2 endpoint"""
+    for env_name, env_data in EC2_ENDPOINTS.items():
+        for endpoint in env_data['endpoints']:
+            yield f"{env_name}_{endpoint['name']}", endpoint, {'environment': env_name, 'environment_name': env_data['name']}
+
+def azure_targets():
+    """Yield (key, endpoint, extra fields) for every Azure endpoint"""
+    for region in AZURE_ENDPOINTS.values():
+        for endpoint in region['endpoints']:
+            yield endpoint['name'], endpoint, {}
+
+def close_idle_connections():
+    evicted = evict_idle_connections()
+    if evicted:
+        print(f"   Closed {evicted} idle pooled connections")
+
+def report_connection_reuse(results):
+    reused_count = len([s for s in results.values() if s.get('connection_reused')])
+    print(f"   Connections: {reused_count} reused, {len(results) - reused_count} fresh")
+
+# One pipeline runs every catalog; a new provider only needs a ProbeKind here
+pipeline = ProbePipeline(workers=PROBE_WORKERS, budget=PROBE_CONCURRENCY, store=store_status,
+                          flush=history_writer.flush)
+
+pipeline.register(ProbeKind(
+    name="websites",
+    label="Website",
+    targets=website_targets,
+    check=check_website_status,
+    executor=probe_executor,
+    results=status_data,
+    lock=status_data_lock,
+    interval=60,
+    hostname=lambda site: urlsplit(site["url"]).hostname,
+    before_sweep=close_idle_connections,
+    after_sweep=report_connection_reuse,
+    hedge=HedgePolicy() if PROBE_HEDGING else None,
+    breaker=CircuitBreaker() if CIRCUIT_BREAKER else None,
+    limits=LatencyLimits(HTTP_TIMEOUT) if ADAPTIVE_LIMITS else None,
+))
+pipeline.register(ProbeKind(
+    name="ec2",
+    label="EC2",
+    targets=ec2_targets,
+    check=check_tcp_connectivity,
+    executor=tcp_probe_executor,
+    results=ec2_status_data,
+    lock=ec2_status_data_lock,
+    interval=120,
+    hostname=lambda endpoint: endpoint["ip"],
+    hedge=HedgePolicy() if PROBE_HEDGING else None,
+    breaker=CircuitBreaker() if CIRCUIT_BREAKER else None,
+    limits=LatencyLimits(TCP_TIMEOUT) if ADAPTIVE_LIMITS else None,
+))
+pipeline.register(ProbeKind(
+    name="azure",
+    label="Azure",
+    targets=azure_targets,
+    check=check_azure_connectivity,
+    executor=tcp_probe_executor,
+    results=azure_status_data,
+    lock=azure_status_data_lock,
+    interval=120,
+    hostname=lambda endpoint: endpoint["endpoint"],
+    hedge=HedgePolicy() if PROBE_HEDGING else None,
+    breaker=CircuitBreaker() if CIRCUIT_BREAKER else None,
+    limits=LatencyLimits(TCP_TIMEOUT) if ADAPTIVE_LIMITS else None,
+))
+
+scheduler = TargetScheduler(pipeline, adaptive=SCHEDULER_MODE == "adaptive")
+shard_supervisor = ShardSupervisor(pipeline, PROBE_SHARDS) if PROBE_SHARDS else None
+if PROBE_ROLE == "coordinator" and not COORDINATOR_TOKEN:
+    # Without a token anyone who can reach the API could overwrite live status
+    sys.exit("❌ PROBE_ROLE=coordinator needs COORDINATOR_TOKEN, the secret workers send as X-Worker-Token")
+coordinator = Coordinator(pipeline) if PROBE_ROLE == "coordinator" else None
+
+if ICMP_PROBES:
+    try:
+        icmp_pinger = ICMPPinger()
+    except PermissionError:
+        print("⚠️ ICMP_PROBES needs root, CAP_NET_RAW or net.ipv4.ping_group_range; ICMP probing disabled")
+        ICMP_PROBES = False
+
+if ICMP_PROBES:
+    pipeline.register(ProbeKind(
+        name="ec2_icmp",
+        label="EC2 ICMP",
+        targets=ec2_targets,
+        check=check_ec2_icmp,
+        executor=icmp_probe_executor,
+        results=ec2_icmp_data,
+        lock=ec2_icmp_data_lock,
+        interval=120,
+        hostname=lambda endpoint: endpoint["ip"],
+        history=False,  # Kept apart from the TCP rows that uptime is computed from
+    ))
+    pipeline.register(ProbeKind(
+        name="azure_icmp",
+        label="Azure ICMP",
+        targets=azure_targets,
+        check=check_azure_icmp,
+        executor=icmp_probe_executor,
+        results=azure_icmp_data,
+        lock=azure_icmp_data_lock,
+        interval=120,
+        hostname=lambda endpoint: endpoint["endpoint"],
+        history=False,
+    ))
 
 def update_status_data():
-    """Update status data for all websites across all pages using parallel processing."""
-    global status_data
-    start_time = time.time()
-    print(f"\n🔄 Updating status data for all pages... [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]")
-    
-    new_status_data = {}
-    tasks = {}
-    
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        # Submit all tasks
-        for page_num, page_data in PAGES.items():
-            page_name = page_data['name']
-            print(f"Checking Page {page_num}: {page_name}")
-            
-            for website in page_data['websites']:
-                future = executor.submit(check_website_status, website)
-                tasks[future] = (page_num, page_name, website['name'])
-        
-        # Collect results
-        for future in as_completed(tasks):
-            page_num, page_name, website_name = tasks[future]
-            try:
-                status = future.result()
-                status['page'] = page_num
-                status['page_name'] = page_name
-                new_status_data[f"{page_num}_{website_name}"] = status
-                store_status(status)
-                print(f"  ✓ {website_name}: {status['status']}")
-            except Exception as e:
-                print(f"  ✗ {website_name}: Error - {str(e)}")
-
-    # Thread-safe update
-    with status_data_lock:
-        status_data = new_status_data
-    
-    update_duration = time.time() - start_time
-    total_sites = len(new_status_data)
-    operational_count = len([s for s in new_status_data.values() if s['status'] == 'operational'])
-    degraded_count = len([s for s in new_status_data.values() if s['status'] == 'degraded'])
-    down_count = len([s for s in new_status_data.values() if s['status'] == 'down'])
-    
-    print(f"📊 Update complete: {total_sites} sites checked in {update_duration:.2f}s")
-    print(f"   Status: {operational_count} operational, {degraded_count} degraded, {down_count} down")
-    print(f"   Next update in 60 seconds\n")
+    """Update status data for all websites across all pages"""
+    pipeline.run("websites")
 
 def update_ec2_status_data():
-    """Update status data for all EC2 endpoints using parallel processing."""
-    global ec2_status_data
-    start_time = time.time()
-    print(f"\n🔄 Updating EC2 status data... [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]")
-    
-    new_ec2_status_data = {}
-    tasks = {}
-    
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        # Submit all tasks
-        for env_name, env_data in EC2_ENDPOINTS.items():
-            env_display_name = env_data['name']
-            print(f"Checking {env_display_name}")
-            
-            for endpoint in env_data['endpoints']:
-                future = executor.submit(check_tcp_connectivity, endpoint)
-                tasks[future] = (env_name, env_display_name, endpoint['name'])
-        
-        # Collect results
-        for future in as_completed(tasks):
-            env_name, env_display_name, endpoint_name = tasks[future]
-            try:
-                status = future.result()
-                status['environment'] = env_name
-                status['environment_name'] = env_display_name
-                new_ec2_status_data[f"{env_name}_{endpoint_name}"] = status
-                print(f"  ✓ {endpoint_name}: {status['status']}")
-            except Exception as e:
-                print(f"  ✗ {endpoint_name}: Error - {str(e)}")
-
-    # Thread-safe update
-    with ec2_status_data_lock:
-        ec2_status_data = new_ec2_status_data
-    
-    update_duration = time.time() - start_time
-    total_endpoints = len(new_ec2_status_data)
-    operational_count = len([s for s in new_ec2_status_data.values() if s['status'] == 'operational'])
-    degraded_count = len([s for s in new_ec2_status_data.values() if s['status'] == 'degraded'])
-    down_count = len([s for s in new_ec2_status_data.values() if s['status'] == 'down'])
-    
-    print(f"📊 EC2 Update complete: {total_endpoints} endpoints checked in {update_duration:.2f}s")
-    print(f"   Status: {operational_count} operational, {degraded_count} degraded, {down_count} down")
-    print(f"   Next update in 60 seconds\n")
+    """Update status data for all EC2 endpoints"""
+    pipeline.run("ec2")
+
+def update_azure_status_data():
+    """Update status data for all Azure endpoints"""
+    pipeline.run("azure")
+
+def force_refresh(name, scope=None):
+    """Refresh a catalog, or only the targets in scope, for a force request.
+
+    Concurrent requests share one sweep; scoped results are merged into the live map.
+    When worker nodes or shard processes do the probing, the live map they feed is
+    returned as it is ("delegated") rather than swept locally.
+    """
+    if coordinator or shard_supervisor:
+        print(f"   Force refresh delegated: {name} is probed by {'worker nodes' if coordinator else 'shard processes'}")
+        return "delegated"
+    sweep, outcome = pipeline.refresh(name, max_age=FORCE_REFRESH_MIN_AGE, scope=scope)
+    age = time.time() - sweep.finished
+    print(f"   Force refresh {outcome} a sweep of {len(sweep.results)} targets (finished {age:.1f}s ago)")
+    return outcome
 
 # --- Routes ---
 
@@ -638,9 +634,10 @@ def api_status():
     if is_force_refresh:
         print(f"🚀 FORCE REFRESH API Request: /api/status [{datetime.now().strftime('%H:%M:%S')}]")
         print(f"   Force ID: {force_id}")
-        # Trigger immediate status update for force refresh
-        update_status_data()
+        # Join or reuse a sweep instead of starting one per request
+        refresh_outcome = force_refresh("websites", (("page", page),) if page in PAGES else None)
     else:
+        refresh_outcome = None
         print(f"🌐 API Request: /api/status?page={page}&_t={timestamp} [{datetime.now().strftime('%H:%M:%S')}]")
     
     with status_data_lock:
@@ -672,6 +669,7 @@ def api_status():
                 "timestamp": current_timestamp,
                 "cache_buster": timestamp,
                 "force_refresh": is_force_refresh,
+                "refresh": refresh_outcome,
                 "cf_cache_status": cf_cache_status,
                 "cf_ray": cf_ray,
                 "data_freshness": "real-time" if is_force_refresh else "cached"
@@ -692,6 +690,7 @@ def api_status():
                 'timestamp': current_timestamp,
                 'cache_buster': timestamp,
                 'force_refresh': is_force_refresh,
+                'refresh': refresh_outcome,
                 'cf_cache_status': cf_cache_status,
                 'cf_ray': cf_ray,
                 'data_freshness': "real-time" if is_force_refresh else "cached"
@@ -717,6 +716,12 @@ def get_pages():
 @app.route("/api/status/<website_name>")
 def get_website_status(website_name):
     """API endpoint to get status of a specific website"""
+    if not any(site["name"].lower() == website_name.lower() for _, site, _ in website_targets()):
+        return jsonify({'error': 'Website not found'}), 404
+    if request.args.get('force') or request.args.get('bypass') or request.args.get('fresh'):
+        print(f"🚀 FORCE REFRESH API Request: /api/status/{website_name} [{datetime.now().strftime('%H:%M:%S')}]")
+        force_refresh("websites", (("name", website_name),))
+
     with status_data_lock:
         for status in status_data.values():
             if status['name'].lower() == website_name.lower():
@@ -725,52 +730,80 @@ def get_website_status(website_name):
     return jsonify({'error': 'Website not found'}), 404
 
 
+def history_time_range():
+    """Optional ?from=&to= bounds (ISO dates or times); raises ValueError.
+
+    Times without an offset are local time like checked_at; ones with an
+    offset or Z are converted to it.
+    """
+    bounds = [datetime.fromisoformat(request.args[arg]) if request.args.get(arg) else None for arg in ("from", "to")]
+    return [bound.astimezone().replace(tzinfo=None) if bound and bound.tzinfo else bound for bound in bounds]
+
+
+def history_page_filters():
+    """Optional ?status= (comma-separated status names) and ?cursor= (a next_cursor); raises ValueError"""
+    statuses = [status for status in request.args.get("status", "").split(",") if status]
+    for status in statuses:
+        if status not in STATUSES:
+            raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+    cursor = request.args.get("cursor") or None
+    if cursor:
+        try:
+            parse_cursor(cursor)
+        except ValueError:
+            raise ValueError("cursor must be a next_cursor from an earlier page")
+    return statuses, cursor
+
+
+def history_kind(default=None):
+    """Optional ?kind= (websites, ec2 or azure); raises ValueError"""
+    kind = request.args.get("kind") or default
+    kinds = [name for name, probe_kind in pipeline.kinds.items() if probe_kind.history]
+    if kind is not None and kind not in kinds:
+        raise ValueError(f"kind must be one of {', '.join(kinds)}")
+    return kind
+
+
 @app.route("/api/history/<website_name>")
 def get_history(website_name):
-    """Return recent status history for a website"""
+    """Return recent status history for a website (or ?kind= endpoint), a page at a time"""
     limit = request.args.get('limit', 50, type=int)
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        "SELECT status, status_code, response_time, checked_at FROM history WHERE name=? ORDER BY id DESC LIMIT ?",
-        (website_name, limit),
-    )
-    rows = c.fetchall()
-    conn.close()
-    history = [
-        {
-            "status": r[0],
-            "status_code": r[1],
-            "response_time": r[2],
-            "checked_at": r[3],
-        }
-        for r in rows
-    ]
-    return jsonify({"name": website_name, "history": history, "count": len(history)})
+    try:
+        start, end = history_time_range()
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO dates or times"}), 400
+    try:
+        statuses, cursor = history_page_filters()
+        kind = history_kind("websites")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with read_pool.connection() as conn:
+        history, next_cursor = history_page(conn, limit, website_name, start=start, end=end,
+                                            statuses=statuses, cursor=cursor, kind=kind)
+    return jsonify({"name": website_name, "kind": kind, "history": history, "count": len(history),
+                    "next_cursor": next_cursor})
 
 
 @app.route("/api/uptime/<website_name>")
 def get_uptime(website_name):
-    """Return uptime percentage for a website"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM history WHERE name=?", (website_name,))
-    total = c.fetchone()[0]
-    c.execute(
-        "SELECT COUNT(*) FROM history WHERE name=? AND status='operational'",
-        (website_name,),
-    )
-    operational = c.fetchone()[0]
-    conn.close()
-    uptime = round((operational / total * 100), 2) if total else None
-    return jsonify(
-        {
-            "name": website_name,
-            "total_checks": total,
-            "operational_checks": operational,
-            "uptime_percentage": uptime,
+    """Return uptime for a website (or ?kind= endpoint), all time (or from/to) and over the last 24h, 7d, 30d and 90d"""
+    try:
+        start, end = history_time_range()
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO dates or times"}), 400
+    try:
+        kind = history_kind("websites")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    now = datetime.now()
+    # Summed from the per-minute/hour/day rollups rather than counting raw history
+    with read_pool.connection() as conn:
+        response_data = rollup_uptime(conn, website_name, start, end, kind=kind)
+        response_data["windows"] = {
+            label: rollup_uptime(conn, website_name, now - window, now, kind=kind)
+            for label, window in UPTIME_WINDOWS.items()
         }
-    )
+    return jsonify({"name": website_name, "kind": kind, **response_data})
 
 @app.route("/api/ec2/status", methods=["GET"])
 def get_ec2_status():
@@ -785,9 +818,10 @@ def get_ec2_status():
     if is_force_refresh:
         print(f"🚀 FORCE REFRESH EC2 API Request: /api/ec2/status [{datetime.now().strftime('%H:%M:%S')}]")
         print(f"   Force ID: {force_id}")
-        # Trigger immediate status update for force refresh
-        update_ec2_status_data()
+        # Join or reuse a sweep instead of starting one per request
+        refresh_outcome = force_refresh("ec2", (("environment", environment),) if environment in EC2_ENDPOINTS else None)
     else:
+        refresh_outcome = None
         print(f"🌐 EC2 API Request: /api/ec2/status?env={environment}&_t={timestamp} [{datetime.now().strftime('%H:%M:%S')}]")
     
     with ec2_status_data_lock:
@@ -801,7 +835,7 @@ def get_ec2_status():
         
         if environment and environment in EC2_ENDPOINTS:
             # Return specific environment
-            env_endpoints = [status for key, status in ec2_status_data.items() if status.get('environment') == environment]
+            env_endpoints = [status for key, status in with_icmp(ec2_status_data.items(), ec2_icmp_data, ec2_icmp_data_lock) if status.get('environment') == environment]
             total_endpoints = len(env_endpoints)
             operational_count = len([s for s in env_endpoints if s["status"] == "operational"])
             degraded_count = len([s for s in env_endpoints if s["status"] == "degraded"])
@@ -819,6 +853,7 @@ def get_ec2_status():
                 "timestamp": current_timestamp,
                 "cache_buster": timestamp,
                 "force_refresh": is_force_refresh,
+                "refresh": refresh_outcome,
                 "cf_cache_status": cf_cache_status,
                 "cf_ray": cf_ray,
                 "data_freshness": "real-time" if is_force_refresh else "cached"
@@ -827,7 +862,7 @@ def get_ec2_status():
             return jsonify(response_data)
         else:
             # Return all endpoints
-            all_endpoints = list(ec2_status_data.values())
+            all_endpoints = [status for key, status in with_icmp(ec2_status_data.items(), ec2_icmp_data, ec2_icmp_data_lock)]
             response_data = {
                 'endpoints': all_endpoints,
                 'environments': {env: data['name'] for env, data in EC2_ENDPOINTS.items()},
@@ -839,6 +874,7 @@ def get_ec2_status():
                 'timestamp': current_timestamp,
                 'cache_buster': timestamp,
                 'force_refresh': is_force_refresh,
+                'refresh': refresh_outcome,
                 'cf_cache_status': cf_cache_status,
                 'cf_ray': cf_ray,
                 'data_freshness': "real-time" if is_force_refresh else "cached"
@@ -850,7 +886,71 @@ def get_ec2_status():
 def api_azure_status():
     """Return the current Azure status data as JSON"""
     with azure_status_data_lock:
-        return jsonify(azure_status_data)
+        return jsonify(dict(with_icmp(azure_status_data.items(), azure_icmp_data, azure_icmp_data_lock)))
+
+@app.route("/api/scheduler")
+def get_scheduler_stats():
+    """Per-catalog schedule summary: targets, probes run, skipped slots and lateness"""
+    response_data = {
+        "mode": SCHEDULER_MODE,
+        "kinds": scheduler.stats(),
+        "hedging": {name: kind.hedge.stats() for name, kind in pipeline.kinds.items() if kind.hedge},
+        "breakers": {name: kind.breaker.stats() for name, kind in pipeline.kinds.items() if kind.breaker},
+        "history": history_writer.stats(),
+        "history_migration": history_migration.stats(),
+        "read_pool": read_pool.stats(),
+        "retention": retention.stats(),
+    }
+    if shard_supervisor:
+        response_data["shards"] = shard_supervisor.stats()
+    return jsonify(response_data)
+
+def worker_request():
+    """Parse a worker's JSON body; returns (payload, None) or (None, error response)"""
+    if coordinator is None:
+        return None, (jsonify({"error": "Not running as a coordinator"}), 404)
+    # Compared as bytes: compare_digest refuses str with non-ASCII characters
+    if not hmac.compare_digest(request.headers.get("X-Worker-Token", "").encode(), COORDINATOR_TOKEN.encode()):
+        return None, (jsonify({"error": "Invalid worker token"}), 403)
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not payload.get("worker"):
+        return None, (jsonify({"error": "Expected a JSON body with a worker id"}), 400)
+    return payload, None
+
+@app.route("/api/workers/lease", methods=["POST"])
+def lease_shards():
+    """Lease (or renew) a share of the catalog shards for a worker node"""
+    payload, error = worker_request()
+    if error:
+        return error
+    return jsonify(coordinator.lease(payload["worker"], request.remote_addr))
+
+@app.route("/api/workers/results", methods=["POST"])
+def receive_worker_results():
+    """Merge a batch of results pushed by a worker node"""
+    payload, error = worker_request()
+    if error:
+        return error
+    try:
+        accepted = coordinator.accept(payload["worker"], payload.get("results", {}))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"accepted": accepted})
+
+@app.route("/api/workers")
+def get_workers():
+    """Worker nodes known to the coordinator and the shards they hold"""
+    if coordinator is None:
+        return jsonify({"error": "Not running as a coordinator"}), 404
+    return jsonify(coordinator.stats())
+
+@app.route("/api/limits")
+def get_learned_limits():
+    """Learned timeout (s), degraded threshold (ms) and p99 latency per target"""
+    return jsonify({
+        "enabled": ADAPTIVE_LIMITS,
+        "kinds": {name: kind.limits.stats() for name, kind in pipeline.kinds.items() if kind.limits},
+    })
 
 @app.route("/history")
 def history():
@@ -864,78 +964,47 @@ def api_history():
     offset = request.args.get('offset', 0, type=int)
     website_name = request.args.get('website')
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    if website_name:
-        c.execute(
-            "SELECT status, status_code, response_time, checked_at FROM history WHERE name=? ORDER BY id DESC LIMIT ? OFFSET ?",
-            (website_name, limit, offset),
-        )
-    else:
-        c.execute(
-            "SELECT name, url, status, status_code, response_time, checked_at FROM history ORDER BY id DESC LIMIT ? OFFSET ?",
-            (limit, offset),
-        )
-    
-    rows = c.fetchall()
-    conn.close()
-    
-    # Format the results
+    try:
+        start, end = history_time_range()
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO dates or times"}), 400
+    try:
+        statuses, cursor = history_page_filters()
+        kind = history_kind("websites" if website_name else None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Pages follow next_cursor; offset still works but gets slower the deeper it goes
+    with read_pool.connection() as conn:
+        history, next_cursor = history_page(conn, limit, website_name or None, offset, start, end, statuses, cursor,
+                                            kind)
+    response_data = {"history": history, "count": len(history), "next_cursor": next_cursor}
     if website_name:
-        history = [
-            {
-                "status": r[0],
-                "status_code": r[1],
-                "response_time": r[2],
-                "checked_at": r[3],
-            }
-            for r in rows
-        ]
-        response_data = {"name": website_name, "history": history, "count": len(history)}
-    else:
-        history = [
-            {
-                "name": r[0],
-                "url": r[1],
-                "status": r[2],
-                "status_code": r[3],
-                "response_time": r[4],
-                "checked_at": r[5],
-            }
-            for r in rows
-        ]
-        response_data = {"history": history, "count": len(history)}
+        response_data["name"] = website_name
+    if kind:
+        response_data["kind"] = kind
     
     return jsonify(response_data)
 
-def run_scheduler(update_function, interval):
-    """Run a function periodically with a fixed interval"""
-    while True:
-        try:
-            update_function()
-        except Exception as e:
-            print(f"Error in scheduler: {e}")
-        time.sleep(interval)
-
 # Start the background threads to update data
 if __name__ == "__main__":
     init_db()  # Ensure the database is initialized
-    
-    # Start the website status update thread
-    status_thread = threading.Thread(target=run_scheduler, args=(update_status_data, 60))
-    status_thread.daemon = True
-    status_thread.start()
-    
-    # Start the EC2 status update thread
-    ec2_thread = threading.Thread(target=run_scheduler, args=(update_ec2_status_data, 120))
-    ec2_thread.daemon = True
-    ec2_thread.start()
-
-    # Start the Azure status update thread
-    azure_thread = threading.Thread(target=run_scheduler, args=(update_azure_status_data, 120))
-    azure_thread.daemon = True
-    azure_thread.start()
+    # Exit normally on SIGTERM so queued history rows are written out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    history_migration.start()  # Move pre-checks history into the compact schema, if any is left
+    retention.start()  # Expire old history and rollups in the background
+
+    if coordinator:
+        print(f"🛰️ Coordinating {coordinator.shards} shards for worker nodes")
+    elif shard_supervisor:
+        # Shard worker processes probe; this process merges their results and serves them
+        shard_supervisor.start()
+    else:
+        # Start the scheduler thread that probes every catalog
+        run_scheduler = pipeline.run_forever if SCHEDULER_MODE == "sweep" else scheduler.run_forever
+        scheduler_thread = threading.Thread(target=run_scheduler)
+        scheduler_thread.daemon = True
+        scheduler_thread.start()
 
     # Run the Flask app
     app.run(host="0.0.0.0", port=80)
@@ -0,0 +1,264 @@
+"""asyncio probe engine.
+
+Runs the website, EC2 and Azure checks for every catalog on one shared event
+loop instead of blocking one OS thread per in-flight request. The coroutines
+mirror the threaded checkers in app.py by name and return the same result
+dicts, so the /api/* routes do not care which engine produced a result.
+"""
+import asyncio
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import wait
+from urllib.parse import urljoin, urlsplit
+
+from dns_cache import dns_cache, address_family
+from probe_common import (
+    BROWSER_HEADERS, HTTP_PROBE_MAX_BYTES, HTTP_TIMEOUT, TCP_TIMEOUT,
+    classify_website, completed_at, probe_plan, tcp_status,
+)
+
+MAX_REDIRECTS = 30  # same limit as requests
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class TooManyRedirects(Exception):
+    pass
+
+
+class AsyncProbeEngine:
+    """Owns a background event loop and runs probes on it with a concurrency cap"""
+
+    def __init__(self, concurrency=2000):
+        self.concurrency = concurrency
+        self.loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._ssl_context = ssl.create_default_context()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-probe-loop", daemon=True)
+        self._thread.start()
+
+    def executor(self):
+        """Return an executor-style handle for one sweep"""
+        return AsyncProbeExecutor(self)
+
+    def submit(self, check, target):
+        """Schedule the coroutine mirroring `check` for target and return a concurrent Future"""
+        coro = getattr(self, check.__name__)(target)
+        return asyncio.run_coroutine_threadsafe(self._limited(coro), self.loop)
+
+    async def _limited(self, coro):
+        # Created lazily so the semaphore belongs to the engine's loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await coro
+
+    # --- HTTP ---
+
+    async def check_website_status(self, site):
+        """Check the status of a single website"""
+        name = site["name"]
+        url = site["url"]
+        icon = site["icon"]
+        method, mode = probe_plan(site)
+        timeout = site.get("timeout", HTTP_TIMEOUT)
+
+        try:
+            start_time = time.time()
+            fetched = await asyncio.wait_for(self._fetch(url, method, mode), timeout)
+            status_code = fetched["status_code"]
+            response_time = int((time.time() - start_time) * 1000)  # Convert to ms
+            headers_time = int((fetched["headers_at"] - start_time) * 1000)
+            dns_time, connect_time, tls_time = (int(fetched[phase] * 1000) for phase in ("dns", "connect", "tls"))
+            # Time to first byte counts from the request going out, after connection setup
+            ttfb = max(headers_time - dns_time - connect_time - tls_time, 0)
+
+            status = {
+                "name": name,
+                "url": url,
+                "icon": icon,
+                "status_code": status_code,
+                "response_time": response_time,
+                "dns_time": dns_time,
+                "connect_time": connect_time,
+                "tls_time": tls_time,
+                "ttfb": ttfb,
+                "download_time": response_time - headers_time,
+                "probe_mode": mode,
+                "redirects": fetched["redirects"],
+                "connection_reused": False,  # Each probe opens its own connection
+                **completed_at(),
+            }
+            status["status"], status["message"] = classify_website(status_code, response_time, site.get("degraded_ms"))
+        except asyncio.TimeoutError:
+            status = _website_error(site, "Timeout", f"Connection timeout ({timeout:g}s)")
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            # Refused/reset connections, DNS and TLS failures, or a garbled status line
+            status = _website_error(site, "Connection Error", "Connection failed")
+        except Exception as e:
+            status = _website_error(site, "Error", f"Unknown error: {str(e)[:50]}")
+
+        return status
+
+    async def _fetch(self, url, method="GET", mode="full"):
+        """Request url, following redirects.
+
+        Returns the final status code, when its headers arrived, how many
+        redirects were followed, and the DNS, TCP connect and TLS handshake
+        durations summed over every hop's connection.
+        """
+        totals = {"dns": 0.0, "connect": 0.0, "tls": 0.0}
+        for redirects in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            secure = parts.scheme == "https"
+            sock, phases = await self._connect(parts.hostname, parts.port or (443 if secure else 80))
+
+            tls_start = time.time()
+            reader, writer = await asyncio.open_connection(
+                sock=sock,
+                ssl=self._ssl_context if secure else None,
+                server_hostname=parts.hostname if secure else None,
+            )
+            phases["tls"] = time.time() - tls_start
+            for phase in totals:
+                totals[phase] += phases[phase]
+            try:
+                writer.write(_build_request(parts, method))
+                await writer.drain()
+
+                status_code = int((await reader.readline()).split()[1])
+                headers = await _read_headers(reader)
+                headers_at = time.time()
+                location = headers.get("location")
+                if status_code in REDIRECT_CODES and location:
+                    url = urljoin(url, location)
+                    continue
+
+                if method != "HEAD" and mode != "headers":
+                    # Connection: close, so the body ends when the server hangs up
+                    limit = HTTP_PROBE_MAX_BYTES if mode == "bounded" else None
+                    read_bytes = 0
+                    while limit is None or read_bytes < limit:
+                        chunk = await reader.read(65536)
+                        if not chunk:
+                            break
+                        read_bytes += len(chunk)
+                return {**totals, "headers_at": headers_at, "status_code": status_code, "redirects": redirects}
+            finally:
+                writer.close()
+
+        raise TooManyRedirects(f"Exceeded {MAX_REDIRECTS} redirects.")
+
+    # --- TCP ---
+
+    async def check_tcp_connectivity(self, endpoint):
+        """Check the status of an EC2 endpoint using TCP connectivity check"""
+        base = {"name": endpoint["name"], "ip": endpoint["ip"], "icon": endpoint["icon"]}
+        return await self._check_tcp(endpoint["ip"], base, timeout=endpoint.get("timeout", TCP_TIMEOUT),
+                                     degraded_ms=endpoint.get("degraded_ms"))
+
+    async def check_azure_connectivity(self, endpoint):
+        """Check the status of an Azure endpoint using TCP connectivity check"""
+        base = {
+            "name": endpoint["name"],
+            "endpoint": endpoint["endpoint"],
+            "region": endpoint["region"],
+            "icon": endpoint["icon"],
+        }
+        return await self._check_tcp(endpoint["endpoint"], base, timeout=endpoint.get("timeout", TCP_TIMEOUT),
+                                     degraded_ms=endpoint.get("degraded_ms"))
+
+    async def _connect(self, hostname, port):
+        """Resolve hostname and open a TCP connection; return (socket, {"dns", "connect"} seconds)"""
+        loop = asyncio.get_running_loop()
+        start = time.time()
+        address = (await dns_cache.resolve_async(hostname))[0]
+        resolved = time.time()
+
+        sock = socket.socket(address_family(address), socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, (address, port))
+        except BaseException:
+            sock.close()
+            raise
+        return sock, {"dns": resolved - start, "connect": time.time() - resolved}
+
+    async def _check_tcp(self, hostname, base, port=443, timeout=TCP_TIMEOUT, degraded_ms=None):
+        outcome = {"dns_time": None, "connect_time": None, "error": None, "timeout": timeout}
+        start_time = time.time()
+        try:
+            sock, phases = await asyncio.wait_for(self._connect(hostname, port), timeout)
+            sock.close()
+            outcome["response_time"] = int((time.time() - start_time) * 1000)  # Total time in ms
+            outcome["dns_time"] = int(phases["dns"] * 1000)
+            outcome["connect_time"] = int(phases["connect"] * 1000)
+        except asyncio.TimeoutError:
+            outcome["response_time"] = int(timeout * 1000)  # Timeout time
+            outcome["error"] = "timeout"
+        except socket.gaierror:
+            outcome["response_time"] = int((time.time() - start_time) * 1000)
+            outcome["error"] = "dns"
+        except OSError:
+            outcome["response_time"] = int((time.time() - start_time) * 1000)
+            outcome["error"] = "refused"
+        except Exception as e:
+            outcome["response_time"] = None
+            outcome["error"] = "other"
+            outcome["detail"] = e
+
+        return tcp_status(dict(base), outcome, port, degraded_ms)
+
+
+class AsyncProbeExecutor:
+    """Executor-style facade over the engine so sweeps can use as_completed()"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.futures = []
+
+    def submit(self, check, target):
+        future = self.engine.submit(check, target)
+        self.futures.append(future)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        wait(self.futures)
+        return False
+
+
+def _website_error(site, status_code, message):
+    return {
+        "name": site["name"],
+        "url": site["url"],
+        "icon": site["icon"],
+        "status": "down",
+        "status_code": status_code,
+        "response_time": None,
+        **completed_at(),
+        "message": message,
+    }
+
+
+def _build_request(parts, method="GET"):
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}"]
+    lines += [f"{key}: {value}" for key, value in BROWSER_HEADERS.items() if key != "Connection"]
+    lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _read_headers(reader):
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return headers
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
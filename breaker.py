@@ -0,0 +1,105 @@
+"""Per-target circuit breakers.
+
+A hard-down host costs a full timeout on every probe. After
+CIRCUIT_FAILURES consecutive unreachable results (timeouts, refused
+connections, DNS failures) a target's breaker opens: the target is then
+only probed every CIRCUIT_RETRY_INTERVAL seconds, with the short
+CIRCUIT_PROBE_TIMEOUT, and between those probes its last result is served
+again. Any answer from the host, even a fast HTTP 5xx, closes the breaker.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+CIRCUIT_FAILURES = int(os.environ.get("CIRCUIT_FAILURES", "3"))
+CIRCUIT_RETRY_INTERVAL = float(os.environ.get("CIRCUIT_RETRY_INTERVAL", "300"))
+CIRCUIT_PROBE_TIMEOUT = float(os.environ.get("CIRCUIT_PROBE_TIMEOUT", "3"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"  # Open, with a fail-fast probe in flight
+
+UNREACHABLE_ERRORS = ("timeout", "refused", "dns")  # tcp_status() "error"
+UNREACHABLE_CODES = ("Timeout", "Connection Error")  # Website checks' "status_code"
+
+
+def unreachable(status):
+    """Whether a probe result means the host did not answer at all"""
+    return status.get("status") == "down" and (
+        status.get("error") in UNREACHABLE_ERRORS or status.get("status_code") in UNREACHABLE_CODES)
+
+
+class CircuitBreaker:
+    """Breaker state for every target of one probe kind"""
+
+    def __init__(self, failures=CIRCUIT_FAILURES, retry_interval=CIRCUIT_RETRY_INTERVAL,
+                 probe_timeout=CIRCUIT_PROBE_TIMEOUT):
+        self.failures = failures
+        self.retry_interval = retry_interval
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._states = {}  # key -> {"state", "failures", "opened_at", "next_probe"}
+
+    def plan(self, key):
+        """Return (probe, timeout): whether to probe now, and a timeout override or None"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(key)
+            if state is None or state["state"] == CLOSED:
+                return True, None
+            if state["state"] == HALF_OPEN or now < state["next_probe"]:
+                return False, None
+            state["state"] = HALF_OPEN
+            return True, self.probe_timeout
+
+    def record(self, key, status):
+        """Update the breaker from a probe result and return its payload entry"""
+        now = time.monotonic()
+        failed = unreachable(status)
+        with self._lock:
+            state = self._states.setdefault(key, {"state": CLOSED, "failures": 0, "opened_at": None, "next_probe": 0})
+            if not failed:
+                state.update(state=CLOSED, failures=0, opened_at=None)
+            else:
+                state["failures"] += 1
+                if state["state"] == HALF_OPEN or state["failures"] >= self.failures:
+                    if state["opened_at"] is None:
+                        state["opened_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    state["state"] = OPEN
+                    state["next_probe"] = now + self.retry_interval
+            return self._payload(state, now)
+
+    def abandon(self, key):
+        """Return a half-open breaker to open when its planned probe never started"""
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None and state["state"] == HALF_OPEN:
+                state["state"] = OPEN
+
+    def skipped(self, key, previous):
+        """The last result served again while the breaker is open"""
+        with self._lock:
+            payload = self._payload(self._states[key], time.monotonic())
+        payload["skipped"] = True
+        return {**previous, "breaker": payload}
+
+    def stats(self):
+        with self._lock:
+            states = [s["state"] for s in self._states.values()]
+        return {
+            "closed": states.count(CLOSED),
+            "open": states.count(OPEN) + states.count(HALF_OPEN),
+            "failure_threshold": self.failures,
+            "retry_interval": self.retry_interval,
+            "probe_timeout": self.probe_timeout,
+        }
+
+    def _payload(self, state, now):
+        payload = {"state": state["state"], "consecutive_failures": state["failures"]}
+        if state["state"] != CLOSED:
+            payload["opened_at"] = state["opened_at"]
+            payload["next_probe_in"] = max(int(state["next_probe"] - now), 0)
+            payload["message"] = (f"Unreachable for {state['failures']} checks in a row; "
+                                  f"re-checking every {self.retry_interval:g}s with a {self.probe_timeout:g}s timeout")
+        return payload
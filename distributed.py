@@ -0,0 +1,286 @@
+"""Distributed probing: one coordinator, many worker nodes.
+
+The coordinator (PROBE_ROLE=coordinator) serves the dashboard and API but
+does not probe. The catalogs are cut into COORDINATOR_SHARDS shards by the
+same key hash the multi-process mode uses. Workers lease a fair share of the
+shards over HTTP, renew the lease while they run, probe their shards with the
+regular check functions and push batched results back. A worker that stops
+renewing loses its shards to the others once its lease expires.
+
+Start a worker on any machine that can reach the coordinator:
+
+    python distributed.py --coordinator http://status.example.com --id eu-west
+"""
+import argparse
+import json
+import math
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from breaker import UNREACHABLE_CODES
+from history_store import PHASE_COLUMNS
+from sharded import shard_of
+
+COORDINATOR_SHARDS = int(os.environ.get("COORDINATOR_SHARDS", "64"))
+COORDINATOR_LEASE_SECONDS = float(os.environ.get("COORDINATOR_LEASE_SECONDS", "30"))
+# Shared secret workers send in X-Worker-Token; a coordinator will not start without one
+COORDINATOR_TOKEN = os.environ.get("COORDINATOR_TOKEN", "")
+# Worker side: how often buffered results are pushed, and how many trigger an early push
+WORKER_PUSH_INTERVAL = float(os.environ.get("WORKER_PUSH_INTERVAL", "2"))
+WORKER_PUSH_BATCH = int(os.environ.get("WORKER_PUSH_BATCH", "500"))
+WORKER_BUFFER_LIMIT = int(os.environ.get("WORKER_BUFFER_LIMIT", "50000"))
+
+RESULT_STATUSES = ("operational", "degraded", "down")
+# A website check that got no HTTP answer reports one of these instead of a status code
+ERROR_CODES = UNREACHABLE_CODES + ("Error",)
+
+
+def status_problem(status):
+    """Why a pushed status cannot go into the live map and history, or None"""
+    if not isinstance(status, dict):
+        return "status must be an object"
+    if not isinstance(status.get("name"), str):
+        return "name must be a string"
+    if status.get("status") not in RESULT_STATUSES:
+        return f"status must be one of {', '.join(RESULT_STATUSES)}"
+    for field in ("response_time",) + PHASE_COLUMNS:
+        value = status.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return f"{field} must be a number or null"
+    status_code = status.get("status_code")
+    if status_code is not None and status_code not in ERROR_CODES and (
+            isinstance(status_code, bool) or not isinstance(status_code, int)):
+        return f"status_code must be an integer, null or one of {', '.join(ERROR_CODES)}"
+    if status.get("error") is not None and not isinstance(status["error"], str):
+        return "error must be a string or null"
+    checked_at_ms = status.get("checked_at_ms")
+    if checked_at_ms is not None and (isinstance(checked_at_ms, bool) or not isinstance(checked_at_ms, int)):
+        return "checked_at_ms must be an integer or null"
+    if status.get("last_checked") is not None:
+        try:
+            datetime.strptime(status["last_checked"], "%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
+            return "last_checked must be a \"%Y-%m-%d %H:%M:%S\" time"
+    return None
+
+
+class Coordinator:
+    """Hands out shard leases to workers and merges the results they push"""
+
+    def __init__(self, pipeline, shards=COORDINATOR_SHARDS, lease_seconds=COORDINATOR_LEASE_SECONDS):
+        self.pipeline = pipeline
+        self.shards = shards
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._leases = {}  # shard -> (worker, expires_at)
+        self._workers = {}  # worker -> {"last_seen", "results", "address"}
+
+    def lease(self, worker, address=None):
+        """Renew worker's shards, topping them up to a fair share; returns the lease dict"""
+        now = time.time()
+        with self._lock:
+            self._leases = {s: lease for s, lease in self._leases.items() if lease[1] > now}
+            info = self._workers.setdefault(worker, {"results": 0})
+            info["last_seen"] = now
+            info["address"] = address
+
+            active = [w for w, i in self._workers.items() if now - i["last_seen"] <= self.lease_seconds]
+            fair_share = math.ceil(self.shards / len(active))
+            mine = sorted(s for s, (w, _) in self._leases.items() if w == worker)
+            for shard in mine[fair_share:]:
+                del self._leases[shard]  # Rebalance towards workers that just joined
+            mine = mine[:fair_share]
+            free = [s for s in range(self.shards) if s not in self._leases]
+            mine += free[:fair_share - len(mine)]
+            for shard in mine:
+                self._leases[shard] = (worker, now + self.lease_seconds)
+
+        return {"worker": worker, "shards": sorted(mine), "total_shards": self.shards, "lease_seconds": self.lease_seconds}
+
+    def accept(self, worker, batches):
+        """Merge pushed results ({kind: {key: status}}) from shards the worker holds.
+
+        Raises ValueError, before anything is merged, if the batch is malformed
+        or holds a result for a target outside the worker's leased shards.
+        """
+        now = time.time()
+        with self._lock:
+            held = {s for s, (w, expires) in self._leases.items() if w == worker and expires > now}
+            if worker in self._workers:
+                self._workers[worker]["last_seen"] = now
+
+        if not isinstance(batches, dict):
+            raise ValueError("results must be an object of {kind: {key: status}}")
+        for name, results in batches.items():
+            kind = self.pipeline.kinds.get(name)
+            if kind is None:
+                raise ValueError(f"unknown kind {name!r}")
+            if not isinstance(results, dict):
+                raise ValueError(f"results of {name} must be an object of {{key: status}}")
+            keys = {key for key, _, _ in kind.targets()}
+            for key, status in results.items():
+                if key not in keys:
+                    raise ValueError(f"unknown {name} target {key!r}")
+                if shard_of(name, key, self.shards) not in held:
+                    raise ValueError(f"{name} target {key!r} is not in a shard leased to {worker}")
+                problem = status_problem(status)
+                if problem:
+                    raise ValueError(f"{name} target {key!r}: {problem}")
+
+        accepted = 0
+        for name, results in batches.items():
+            mine = {key: {**status, "worker": worker} for key, status in results.items()}
+            if mine:
+                self.pipeline.publish_results(name, mine)
+                accepted += len(mine)
+
+        with self._lock:
+            if worker in self._workers:
+                self._workers[worker]["results"] += accepted
+        return accepted
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            shard_counts = {}
+            for worker, expires in self._leases.values():
+                if expires > now:
+                    shard_counts[worker] = shard_counts.get(worker, 0) + 1
+            workers = {
+                worker: {
+                    "shards": shard_counts.get(worker, 0),
+                    "results": info["results"],
+                    "last_seen_seconds_ago": round(now - info["last_seen"], 1),
+                    "address": info["address"],
+                }
+                for worker, info in self._workers.items()
+            }
+        return {
+            "total_shards": self.shards,
+            "unleased_shards": self.shards - sum(shard_counts.values()),
+            "workers": workers,
+        }
+
+
+# --- worker node ---
+
+class Worker:
+    """Leases shards from a coordinator, probes them and pushes results in batches"""
+
+    def __init__(self, coordinator_url, worker_id, pipeline):
+        self.url = coordinator_url.rstrip("/")
+        self.worker_id = worker_id
+        self.pipeline = pipeline
+        self.session = requests.Session()
+        if COORDINATOR_TOKEN:
+            self.session.headers["X-Worker-Token"] = COORDINATOR_TOKEN
+        self.shards = set()
+        self.total_shards = None
+        self._buffer = {}  # kind -> {key: status}
+        self._buffered = 0
+        self._buffer_lock = threading.Lock()
+        self._flush_now = threading.Event()
+        self.dropped = 0
+
+    def start(self):
+        # Sweep scheduling re-reads the lease on every sweep, so shards can move
+        for kind in self.pipeline.kinds.values():
+            kind.targets = self._leased_targets(kind.targets, kind.name)
+        self.pipeline.forward = self._buffer_results
+
+        lease_seconds = self._renew()
+        threading.Thread(target=self._renew_forever, args=(lease_seconds,), name="worker-lease", daemon=True).start()
+        threading.Thread(target=self._push_forever, name="worker-push", daemon=True).start()
+        self.pipeline.run_forever()
+
+    def _leased_targets(self, all_targets, name):
+        def targets():
+            shards, total = self.shards, self.total_shards
+            return (job for job in all_targets() if total and shard_of(name, job[0], total) in shards)
+        return targets
+
+    def _renew(self):
+        """Renew the lease; returns the lease length to pace the next renewal"""
+        try:
+            response = self.session.post(f"{self.url}/api/workers/lease", json={"worker": self.worker_id}, timeout=10)
+            response.raise_for_status()
+            lease = response.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️ Lease renewal failed: {e}")
+            return COORDINATOR_LEASE_SECONDS
+        shards = set(lease["shards"])
+        if shards != self.shards:
+            print(f"📋 Worker {self.worker_id} now holds {len(shards)} of {lease['total_shards']} shards")
+        self.total_shards = lease["total_shards"]
+        self.shards = shards
+        return lease["lease_seconds"]
+
+    def _renew_forever(self, lease_seconds):
+        while True:
+            time.sleep(lease_seconds / 3)  # Two missed renewals still keep the lease
+            lease_seconds = self._renew()
+
+    def _buffer_results(self, name, results):
+        with self._buffer_lock:
+            if self._buffered >= WORKER_BUFFER_LIMIT:
+                self.dropped += len(results)  # Coordinator unreachable for a long time
+                return
+            batch = self._buffer.setdefault(name, {})
+            before = len(batch)
+            batch.update(results)
+            self._buffered += len(batch) - before
+            if self._buffered >= WORKER_PUSH_BATCH:
+                self._flush_now.set()
+
+    def _push_forever(self):
+        while True:
+            self._flush_now.wait(WORKER_PUSH_INTERVAL)
+            self._flush_now.clear()
+            with self._buffer_lock:
+                batches, self._buffer, self._buffered = self._buffer, {}, 0
+            if not batches:
+                continue
+            try:
+                response = self.session.post(
+                    f"{self.url}/api/workers/results",
+                    data=json.dumps({"worker": self.worker_id, "results": batches}),
+                    headers={"Content-Type": "application/json"},
+                    timeout=30,
+                )
+                if 400 <= response.status_code < 500:
+                    # Rejected as a whole, e.g. after its shards moved; resending would not help
+                    rejected = sum(len(results) for results in batches.values())
+                    with self._buffer_lock:
+                        self.dropped += rejected
+                    print(f"⚠️ Coordinator rejected {rejected} results: {response.text[:200]}")
+                    continue
+                response.raise_for_status()
+            except requests.RequestException as e:
+                print(f"⚠️ Pushing results failed, will retry: {e}")
+                with self._buffer_lock:
+                    for name, results in batches.items():
+                        # Newer results buffered meanwhile win over the failed batch
+                        merged = {**results, **self._buffer.get(name, {})}
+                        self._buffered += len(merged) - len(self._buffer.get(name, {}))
+                        self._buffer[name] = merged
+
+
+def run_worker(coordinator_url, worker_id):
+    import app  # Imported here so the coordinator does not depend on a worker's setup
+
+    print(f"🛰️ Worker {worker_id} reporting to {coordinator_url} (pid {os.getpid()})")
+    Worker(coordinator_url, worker_id, app.pipeline).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a probe worker node for a coordinator")
+    parser.add_argument("--coordinator", required=True, help="Base URL of the coordinator, e.g. http://10.0.0.5")
+    parser.add_argument("--id", default=f"{socket.gethostname()}-{os.getpid()}", help="Worker name shown by /api/workers")
+    args = parser.parse_args()
+    sys.exit(run_worker(args.coordinator, args.id))
@@ -0,0 +1,212 @@
+"""TTL-aware DNS cache shared by every checker.
+
+Answers are cached for as long as their record TTL allows (clamped to
+DNS_MIN_TTL..DNS_MAX_TTL) and NXDOMAIN answers are cached for DNS_NEGATIVE_TTL,
+so a sweep only pays for a real lookup when an answer has expired. Each update
+cycle prefetches its hostnames in parallel batches before probing starts.
+"""
+import asyncio
+import ipaddress
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+DNS_MIN_TTL = int(os.environ.get("DNS_MIN_TTL", "5"))
+DNS_MAX_TTL = int(os.environ.get("DNS_MAX_TTL", "3600"))
+DNS_NEGATIVE_TTL = int(os.environ.get("DNS_NEGATIVE_TTL", "60"))
+DNS_LIFETIME = float(os.environ.get("DNS_LIFETIME", "5"))  # seconds per lookup, all retries included
+DNS_PREFETCH_WORKERS = int(os.environ.get("DNS_PREFETCH_WORKERS", "32"))
+
+RECORD_TYPES = ("A", "AAAA")
+
+
+class DNSCache:
+    """Caches hostname -> addresses by TTL, including negative NXDOMAIN answers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # hostname -> (addresses or None for NXDOMAIN, expires_at, lookup_ms)
+        self._resolver = None
+        self._async_resolver = None
+        self.hits = 0
+        self.misses = 0
+
+    # --- lookups ---
+
+    def resolve(self, hostname):
+        """Return the addresses for hostname, raising socket.gaierror if it does not resolve"""
+        cached = self._cached(hostname)
+        if cached is not None:
+            return _addresses_or_raise(hostname, cached)
+
+        start = time.perf_counter()
+        try:
+            answer = self._lookup(self._get_resolver().resolve, hostname)
+        except dns.resolver.NXDOMAIN:
+            answer = None
+        except dns.exception.DNSException as e:
+            # Resolver unreachable or misconfigured - fall back to the system resolver, uncached
+            return _system_resolve(hostname, e)
+        if answer is None:
+            answer = _hosts_answer(hostname)
+        return _addresses_or_raise(hostname, self._store(hostname, answer, start))
+
+    async def resolve_async(self, hostname):
+        """Asyncio variant of resolve() for the event-loop probe engine"""
+        cached = self._cached(hostname)
+        if cached is not None:
+            return _addresses_or_raise(hostname, cached)
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            answer = await self._lookup_async(hostname)
+        except dns.resolver.NXDOMAIN:
+            answer = None
+        except dns.exception.DNSException as e:
+            return await loop.run_in_executor(None, _system_resolve, hostname, e)
+        if answer is None:
+            answer = await loop.run_in_executor(None, _hosts_answer, hostname)
+        return _addresses_or_raise(hostname, self._store(hostname, answer, start))
+
+    def prefetch(self, hostnames):
+        """Resolve every hostname that is not cached, in parallel; returns a summary dict"""
+        start = time.perf_counter()
+        pending = [hostname for hostname in set(hostnames) if self._cached(hostname, count=False) is None]
+        failed = 0
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(DNS_PREFETCH_WORKERS, len(pending))) as executor:
+                for ok in executor.map(self._prefetch_one, pending):
+                    failed += not ok
+        return {
+            "hosts": len(set(hostnames)),
+            "resolved": len(pending),
+            "failed": failed,
+            "duration_ms": int((time.perf_counter() - start) * 1000),
+        }
+
+    def stats(self):
+        """Cache counters plus the most recent lookup time per hostname"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_entries": len([e for e in self._entries.values() if e[0] is None]),
+                "lookup_ms": {host: entry[2] for host, entry in self._entries.items()},
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # --- internals ---
+
+    def _prefetch_one(self, hostname):
+        try:
+            self.resolve(hostname)
+            return True
+        except socket.gaierror:
+            return False
+
+    def _cached(self, hostname, count=True):
+        if _is_ip(hostname):
+            return ([hostname], 0)
+        with self._lock:
+            entry = self._entries.get(hostname)
+            fresh = entry is not None and entry[1] > time.time()
+            if count:
+                if fresh:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return (entry[0], entry[1]) if fresh else None
+
+    def _store(self, hostname, answer, start):
+        lookup_ms = int((time.perf_counter() - start) * 1000)
+        if answer is None:
+            addresses = None
+            ttl = DNS_NEGATIVE_TTL
+        else:
+            addresses, ttl = answer
+            ttl = min(max(ttl, DNS_MIN_TTL), DNS_MAX_TTL)
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._entries[hostname] = (addresses, expires_at, lookup_ms)
+        return (addresses, expires_at)
+
+    def _lookup(self, resolve, hostname):
+        """Query A then AAAA; return (addresses, ttl) or None when the name has no address"""
+        for record_type in RECORD_TYPES:
+            try:
+                answer = resolve(hostname, record_type, lifetime=DNS_LIFETIME)
+            except dns.resolver.NoAnswer:
+                continue
+            return [rdata.address for rdata in answer], answer.rrset.ttl
+        return None
+
+    async def _lookup_async(self, hostname):
+        resolver = self._get_async_resolver()
+        for record_type in RECORD_TYPES:
+            try:
+                answer = await resolver.resolve(hostname, record_type, lifetime=DNS_LIFETIME)
+            except dns.resolver.NoAnswer:
+                continue
+            return [rdata.address for rdata in answer], answer.rrset.ttl
+        return None
+
+    def _get_resolver(self):
+        if self._resolver is None:
+            self._resolver = dns.resolver.Resolver()
+        return self._resolver
+
+    def _get_async_resolver(self):
+        if self._async_resolver is None:
+            self._async_resolver = dns.asyncresolver.Resolver()
+        return self._async_resolver
+
+
+def _is_ip(hostname):
+    try:
+        ipaddress.ip_address(hostname)
+        return True
+    except ValueError:
+        return False
+
+
+def _addresses_or_raise(hostname, cached):
+    addresses, _ = cached
+    if addresses is None:
+        raise socket.gaierror(socket.EAI_NONAME, f"DNS resolution failed for {hostname}: NXDOMAIN")
+    return addresses
+
+
+def _hosts_answer(hostname):
+    """Names like "localhost" live in /etc/hosts, which dnspython does not read"""
+    try:
+        return _system_resolve(hostname, None), DNS_NEGATIVE_TTL
+    except socket.gaierror:
+        return None
+
+
+def _system_resolve(hostname, error):
+    try:
+        infos = socket.getaddrinfo(hostname, None, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise socket.gaierror(socket.EAI_NONAME, f"DNS resolution failed for {hostname}: {error or 'NXDOMAIN'}")
+    return list(dict.fromkeys(info[4][0] for info in infos))
+
+
+def address_family(address):
+    """socket.AF_INET or socket.AF_INET6 for an IP address string"""
+    return socket.AF_INET6 if ipaddress.ip_address(address).version == 6 else socket.AF_INET
+
+
+# Shared by every checker and both probe engines
+dns_cache = DNSCache()
@@ -0,0 +1,189 @@
+"""Hedged and confirmed probes.
+
+A single lost SYN or a slow handshake should not decide a target's status for
+a whole cycle. For each probe kind a HedgePolicy learns the latency
+distribution of recent answers; when a probe has not answered by that
+percentile, a second attempt is started and whichever answers first wins.
+A result that would newly mark a target down is confirmed by a bounded number
+of retries first. Extra attempts only run when the pipeline's concurrency
+budget has room for them.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY_MS = int(os.environ.get("HEDGE_MIN_DELAY_MS", "250"))  # Never hedge sooner than this
+HEDGE_WINDOW = int(os.environ.get("HEDGE_WINDOW", "500"))  # Recent answers the percentile is learned from
+HEDGE_MIN_SAMPLES = 20  # Answers needed before hedging starts
+CONFIRM_RETRIES = int(os.environ.get("CONFIRM_RETRIES", "1"))  # Extra attempts before reporting a new "down"
+
+
+class HedgePolicy:
+    """Per-kind latency percentile for hedging, plus counters for the API"""
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, min_delay_ms=HEDGE_MIN_DELAY_MS,
+                 window=HEDGE_WINDOW, confirm_retries=CONFIRM_RETRIES):
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.confirm_retries = confirm_retries
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.counters = {"probes": 0, "hedges": 0, "hedge_wins": 0, "retries": 0, "retry_recoveries": 0}
+
+    def observe(self, status):
+        """Learn from an answer that was not a failure"""
+        if status.get("status") != "down" and status.get("response_time") is not None:
+            with self._lock:
+                self._samples.append(status["response_time"])
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None while too little has been learned"""
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        index = min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)
+        return max(ordered[index], self.min_delay_ms) / 1000
+
+    def count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                "hedge_after_ms": None if delay is None else int(delay * 1000),
+                "percentile": self.percentile,
+                "samples": len(self._samples),
+                "confirm_retries": self.confirm_retries,
+                **self.counters,
+            }
+
+
+class Timers:
+    """One thread running callbacks after a delay, for every pending hedge"""
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = itertools.count()
+        self._wakeup = threading.Condition()
+        threading.Thread(target=self._run, name="hedge-timers", daemon=True).start()
+
+    def call_later(self, delay, callback):
+        with self._wakeup:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._sequence), callback))
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._wakeup.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, callback = heapq.heappop(self._heap)
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in hedge timer: {e}")
+
+
+class HedgedProbe:
+    """Runs one logical probe as up to a primary, a hedge and confirmation retries.
+
+    The returned Future resolves to the winning status dict, annotated with
+    "attempts", "hedged" and "hedged_latency" (ms until the winning answer).
+    """
+
+    def __init__(self, submit, policy, timers, previous_state, try_acquire, release):
+        self.submit = submit  # () -> Future of one attempt
+        self.policy = policy
+        self.timers = timers
+        self.try_acquire = try_acquire  # Non-blocking budget slot for an extra attempt
+        self.release = release
+        self.future = Future()
+        self.started = time.perf_counter()
+        self.attempts = 0
+        self.outstanding = 0
+        self.hedge_started = False
+        self.retries_left = policy.confirm_retries if previous_state != "down" else 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.policy.count("probes")
+        self._launch("primary", extra=False)
+        delay = self.policy.hedge_delay()
+        if delay is not None:
+            self.timers.call_later(delay, self._hedge)
+        return self.future
+
+    def _launch(self, role, extra=True):
+        with self._lock:
+            self.attempts += 1
+            self.outstanding += 1
+        try:
+            attempt = self.submit()
+        except Exception as e:
+            self._done(role, extra, None, e)
+            return
+        attempt.add_done_callback(lambda f: self._done(role, extra, f))
+
+    def _hedge(self):
+        with self._lock:
+            if self.future.done() or self.hedge_started or self.outstanding != 1:
+                return
+            self.hedge_started = True
+        if not self.try_acquire():
+            return  # No spare capacity; let the primary finish on its own
+        self.policy.count("hedges")
+        self._launch("hedge")
+
+    def _done(self, role, extra, attempt, error=None):
+        if extra:
+            self.release()
+        status = None
+        if attempt is not None:
+            try:
+                status = attempt.result()
+            except Exception as e:
+                error = e
+        failed = status is None or status.get("status") == "down"
+
+        with self._lock:
+            self.outstanding -= 1
+            if self.future.done():
+                return
+            if failed and self.outstanding > 0:
+                return  # Another attempt is still in flight and may succeed
+            retry = failed and self.retries_left > 0
+            if retry:
+                self.retries_left -= 1
+            else:
+                self._finish(role, status, error)
+                return
+
+        if self.try_acquire():
+            self.policy.count("retries")
+            self._launch("retry")
+        else:
+            with self._lock:
+                self._finish(role, status, error)
+
+    def _finish(self, role, status, error):
+        # Must hold self._lock
+        if status is None:
+            self.future.set_exception(error or RuntimeError("Probe failed"))
+            return
+        status["attempts"] = self.attempts
+        status["hedged"] = role == "hedge"
+        status["hedged_latency"] = int((time.perf_counter() - self.started) * 1000)
+        if role == "hedge":
+            self.policy.count("hedge_wins")
+        elif role == "retry" and status.get("status") != "down":
+            self.policy.count("retry_recoveries")
+        self.policy.observe(status)
+        self.future.set_result(status)
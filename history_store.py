@@ -0,0 +1,1033 @@
+"""History storage: schema, connections and write-behind persistence.
+
+Readers and the writer share status_history.db in WAL mode, so API reads
+never block on writes and vice versa. Routes borrow connections from a small
+ReadPool instead of connecting per request, and all writes go through one
+HistoryWriter connection.
+
+Probe results never wait on SQLite: store_status() only puts a row on a
+bounded queue, and one writer thread drains it, writing batches with one
+executemany() per transaction. A batch is written at the end of every sweep,
+whenever HISTORY_FLUSH_SIZE rows are waiting, and at least every
+HISTORY_FLUSH_INTERVAL seconds. When the queue is full, HISTORY_QUEUE_POLICY
+decides whether new rows are dropped or the publisher waits for room. The
+queue is written out on shutdown.
+
+Checks are stored compactly: targets and error labels are stored once and
+referenced by integer id, statuses are small integers and timestamps UTC
+epoch milliseconds. Databases from before this schema keep their original
+history table until LegacyHistoryMigration has moved it into checks in the
+background, newest rows first. /api/history returns the same fields and
+formats as before.
+
+Every write also updates per-target rollups (check counts by status and
+latency sum/min/max per UTC minute, hour and day), so uptime over any window is
+summed from a few rollup rows instead of counting raw history.
+
+Run `python history_store.py --benchmark` to compare concurrent reads and
+writes against the old connect-per-call, rollback-journal setup,
+`python history_store.py --benchmark-indexes` to time the read paths on a
+synthetic year of history with and without the indexes, and
+`python history_store.py --benchmark-pages` to compare deep history pages
+reached by offset and by cursor.
+"""
+import argparse
+import atexit
+import os
+import queue
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+HISTORY_FLUSH_INTERVAL = float(os.environ.get("HISTORY_FLUSH_INTERVAL", "5"))  # seconds
+HISTORY_FLUSH_SIZE = int(os.environ.get("HISTORY_FLUSH_SIZE", "500"))  # rows
+HISTORY_QUEUE_SIZE = int(os.environ.get("HISTORY_QUEUE_SIZE", "10000"))  # rows
+HISTORY_QUEUE_POLICY = os.environ.get("HISTORY_QUEUE_POLICY", "drop").lower()  # "drop" or "block"
+HISTORY_SHUTDOWN_TIMEOUT = float(os.environ.get("HISTORY_SHUTDOWN_TIMEOUT", "10"))  # seconds
+HISTORY_RETRY_LIMIT = 10  # Batches of HISTORY_FLUSH_SIZE kept while the database rejects writes
+HISTORY_RETRY_DELAY = 1  # Seconds between attempts after a failed write
+
+SQLITE_CACHE_MB = int(os.environ.get("SQLITE_CACHE_MB", "16"))  # Page cache per connection
+SQLITE_MMAP_MB = int(os.environ.get("SQLITE_MMAP_MB", "128"))  # Memory-mapped reads per connection
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", "5"))  # seconds
+SQLITE_READ_CONNECTIONS = int(os.environ.get("SQLITE_READ_CONNECTIONS", "8"))  # Idle readers kept open
+
+# Latency phases recorded per check, in ms (None when a phase did not happen)
+PHASE_COLUMNS = ("dns_time", "connect_time", "tls_time", "ttfb", "download_time")
+
+# A history row, as queued by store_status(): (kind, name, url, status,
+# status_code, response_time, checked_at, *PHASE_COLUMNS), with kind the probe
+# kind ("websites", "ec2", ...), status_code a string ("200", "Timeout", "None")
+# and checked_at the UTC epoch ms the probe completed at. The original history
+# table has the same columns but kind, only ever held websites, and has
+# checked_at as "%Y-%m-%d %H:%M:%S" local time
+HISTORY_FIELDS = ("kind", "name", "url", "status", "status_code", "response_time", "checked_at") + PHASE_COLUMNS
+LEGACY_KIND = "websites"
+
+# Stored compactly: checks.status is an index into STATUSES, a numeric HTTP
+# status goes in status_code and anything else ("Timeout", ...) in error_code,
+# an id in error_codes; checked_at is UTC epoch milliseconds
+STATUSES = ("operational", "degraded", "down", "unknown")
+
+CHECKS_INSERT = f"""
+    INSERT INTO checks (id, target_id, checked_at, status, status_code, error_code, response_time, {", ".join(PHASE_COLUMNS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?, {", ".join("?" for _ in PHASE_COLUMNS)})
+"""
+
+# Index name -> definition, matched to the queries below. SQLite appends the
+# rowid (id) to every index entry, so each one also serves the (checked_at, id)
+# keyset of history pages.
+CHECKS_INDEXES = {
+    # One target's checks, newest first or in a time range; with status included
+    # it also covers uptime counts without touching the table
+    "checks_target_time": "(target_id, checked_at, status)",
+    "checks_time": "(checked_at)",  # Every target's checks in a time range
+    # Only the checks that were not operational, which are few, so filtering
+    # every target's history by a problem status does not scan the rest
+    "checks_problem_time": "(checked_at) WHERE status != 0",
+}
+
+HISTORY_MIGRATION_BATCH = 5000  # Rows moved per transaction from the original history table
+HISTORY_MIGRATION_PAUSE = 0.05  # seconds between batches
+
+ROLLUP_DAY_RETENTION_DAYS = float(os.environ.get("ROLLUP_DAY_RETENTION_DAYS", "0"))  # 0 keeps them forever
+ROLLUP_HOUR_RETENTION_DAYS = float(os.environ.get("ROLLUP_HOUR_RETENTION_DAYS", "120"))
+ROLLUP_MINUTE_RETENTION_DAYS = float(os.environ.get("ROLLUP_MINUTE_RETENTION_DAYS", "2"))
+
+# Per-target check counts and latency per UTC minute, hour and day, kept up
+# to date as rows are written: (table, bucket width in ms, how long buckets
+# are kept or None). A bucket is the UTC epoch ms its span starts at. Coarser
+# rollups are kept longer; retention.py deletes expired buckets.
+ROLLUPS = tuple(
+    (table, width, timedelta(days=days) if days > 0 else None)
+    for table, width, days in (
+        ("history_rollup_day", 86400000, ROLLUP_DAY_RETENTION_DAYS),
+        ("history_rollup_hour", 3600000, ROLLUP_HOUR_RETENTION_DAYS),
+        ("history_rollup_minute", 60000, ROLLUP_MINUTE_RETENTION_DAYS),
+    )
+)
+ROLLUP_COLUMNS = ("checks", "operational", "degraded", "down", "latency_sum", "latency_count", "latency_min", "latency_max")
+UPTIME_WINDOWS = {"24h": timedelta(days=1), "7d": timedelta(days=7), "30d": timedelta(days=30), "90d": timedelta(days=90)}
+
+
+def connect(path, readonly=False):
+    """Open a tuned connection; the writer's also switches the file to WAL"""
+    conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+    if not readonly:
+        # Lets retention.py hand freed pages back a few at a time. Only takes effect
+        # on a new database, or on an existing one after `python retention.py --vacuum`,
+        # and has to come before anything initializes the file
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")  # Persistent; readers keep reading during writes
+    conn.execute("PRAGMA synchronous=NORMAL")  # In WAL mode, fsync at checkpoints instead of every commit
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    if readonly:
+        conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+def migrate(conn):
+    """Create the tables and indexes, and bring older databases up to date.
+
+    The original history table, if any, is left for LegacyHistoryMigration
+    to move into checks in the background.
+    """
+    # A target is a name within its kind: a website and an EC2 endpoint may share one
+    conn.execute("CREATE TABLE IF NOT EXISTS targets (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, name TEXT NOT NULL, "
+                 "url TEXT, UNIQUE (kind, name))")
+    conn.execute("CREATE TABLE IF NOT EXISTS error_codes (id INTEGER PRIMARY KEY, label TEXT NOT NULL UNIQUE)")
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS checks (
+            id INTEGER PRIMARY KEY,
+            target_id INTEGER NOT NULL REFERENCES targets (id),
+            checked_at INTEGER NOT NULL,
+            status INTEGER NOT NULL,
+            status_code INTEGER,
+            error_code INTEGER REFERENCES error_codes (id),
+            response_time INTEGER,
+            {", ".join(f"{column} INTEGER" for column in PHASE_COLUMNS)}
+        )
+        """
+    )
+    for index, definition in CHECKS_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON checks{definition}")
+
+    legacy = _has_legacy_history(conn)
+    if legacy:
+        # Per-phase latency columns were added after the first release
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(history)")}
+        for column in PHASE_COLUMNS:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE history ADD COLUMN {column} INTEGER")
+        # Its targets get their ids now, with the url of their newest row, so the
+        # rollups below can be keyed by them before the rows are moved
+        conn.execute(
+            "INSERT INTO targets (kind, name, url) SELECT ?, name, url FROM "
+            "(SELECT name, url, MAX(id) FROM history WHERE name IS NOT NULL GROUP BY name) WHERE 1 "
+            "ON CONFLICT DO NOTHING",
+            (LEGACY_KIND,),
+        )
+        if conn.execute("SELECT 1 FROM checks LIMIT 1").fetchone() is None:
+            # Moved rows keep their ids. Taking the newest one now puts every new
+            # check after all of them
+            _move_legacy_rows(conn, 1)
+    conn.commit()
+
+    # Checks in both formats as (target_id, status, response_time, checked_at in
+    # UTC epoch ms), the way the rollups bucket them
+    source = (
+        "SELECT c.target_id AS target_id, CASE c.status "
+        + " ".join(f"WHEN {i} THEN '{status}'" for i, status in enumerate(STATUSES))
+        + " END AS status, c.response_time AS response_time, c.checked_at AS checked_at FROM checks c"
+    )
+    if legacy:
+        source += (" UNION ALL SELECT t.id, h.status, h.response_time, "
+                   "CAST(strftime('%s', h.checked_at, 'utc') AS INTEGER) * 1000 FROM history h "
+                   f"JOIN targets t ON t.kind = '{LEGACY_KIND}' AND t.name = h.name")
+    for table, width, _ in ROLLUPS:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+            continue
+        conn.execute(
+            f"""
+            CREATE TABLE {table} (
+                target_id INTEGER NOT NULL REFERENCES targets (id),
+                bucket INTEGER NOT NULL,
+                checks INTEGER NOT NULL DEFAULT 0,
+                operational INTEGER NOT NULL DEFAULT 0,
+                degraded INTEGER NOT NULL DEFAULT 0,
+                down INTEGER NOT NULL DEFAULT 0,
+                latency_sum INTEGER NOT NULL DEFAULT 0,
+                latency_count INTEGER NOT NULL DEFAULT 0,
+                latency_min INTEGER,
+                latency_max INTEGER,
+                PRIMARY KEY (target_id, bucket)
+            ) WITHOUT ROWID
+            """
+        )
+        # Roll up the checks written before this table existed
+        print(f"🗂️ Building {table} from existing history")
+        conn.execute(
+            f"""
+            INSERT INTO {table} (target_id, bucket, {", ".join(ROLLUP_COLUMNS)})
+            SELECT target_id, checked_at - checked_at % {width}, COUNT(*),
+                   SUM(status='operational'), SUM(status='degraded'), SUM(status='down'),
+                   COALESCE(SUM(response_time), 0), COUNT(response_time), MIN(response_time), MAX(response_time)
+            FROM ({source})
+            WHERE checked_at IS NOT NULL
+            GROUP BY 1, 2
+            """
+        )
+    conn.commit()
+
+
+def _has_legacy_history(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='history'").fetchone() is not None
+
+
+def _move_legacy_rows(conn, limit):
+    """Move the newest rows of the original history table to checks; returns how many"""
+    rows = conn.execute(f"SELECT id, ?, {', '.join(HISTORY_FIELDS[1:])} FROM history ORDER BY id DESC LIMIT ?",
+                        (LEGACY_KIND, limit)).fetchall()
+    if rows:
+        insert_checks(conn, [row[1:] for row in rows], update_urls=False, ids=[row[0] for row in rows])
+        conn.execute("DELETE FROM history WHERE id >= ?", (rows[-1][0],))
+    return len(rows)
+
+
+@lru_cache(maxsize=4096)
+def _epoch_ms(checked_at):
+    """UTC epoch ms of a local "%Y-%m-%d %H:%M:%S" time"""
+    return int(datetime.strptime(checked_at, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+
+
+def _checked_at_ms(checked_at, now):
+    """UTC epoch ms of a row's checked_at (see HISTORY_FIELDS); now when it has none"""
+    if checked_at is None:
+        return now
+    return _epoch_ms(checked_at) if isinstance(checked_at, str) else int(checked_at)
+
+
+def _format_time(epoch_ms):
+    return datetime.fromtimestamp(epoch_ms / 1000).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _target_ids(conn, urls, update_urls=True):
+    """Ids of the targets in {(kind, name): url}, adding any that are new"""
+    for (kind, name), url in urls.items():
+        conn.execute(
+            "INSERT INTO targets (kind, name, url) VALUES (?, ?, ?) ON CONFLICT (kind, name) DO "
+            + ("UPDATE SET url = excluded.url WHERE url IS NOT excluded.url" if update_urls else "NOTHING"),
+            (kind, name, url),
+        )
+    keys = list(urls)
+    rows = conn.execute(
+        f"SELECT kind, name, id FROM targets WHERE (kind, name) IN (VALUES {', '.join('(?, ?)' for _ in keys)})",
+        [part for key in keys for part in key],
+    )
+    return {(kind, name): target_id for kind, name, target_id in rows}
+
+
+def _error_ids(conn, labels):
+    """Ids of error labels such as "Timeout", adding any that are new"""
+    labels = list(labels)
+    conn.executemany("INSERT INTO error_codes (label) VALUES (?) ON CONFLICT (label) DO NOTHING", [(l,) for l in labels])
+    return dict(conn.execute(f"SELECT label, id FROM error_codes WHERE label IN ({', '.join('?' for _ in labels)})", labels))
+
+
+def insert_checks(conn, rows, update_urls=True, ids=None):
+    """Write a batch of HISTORY_FIELDS rows to checks, in the caller's transaction.
+
+    Targets and error labels get their ids on first sight. update_urls=False
+    keeps the stored url of a known target, for rows older than it; ids gives
+    the rows' own ids instead of new ones.
+    """
+    kept = [(check_id, row) for check_id, row in zip(ids or [None] * len(rows), rows) if row[1] is not None]
+    if not kept:
+        return
+    ids, rows = zip(*kept)
+    targets = _target_ids(conn, {(row[0], row[1]): row[2] for row in rows}, update_urls)
+    codes = [None if row[4] in (None, "None") else str(row[4]) for row in rows]
+    errors = _error_ids(conn, {code for code in codes if code is not None and not code.isdigit()})
+    now = int(time.time() * 1000)
+    checks = []
+    for (kind, name, _, status, _, response_time, checked_at, *phases), code, check_id in zip(rows, codes, ids):
+        checks.append((
+            check_id,
+            targets[kind, name],
+            _checked_at_ms(checked_at, now),
+            STATUSES.index(status if status in STATUSES else "unknown"),
+            int(code) if code is not None and code.isdigit() else None,
+            errors.get(code),
+            response_time,
+            *phases,
+        ))
+    conn.executemany(CHECKS_INSERT, checks)
+
+
+def update_rollups(conn, rows):
+    """Add a batch of HISTORY_FIELDS rows to the rollup tables, in the caller's transaction"""
+    rows = [row for row in rows if row[1] is not None]
+    if not rows:
+        return
+    now = int(time.time() * 1000)
+    targets = _target_ids(conn, {(row[0], row[1]): row[2] for row in rows}, update_urls=False)
+    checks = [(targets[row[0], row[1]], row[3], row[5], _checked_at_ms(row[6], now)) for row in rows]
+    for table, width, _ in ROLLUPS:
+        buckets = {}
+        for target_id, status, response_time, checked_at in checks:
+            bucket = buckets.setdefault((target_id, checked_at - checked_at % width), [0, 0, 0, 0, 0, 0, None, None])
+            bucket[0] += 1
+            if status in ("operational", "degraded", "down"):
+                bucket[("operational", "degraded", "down").index(status) + 1] += 1
+            if response_time is not None:
+                bucket[4] += response_time
+                bucket[5] += 1
+                bucket[6] = response_time if bucket[6] is None else min(bucket[6], response_time)
+                bucket[7] = response_time if bucket[7] is None else max(bucket[7], response_time)
+        conn.executemany(
+            f"""
+            INSERT INTO {table} (target_id, bucket, {", ".join(ROLLUP_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (target_id, bucket) DO UPDATE SET
+                checks = checks + excluded.checks,
+                operational = operational + excluded.operational,
+                degraded = degraded + excluded.degraded,
+                down = down + excluded.down,
+                latency_sum = latency_sum + excluded.latency_sum,
+                latency_count = latency_count + excluded.latency_count,
+                latency_min = CASE WHEN latency_min IS NULL OR excluded.latency_min < latency_min
+                                   THEN excluded.latency_min ELSE latency_min END,
+                latency_max = CASE WHEN latency_max IS NULL OR excluded.latency_max > latency_max
+                                   THEN excluded.latency_max ELSE latency_max END
+            """,
+            [key + tuple(values) for key, values in buckets.items()],
+        )
+
+
+def _time_filter(start, end):
+    """SQL for an optional checked_at range; bounds are datetimes in local time"""
+    sql, params = "", []
+    if start:
+        sql += " AND c.checked_at >= ?"
+        params.append(int(start.timestamp() * 1000))
+    if end:
+        sql += " AND c.checked_at < ?"
+        params.append(int(end.timestamp() * 1000))
+    return sql, params
+
+
+def _target_filter(name, kind, column="c.target_id"):
+    """SQL for an optional target name and kind; a name alone matches it in every kind"""
+    if name is not None and kind is not None:
+        return f" AND {column} = (SELECT id FROM targets WHERE kind = ? AND name = ?)", [kind, name]
+    if name is not None:
+        return f" AND {column} IN (SELECT id FROM targets WHERE name = ?)", [name]
+    if kind is not None:
+        # Unary + keeps the planner off the per-target index, which would have to sort
+        # every check of the kind; it walks checks_time newest first and stops at the limit
+        return f" AND +{column} IN (SELECT id FROM targets WHERE kind = ?)", [kind]
+    return "", []
+
+
+def _page_filter(statuses, cursor):
+    """SQL for optional status names and a cursor from an earlier page"""
+    sql, params = "", []
+    if statuses:
+        sql += f" AND c.status IN ({', '.join('?' for _ in statuses)})"
+        params += [STATUSES.index(status) for status in statuses]
+        if "operational" not in statuses:
+            sql += " AND c.status != 0"  # Spelled out so checks_problem_time can serve it
+    if cursor:
+        # Row-value comparison: a range seek on (checked_at, id), however deep the page
+        sql += " AND (c.checked_at, c.id) < (?, ?)"
+        params += parse_cursor(cursor)
+    return sql, params
+
+
+def parse_cursor(cursor):
+    """(checked_at, id) from a next_cursor string; raises ValueError"""
+    checked_at, check_id = cursor.split(":")
+    return int(checked_at), int(check_id)
+
+
+# Selected for every history entry; _check() turns them back into the
+# original fields and formats
+CHECK_SELECT = (f"c.status, c.status_code, e.label, c.response_time, c.checked_at, "
+                f"{', '.join('c.' + column for column in PHASE_COLUMNS)}")
+
+
+def _check(r):
+    return {
+        "status": STATUSES[r[0]],
+        "status_code": str(r[1]) if r[1] is not None else r[2] or "None",
+        "response_time": r[3],
+        "checked_at": _format_time(r[4]),
+        **dict(zip(PHASE_COLUMNS, r[5:])),
+    }
+
+
+def site_history(conn, name, limit, offset=0, start=None, end=None, statuses=None, cursor=None, kind="websites"):
+    """Newest checks of one target first (served by checks_target_time)"""
+    return history_page(conn, limit, name, offset, start, end, statuses, cursor, kind)[0]
+
+
+def all_history(conn, limit, offset=0, start=None, end=None, statuses=None, cursor=None):
+    """Newest checks of every target first (served by checks_time)"""
+    return history_page(conn, limit, None, offset, start, end, statuses, cursor)[0]
+
+
+def history_page(conn, limit, name=None, offset=0, start=None, end=None, statuses=None, cursor=None, kind=None):
+    """One page of checks, newest first, and the cursor of the next page (None after the last).
+
+    Pass a page's next_cursor back to get the checks after it: unlike offset,
+    the cost does not grow with depth and rows written meanwhile do not shift
+    the pages. Every target's checks carry their kind, name and url.
+    """
+    target, params = _target_filter(name, kind)
+    where, time_params = _time_filter(start, end)
+    page_where, page_params = _page_filter(statuses, cursor)
+    select, join = "", ""
+    if name is None:
+        select, join = "t.kind, t.name, t.url, ", "JOIN targets t ON t.id = c.target_id "
+    rows = conn.execute(
+        f"SELECT c.checked_at, c.id, {select}{CHECK_SELECT} FROM checks c {join}"
+        f"LEFT JOIN error_codes e ON e.id = c.error_code "
+        f"WHERE 1{target}{where}{page_where} ORDER BY c.checked_at DESC, c.id DESC LIMIT ? OFFSET ?",
+        (*params, *time_params, *page_params, limit, offset),
+    ).fetchall()
+    if name is None:
+        history = [{"kind": r[2], "name": r[3], "url": r[4], **_check(r[5:])} for r in rows]
+    else:
+        history = [_check(r[2:]) for r in rows]
+    # A full page may have more after it; its last row is where the next one starts
+    next_cursor = f"{rows[-1][0]}:{rows[-1][1]}" if rows and len(rows) == limit else None
+    return history, next_cursor
+
+
+def uptime_counts(conn, name, start=None, end=None, kind=None):
+    """(total, operational) checks of one target, from the covering checks_target_time index"""
+    target, params = _target_filter(name, kind)
+    where, time_params = _time_filter(start, end)
+    total, operational = conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(c.status = 0), 0) FROM checks c WHERE 1{target}{where}",
+        (*params, *time_params),
+    ).fetchone()
+    return total, operational
+
+
+def _rollup_spans(start, end, level=0):
+    """Split [start, end) epoch ms into (table, first, last) spans of whole days, then hours, then minutes"""
+    table, width, _ = ROLLUPS[level]
+    if level == len(ROLLUPS) - 1:
+        return [(table, start, end)] if start < end else []
+    first = start - start % width
+    if first != start:
+        first += width
+    last = end - end % width
+    if first >= last:
+        return _rollup_spans(start, end, level + 1)
+    return _rollup_spans(start, first, level + 1) + [(table, first, last)] + _rollup_spans(last, end, level + 1)
+
+
+def _widen(moment, now, round_up=False):
+    """Round epoch ms out to a bucket of the finest rollup still kept for its age"""
+    width = ROLLUPS[-1][1]
+    for level in range(len(ROLLUPS) - 1, 0, -1):
+        keep = ROLLUPS[level][2]
+        if keep is None or now - moment <= keep / timedelta(milliseconds=1):
+            break
+        width = ROLLUPS[level - 1][1]
+    floor = moment - moment % width
+    return floor + width if round_up and floor != moment else floor
+
+
+def rollup_uptime(conn, name, start=None, end=None, kind=None):
+    """Check counts and latency of one target over [start, end), summed from a few rollup rows.
+
+    Without bounds this is all time, from the daily rollups. Bounds are
+    datetimes in local time, widened to whole UTC minutes, or to whole hours
+    or days once the finer rollups have expired.
+    """
+    if start is None and end is None:
+        spans = [(ROLLUPS[0][0], None, None)]
+    else:
+        now = int(time.time() * 1000)
+        start = int(start.timestamp() * 1000) if start else 0
+        end = int(end.timestamp() * 1000) if end else now
+        spans = _rollup_spans(_widen(start, now), _widen(end, now, round_up=True))
+    totals = dict.fromkeys(ROLLUP_COLUMNS, 0)
+    totals["latency_min"] = totals["latency_max"] = None
+    target, target_params = _target_filter(name, kind, column="target_id")
+    for table, first, last in spans:
+        where, params = "", []
+        if first is not None:
+            where, params = " AND bucket >= ? AND bucket < ?", [first, last]
+        row = conn.execute(
+            f"SELECT COALESCE(SUM(checks), 0), COALESCE(SUM(operational), 0), COALESCE(SUM(degraded), 0), "
+            f"COALESCE(SUM(down), 0), COALESCE(SUM(latency_sum), 0), COALESCE(SUM(latency_count), 0), "
+            f"MIN(latency_min), MAX(latency_max) FROM {table} WHERE 1{target}{where}",
+            (*target_params, *params),
+        ).fetchone()
+        for column, value in zip(ROLLUP_COLUMNS[:6], row[:6]):
+            totals[column] += value
+        if row[6] is not None:
+            totals["latency_min"] = row[6] if totals["latency_min"] is None else min(totals["latency_min"], row[6])
+            totals["latency_max"] = row[7] if totals["latency_max"] is None else max(totals["latency_max"], row[7])
+    return {
+        "total_checks": totals["checks"],
+        "operational_checks": totals["operational"],
+        "degraded_checks": totals["degraded"],
+        "down_checks": totals["down"],
+        "uptime_percentage": round(totals["operational"] / totals["checks"] * 100, 2) if totals["checks"] else None,
+        "avg_response_time": round(totals["latency_sum"] / totals["latency_count"]) if totals["latency_count"] else None,
+        "min_response_time": totals["latency_min"],
+        "max_response_time": totals["latency_max"],
+    }
+
+
+class ReadPool:
+    """Read-only connections reused across requests.
+
+    Flask's server runs each request on a new thread, so connections are
+    borrowed from a shared pool for the duration of one request rather than
+    pinned to a thread.
+    """
+
+    def __init__(self, path, size=SQLITE_READ_CONNECTIONS):
+        self.path = path  # () -> database path, read on every checkout
+        self.size = size
+        self._idle = []  # (path, connection)
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    @contextmanager
+    def connection(self):
+        path = self.path()
+        conn = None
+        with self._lock:
+            while self._idle and conn is None:
+                idle_path, idle = self._idle.pop()
+                if idle_path == path:
+                    conn = idle
+                    self.reused += 1
+                else:
+                    idle.close()  # The database was moved (tests, benchmarks)
+        if conn is None:
+            conn = connect(path, readonly=True)
+            with self._lock:
+                self.opened += 1
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append((path, conn))
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "size": self.size, "opened": self.opened, "reused": self.reused}
+
+
+class LegacyHistoryMigration:
+    """Moves the original history table into checks in the background.
+
+    Newest rows go first, so recent history is back in the API right away,
+    and rows keep their ids, so checks in the same second keep their order.
+    Each batch is copied and deleted from history in one transaction, which
+    makes the move safe to interrupt and resume, and the emptied table is
+    dropped at the end. Rollups already cover these rows and are untouched.
+    """
+
+    def __init__(self, connect, batch=HISTORY_MIGRATION_BATCH, pause=HISTORY_MIGRATION_PAUSE):
+        self.connect = connect  # () -> sqlite3.Connection
+        self.batch = batch
+        self.pause = pause
+        self.state = "idle"
+        self.moved = 0
+        self.remaining = None
+
+    def start(self):
+        threading.Thread(target=self.run, name="history-migration", daemon=True).start()
+
+    def run(self):
+        conn = self.connect()
+        try:
+            if not _has_legacy_history(conn):
+                self.state = "done"
+                return
+            self.state = "running"
+            self.remaining = conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+            print(f"🗂️ Moving {self.remaining} history rows to the compact checks table in the background")
+            started = time.perf_counter()
+            while self._move_batch(conn):
+                time.sleep(self.pause)  # Let the history writer in
+            with conn:
+                conn.execute("DROP TABLE history")
+            self.state = "done"
+            print(f"✅ Moved {self.moved} history rows in {time.perf_counter() - started:.1f}s")
+        except sqlite3.Error as e:
+            self.state = "failed"
+            print(f"Error moving history rows: {e}; they stay in the history table until the next start")
+        finally:
+            conn.close()
+
+    def stats(self):
+        return {"state": self.state, "moved": self.moved, "remaining": self.remaining}
+
+    def _move_batch(self, conn):
+        with conn:
+            moved = _move_legacy_rows(conn, self.batch)
+        self.moved += moved
+        self.remaining = max(self.remaining - moved, 0)
+        return moved > 0
+
+
+class _Marker:
+    """Queue item asking the writer to write what it has (and maybe stop)"""
+
+    def __init__(self, stop=False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
+class HistoryWriter:
+    """Bounded write-behind queue for history rows, drained by one writer thread"""
+
+    def __init__(self, connect, insert, flush_interval=HISTORY_FLUSH_INTERVAL, flush_size=HISTORY_FLUSH_SIZE,
+                 queue_size=HISTORY_QUEUE_SIZE, policy=HISTORY_QUEUE_POLICY, after_insert=None):
+        self.connect = connect  # () -> sqlite3.Connection, e.g. connect(path); only used by the writer thread
+        self.insert = insert  # (conn, rows) -> None, e.g. insert_checks
+        self.after_insert = after_insert  # (conn, rows) -> None, run in the same transaction, e.g. update_rollups
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.policy = policy if policy in ("drop", "block") else "drop"
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._conn = None
+        self._lock = threading.Lock()  # Guards the counters
+        self.counters = {"enqueued": 0, "rows_written": 0, "batches": 0, "rows_dropped": 0,
+                         "blocked": 0, "blocked_ms": 0, "write_errors": 0}
+        self.high_water = 0
+        self.last_flush_ms = None
+        self.last_lag_ms = None  # Time the oldest row of the last batch spent queued
+        self._failing = None  # Error of the last write, if it failed; each new error is logged once
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, row):
+        """Queue one row; never touches the database"""
+        item = (time.monotonic(), row)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.policy == "drop":
+                self._count("rows_dropped")
+                if self.counters["rows_dropped"] % 1000 == 1:
+                    print(f"⚠️ History queue full ({self._queue.maxsize} rows); "
+                          f"{self.counters['rows_dropped']} rows dropped so far")
+                return
+            start = time.perf_counter()
+            self._queue.put(item)
+            self._count("blocked")
+            self._count("blocked_ms", int((time.perf_counter() - start) * 1000))
+        self._count("enqueued")
+        depth = self._queue.qsize()
+        if depth > self.high_water:
+            self.high_water = depth
+
+    def flush(self, wait=False, timeout=None):
+        """Ask the writer to write everything queued so far; optionally wait for it"""
+        marker = _Marker()
+        try:
+            self._queue.put(marker, timeout=timeout) if wait else self._queue.put_nowait(marker)
+        except queue.Full:
+            return False  # The writer is busy draining a full queue anyway
+        return marker.done.wait(timeout) if wait else True
+
+    def close(self, timeout=HISTORY_SHUTDOWN_TIMEOUT):
+        """Write out the queue and stop the writer thread"""
+        if not self._thread.is_alive():
+            return True
+        marker = _Marker(stop=True)
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            print(f"⚠️ History queue still full after {timeout:g}s; {self._queue.qsize()} rows not written")
+            return False
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"⚠️ History writer did not finish within {timeout:g}s")
+            return False
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "policy": self.policy,
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "high_water": self.high_water,
+                **self.counters,
+                "last_flush_ms": self.last_flush_ms,
+                "last_lag_ms": self.last_lag_ms,
+            }
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def _run(self):
+        pending = []  # (queued_at, row) not yet written
+        deadline = None
+        while True:
+            timeout = None if not pending else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # Flush interval elapsed
+            if isinstance(item, tuple):
+                pending.append(item)
+                if len(pending) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(pending) < self.flush_size:
+                    continue
+            while pending and not self._write(pending):
+                if isinstance(item, _Marker) and item.stop:
+                    break  # Shutting down; the database is not taking writes
+                pending = self._trim(pending)
+                time.sleep(HISTORY_RETRY_DELAY)
+            else:
+                pending = []
+            deadline = time.monotonic() + self.flush_interval
+            if isinstance(item, _Marker):
+                item.done.set()
+                if item.stop:
+                    self._close_connection()
+                    return
+
+    def _write(self, pending):
+        """Write pending rows in one transaction; returns False if the database refused them.
+
+        Rows that fail for any other reason are dropped, since retrying would fail again.
+        """
+        start = time.perf_counter()
+        try:
+            if self._conn is None:
+                self._conn = self.connect()
+            rows = [row for _, row in pending]
+            with self._conn:  # One transaction, committed once
+                self.insert(self._conn, rows)
+                if self.after_insert:
+                    self.after_insert(self._conn, rows)
+        except sqlite3.Error as e:
+            self._count("write_errors")
+            if str(e) != self._failing:
+                print(f"Error writing {len(pending)} history rows: {e}; retrying every {HISTORY_RETRY_DELAY}s")
+            self._failing = str(e)
+            return False
+        except Exception as e:
+            # A row the database will never take; retrying cannot help, so the batch goes
+            self._count("rows_dropped", len(pending))
+            print(f"❌ Dropped {len(pending)} history rows that could not be written: {e!r}")
+            return True
+        if self._failing:
+            print(f"✅ History writes recovered ({len(pending)} rows written)")
+            self._failing = None
+        with self._lock:
+            self.counters["batches"] += 1
+            self.counters["rows_written"] += len(pending)
+            self.last_flush_ms = round((time.perf_counter() - start) * 1000, 2)
+            self.last_lag_ms = int((time.monotonic() - pending[0][0]) * 1000)
+        return True
+
+    def _trim(self, pending):
+        # Keep the newest rows for the next attempt, up to a limit
+        excess = len(pending) - self.flush_size * HISTORY_RETRY_LIMIT
+        if excess > 0:
+            self._count("rows_dropped", excess)
+            return pending[excess:]
+        return pending
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+BENCHMARK_SITES = 40  # Rows per simulated sweep
+
+
+def _benchmark_rows(count, start):
+    for i in range(count):
+        name = f"site-{i % BENCHMARK_SITES}"
+        checked_at = int((start + timedelta(seconds=60 * (i // BENCHMARK_SITES))).timestamp() * 1000)
+        status = random.choices(("operational", "degraded", "down"), (95, 4, 1))[0]
+        yield ("websites", name, f"https://{name}.example.com", status, "200", random.randint(20, 900), checked_at,
+               *(random.randint(1, 100) for _ in PHASE_COLUMNS))
+
+
+def _benchmark_mode(path, managed, readers, seconds):
+    """Readers run the /api/history query while one writer adds a sweep of rows at a time"""
+    if managed:
+        writer = connect(path)
+        pool = ReadPool(lambda: path, size=readers)
+    else:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+    deadline = time.monotonic() + seconds
+    latencies = []
+    counts = {"rows": 0, "busy": 0}
+    lock = threading.Lock()
+
+    def read():
+        local = []
+        while time.monotonic() < deadline:
+            name = f"site-{random.randrange(BENCHMARK_SITES)}"
+            start = time.perf_counter()
+            try:
+                if managed:
+                    with pool.connection() as conn:
+                        site_history(conn, name, 50)
+                else:
+                    conn = sqlite3.connect(path)
+                    site_history(conn, name, 50)
+                    conn.close()
+            except sqlite3.OperationalError:
+                with lock:
+                    counts["busy"] += 1
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    def write():
+        sweep_start = datetime.now()
+        while time.monotonic() < deadline:
+            rows = list(_benchmark_rows(BENCHMARK_SITES, sweep_start))
+            try:
+                if managed:
+                    with writer:
+                        insert_checks(writer, rows)
+                else:
+                    for row in rows:  # The old store_status(): connect, insert, commit, close
+                        conn = sqlite3.connect(path)
+                        insert_checks(conn, [row])
+                        conn.commit()
+                        conn.close()
+            except sqlite3.OperationalError:
+                with lock:
+                    counts["busy"] += 1
+                continue
+            with lock:
+                counts["rows"] += len(rows)
+
+    threads = [threading.Thread(target=read) for _ in range(readers)] + [threading.Thread(target=write)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if managed:
+        writer.close()
+    latencies.sort()
+    pick = lambda q: round(latencies[min(int(len(latencies) * q), len(latencies) - 1)], 2) if latencies else None
+    return {
+        "reads_per_s": int(len(latencies) / seconds),
+        "read_p50_ms": pick(0.5),
+        "read_p99_ms": pick(0.99),
+        "read_max_ms": round(latencies[-1], 2) if latencies else None,
+        "rows_written_per_s": int(counts["rows"] / seconds),
+        "busy_errors": counts["busy"],
+    }
+
+
+def _timed(query, repeat=5):
+    """Median ms of a few runs of query()"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(sorted(timings)[len(timings) // 2], 2)
+
+
+def _seed(conn, days, interval, end):
+    """Fill checks with days of synthetic history up to end"""
+    start = end - timedelta(days=days)
+    rows = BENCHMARK_SITES * int(days * 86400 / interval)
+    seeded = time.perf_counter()
+    batch = []
+    for i, row in enumerate(_benchmark_rows(rows, start)):
+        checked_at = int((start + timedelta(seconds=interval * (i // BENCHMARK_SITES))).timestamp() * 1000)
+        batch.append(row[:6] + (checked_at,) + row[7:])
+        if len(batch) == 100000 or i == rows - 1:
+            with conn:
+                insert_checks(conn, batch)
+            batch = []
+    print(f"📦 Seeded {rows} rows ({days:g} days of {BENCHMARK_SITES} sites every {interval:g}s) "
+          f"in {time.perf_counter() - seeded:.1f}s")
+    return start
+
+
+def benchmark_indexes(days, interval):
+    """Time the history read paths on a synthetic history, before and after the indexes"""
+    workdir = tempfile.mkdtemp(prefix="history-bench-")
+    try:
+        path = os.path.join(workdir, "year.db")
+        conn = connect(path)
+        migrate(conn)
+        for index in CHECKS_INDEXES:
+            conn.execute(f"DROP INDEX {index}")
+        end = datetime.now().replace(microsecond=0)
+        start = _seed(conn, days, interval, end)
+
+        middle = start + (end - start) / 2
+        queries = {
+            "latest 50 of one site": lambda: site_history(conn, "site-7", 50),
+            "one site, one day": lambda: site_history(conn, "site-7", 2000, start=middle, end=middle + timedelta(days=1)),
+            "every site, last hour": lambda: all_history(conn, 5000, start=end - timedelta(hours=1)),
+            "uptime, all time": lambda: uptime_counts(conn, "site-7"),
+            "uptime, last 24h": lambda: uptime_counts(conn, "site-7", end - timedelta(days=1)),
+        }
+        before = {label: _timed(query) for label, query in queries.items()}
+        built = time.perf_counter()
+        migrate(conn)
+        print(f"   Indexes built in {time.perf_counter() - built:.1f}s")
+        after = {label: _timed(query) for label, query in queries.items()}
+        for label in queries:
+            print(f"   {label}: {before[label]} ms -> {after[label]} ms")
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def benchmark_pages(days, interval, limit=50):
+    """Time deep /api/history pages reached with offset and with next_cursor"""
+    workdir = tempfile.mkdtemp(prefix="history-bench-")
+    try:
+        path = os.path.join(workdir, "year.db")
+        conn = connect(path)
+        migrate(conn)
+        _seed(conn, days, interval, datetime.now().replace(microsecond=0))
+        total = conn.execute("SELECT COUNT(*) FROM checks").fetchone()[0]
+        down = conn.execute("SELECT COUNT(*) FROM checks WHERE status = ?", (STATUSES.index("down"),)).fetchone()[0]
+        cases = (
+            ("every site", None, None, total),
+            ("one site", "site-7", None, total // BENCHMARK_SITES),
+            ("every site, down only", None, ["down"], down),
+        )
+        for label, name, statuses, matching in cases:
+            for fraction in (0.01, 0.5, 0.99):
+                offset = max(int(matching * fraction) // limit, 1) * limit
+                # The cursor a client holds after paging this deep: the key of the row before the page
+                key = conn.execute(
+                    "SELECT c.checked_at, c.id FROM checks c WHERE 1"
+                    + (" AND c.target_id = (SELECT id FROM targets WHERE name = ?)" if name else "")
+                    + (" AND c.status = ?" if statuses else "")
+                    + " ORDER BY c.checked_at DESC, c.id DESC LIMIT 1 OFFSET ?",
+                    ((name,) if name else ()) + ((STATUSES.index("down"),) if statuses else ()) + (offset - 1,),
+                ).fetchone()
+                cursor = f"{key[0]}:{key[1]}"
+                by_offset = _timed(lambda: history_page(conn, limit, name, offset, statuses=statuses))
+                by_cursor = _timed(lambda: history_page(conn, limit, name, statuses=statuses, cursor=cursor))
+                assert history_page(conn, limit, name, offset, statuses=statuses)[0] == \
+                    history_page(conn, limit, name, statuses=statuses, cursor=cursor)[0]
+                print(f"   {label}, page at row {offset}: offset {by_offset} ms -> cursor {by_cursor} ms")
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def benchmark(rows, readers, seconds):
+    """Compare the old connect-per-call setup with WAL, pooled readers and one writer"""
+    workdir = tempfile.mkdtemp(prefix="history-bench-")
+    try:
+        seed = os.path.join(workdir, "seed.db")
+        conn = sqlite3.connect(seed)
+        migrate(conn)
+        insert_checks(conn, list(_benchmark_rows(rows, datetime.now() - timedelta(minutes=rows // BENCHMARK_SITES))))
+        conn.commit()
+        conn.close()
+        print(f"📦 Seeded {rows} rows for {BENCHMARK_SITES} sites; {readers} readers and 1 writer for {seconds:g}s each")
+        for label, managed in (("connect per call, rollback journal", False), ("WAL, read pool, one writer", True)):
+            path = os.path.join(workdir, f"{'managed' if managed else 'legacy'}.db")
+            shutil.copy(seed, path)
+            result = _benchmark_mode(path, managed, readers, seconds)
+            print(f"   {label}: " + ", ".join(f"{key}={value}" for key, value in result.items()))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="History database benchmark")
+    parser.add_argument("--benchmark", action="store_true", help="Compare concurrent reads and writes before and after WAL and pooling")
+    parser.add_argument("--rows", type=int, default=200000, help="Rows to seed (default: 200000)")
+    parser.add_argument("--readers", type=int, default=8, help="Concurrent reader threads (default: 8)")
+    parser.add_argument("--seconds", type=float, default=5, help="Duration of each run (default: 5)")
+    parser.add_argument("--benchmark-indexes", action="store_true", help="Time the read paths before and after the indexes")
+    parser.add_argument("--benchmark-pages", action="store_true", help="Time deep history pages with offset and with cursors")
+    parser.add_argument("--days", type=float, default=365, help="Days of synthetic history (default: 365)")
+    parser.add_argument("--interval", type=float, default=300, help="Seconds between a site's checks (default: 300)")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.rows, args.readers, args.seconds)
+    elif args.benchmark_indexes:
+        benchmark_indexes(args.days, args.interval)
+    elif args.benchmark_pages:
+        benchmark_pages(args.days, args.interval)
+    else:
+        parser.error("nothing to do; pass --benchmark, --benchmark-indexes or --benchmark-pages")
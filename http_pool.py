@@ -0,0 +1,197 @@
+"""Shared, pooled HTTP sessions for the website checks.
+
+Every worker thread gets its own requests.Session, but all of them mount the
+same HTTPAdapter, so keep-alive connections are pooled per host and reused
+across threads and across update cycles. Connections that sat idle longer
+than HTTP_POOL_IDLE_TIMEOUT are closed instead of being reused, because most
+servers drop idle keep-alive sockets on their side anyway.
+"""
+import os
+import socket
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError
+
+from dns_cache import dns_cache
+from probe_common import HTTP_TIMEOUT
+
+# Number of per-host pools kept alive (one per website host)
+HTTP_POOL_HOSTS = int(os.environ.get("HTTP_POOL_HOSTS", "100"))
+# Maximum open connections to a single host
+HTTP_POOL_PER_HOST = int(os.environ.get("HTTP_POOL_PER_HOST", "4"))
+# Seconds a pooled connection may sit unused before it is closed
+HTTP_POOL_IDLE_TIMEOUT = float(os.environ.get("HTTP_POOL_IDLE_TIMEOUT", "60"))
+# Seconds a check waits for a free connection once a host has HTTP_POOL_PER_HOST in use
+HTTP_POOL_TIMEOUT = float(os.environ.get("HTTP_POOL_TIMEOUT", str(HTTP_TIMEOUT)))
+
+_local = threading.local()
+_adapter_lock = threading.Lock()
+_adapter = None
+
+
+class TrackedConnectionMixin:
+    """Counts requests per connection, remembers when it was last used and
+    times the DNS, TCP connect and TLS phases of establishing it"""
+
+    requests_served = 0
+    last_used = 0.0
+    phase_times = None
+
+    def _new_conn(self):
+        # Resolve through the shared cache so DNS is timed apart from the TCP handshake
+        start = time.perf_counter()
+        try:
+            address = dns_cache.resolve(self._dns_host)[0]
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        resolved = time.perf_counter()
+
+        dns_host = self._dns_host
+        self._dns_host = address
+        try:
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = dns_host
+
+        self.phase_times = {"dns": resolved - start, "connect": time.perf_counter() - resolved}
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        self.requests_served = 0
+        if self.phase_times is not None:
+            # Whatever connect() spent beyond resolving and the TCP handshake was TLS
+            setup = self.phase_times["dns"] + self.phase_times["connect"]
+            self.phase_times["tls"] = max(time.perf_counter() - start - setup, 0.0)
+
+    def request(self, *args, **kwargs):
+        # A missing socket means http.client will connect (and reset the count) now
+        reused = self.sock is not None and self.requests_served > 0
+        self.last_used = time.monotonic()
+        if reused:
+            self.phase_times = None
+        result = super().request(*args, **kwargs)
+        # The caller's thread runs the request, so this records the connection it used;
+        # a redirect chain records one hop per request
+        hops = getattr(_local, "hops", None)
+        if hops is not None:
+            hops.append((reused, self.phase_times))
+        self.requests_served += 1
+        return result
+
+    def is_idle_expired(self, now):
+        return self.sock is not None and now - self.last_used > HTTP_POOL_IDLE_TIMEOUT
+
+
+class TrackedHTTPConnection(TrackedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TrackedHTTPSConnection(TrackedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class IdleEvictionMixin:
+    """Closes pooled connections that have been idle for too long, and bounds the
+    wait for a connection when every one of a host's is in use"""
+
+    def _get_conn(self, timeout=None):
+        # requests never passes a pool timeout, and a full blocking pool would wait forever
+        conn = super()._get_conn(HTTP_POOL_TIMEOUT if timeout is None else timeout)
+        if conn is not None and conn.is_idle_expired(time.monotonic()):
+            conn.close()  # Reconnects on the next request
+        return conn
+
+    def evict_idle(self, now):
+        """Close every idle-expired connection waiting in this pool"""
+        evicted = 0
+        with self.pool.mutex:
+            for conn in self.pool.queue:
+                if conn is not None and conn.is_idle_expired(now):
+                    conn.close()
+                    evicted += 1
+        return evicted
+
+
+class TrackedHTTPConnectionPool(IdleEvictionMixin, HTTPConnectionPool):
+    ConnectionCls = TrackedHTTPConnection
+
+
+class TrackedHTTPSConnectionPool(IdleEvictionMixin, HTTPSConnectionPool):
+    ConnectionCls = TrackedHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose per-host pools track reuse and evict idle connections"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TrackedHTTPConnectionPool,
+            "https": TrackedHTTPSConnectionPool,
+        }
+
+
+def get_adapter():
+    """Return the process-wide adapter shared by every session"""
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            _adapter = PooledAdapter(
+                pool_connections=HTTP_POOL_HOSTS,
+                pool_maxsize=HTTP_POOL_PER_HOST,
+                pool_block=True,  # Enforce the per-host cap instead of opening extra sockets
+            )
+        return _adapter
+
+
+def get_session():
+    """Return this thread's session, creating it on first use"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        # Keep checks stateless like a bare requests.get()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = get_adapter()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+def track_connections():
+    """Start recording the connections used by this thread's requests, every redirect hop included"""
+    _local.hops = []
+
+
+def tracked_connections():
+    """(reused, phases) for the requests since track_connections().
+
+    reused is whether every hop went over a reused connection; phases sums
+    the DNS/connect/TLS seconds of the hops that opened one, or is None if
+    none did.
+    """
+    hops = getattr(_local, "hops", None) or []
+    opened = [phases for _, phases in hops if phases]
+    phases = None
+    if opened:
+        phases = {}
+        for hop in opened:
+            for phase, seconds in hop.items():
+                phases[phase] = phases.get(phase, 0.0) + seconds
+    return bool(hops) and all(reused for reused, _ in hops), phases
+
+
+def evict_idle_connections():
+    """Close idle-expired connections across every host pool; returns how many"""
+    pools = get_adapter().poolmanager.pools
+    now = time.monotonic()
+    host_pools = [pools.get(key) for key in pools.keys()]
+    return sum(pool.evict_idle(now) for pool in host_pools if pool is not None)
@@ -0,0 +1,265 @@
+"""Batched ICMP echo prober.
+
+Sends echo requests to every endpoint from one ICMP socket and matches the
+replies by identifier and sequence number on a single loop thread, so pinging
+hundreds of regions costs one socket instead of one blocked ping per host.
+Each endpoint gets several echoes, which yields round-trip time, jitter and
+packet loss rather than a single up/down sample.
+
+Uses an unprivileged datagram ICMP socket where the kernel allows it
+(net.ipv4.ping_group_range) and a raw socket otherwise, which needs root or
+CAP_NET_RAW. IPv4 only.
+
+Check the prober without touching the network:
+
+    python icmp_probe.py --loopback 50
+"""
+import argparse
+import heapq
+import itertools
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+
+from dns_cache import dns_cache
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+ICMP_COUNT = int(os.environ.get("ICMP_COUNT", "5"))  # Echo requests per endpoint per check
+ICMP_INTERVAL = float(os.environ.get("ICMP_INTERVAL", "0.2"))  # Seconds between an endpoint's echoes
+ICMP_TIMEOUT = float(os.environ.get("ICMP_TIMEOUT", "2"))  # Seconds to wait for the last reply
+
+
+def checksum(data):
+    """RFC 1071 internet checksum"""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def open_icmp_socket():
+    """Return (socket, raw) preferring the unprivileged datagram socket"""
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except PermissionError:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+
+
+class ICMPPinger:
+    """Pings many endpoints at once from one ICMP socket"""
+
+    def __init__(self):
+        self.sock, self.raw = open_icmp_socket()
+        self.sock.setblocking(False)
+        # Datagram sockets get their identifier rewritten to the socket's port by the kernel
+        self.ident = os.getpid() & 0xFFFF
+        self._lock = threading.Lock()
+        self._pending = deque()  # Jobs submitted since the loop last woke up
+        self._timers = []  # Heap of (when, seq, action, job)
+        self._timer_sequence = itertools.count()
+        self._sequence = itertools.count(1)
+        self._outstanding = {}  # ICMP sequence -> (job, sent_at)
+
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+
+        self._thread = threading.Thread(target=self._run, name="icmp-pinger", daemon=True)
+        self._thread.start()
+
+    def submit(self, hostname, count=ICMP_COUNT, interval=ICMP_INTERVAL, timeout=ICMP_TIMEOUT):
+        """Queue count echoes to hostname and return a Future resolving to its outcome dict"""
+        future = Future()
+        try:
+            address = next(a for a in dns_cache.resolve(hostname) if ":" not in a)
+        except (socket.gaierror, StopIteration):
+            future.set_result(_outcome(count, [], error="dns"))
+            return future
+
+        job = {"future": future, "address": address, "count": count, "interval": interval,
+               "timeout": timeout, "sent": 0, "rtts": [], "sequences": set()}
+        with self._lock:
+            self._pending.append(job)
+        try:
+            self._wake_writer.send(b"\0")
+        except BlockingIOError:
+            pass  # Already a wake-up byte waiting
+        return future
+
+    # --- event loop ---
+
+    def _run(self):
+        while True:
+            try:
+                self._schedule_pending()
+                timeout = max(self._timers[0][0] - time.perf_counter(), 0) if self._timers else None
+                readable, _, _ = select.select([self.sock, self._wake_reader], [], [], timeout)
+                if self._wake_reader in readable:
+                    self._drain_wakeups()
+                if self.sock in readable:
+                    self._receive()
+                self._fire_timers(time.perf_counter())
+            except Exception as e:
+                print(f"Error in ICMP pinger: {e}")
+
+    def _drain_wakeups(self):
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _schedule_pending(self):
+        now = time.perf_counter()
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                job = self._pending.popleft()
+            for index in range(job["count"]):
+                self._add_timer(now + index * job["interval"], "send", job)
+            self._add_timer(now + (job["count"] - 1) * job["interval"] + job["timeout"], "expire", job)
+
+    def _add_timer(self, when, action, job):
+        heapq.heappush(self._timers, (when, next(self._timer_sequence), action, job))
+
+    def _fire_timers(self, now):
+        while self._timers and self._timers[0][0] <= now:
+            _, _, action, job = heapq.heappop(self._timers)
+            if job["future"].done():
+                continue
+            if action == "send":
+                self._send(job)
+            else:
+                self._finish(job)
+
+    def _send(self, job):
+        sequence = next(self._sequence) & 0xFFFF
+        while sequence in self._outstanding or sequence == 0:
+            sequence = next(self._sequence) & 0xFFFF
+        payload = struct.pack("!d", time.time()) + b"status-monitor".ljust(48, b".")
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, self.ident, sequence)
+        packet = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum(header + payload), self.ident, sequence) + payload
+
+        job["sent"] += 1
+        try:
+            self.sock.sendto(packet, (job["address"], 0))
+        except OSError:
+            return  # Unreachable network etc.: counts as a lost echo
+        job["sequences"].add(sequence)
+        self._outstanding[sequence] = (job, time.perf_counter())
+
+    def _receive(self):
+        while True:
+            try:
+                data, (source, _) = self.sock.recvfrom(2048)
+            except BlockingIOError:
+                return
+            received_at = time.perf_counter()
+            if self.raw:
+                data = data[(data[0] & 0x0F) * 4:]  # Raw sockets include the IP header
+            if len(data) < 8:
+                continue
+            kind, _, _, ident, sequence = struct.unpack("!BBHHH", data[:8])
+            if kind != ICMP_ECHO_REPLY or (self.raw and ident != self.ident):
+                continue  # Someone else's ping, or not a reply
+            entry = self._outstanding.get(sequence)
+            if entry is None or entry[0]["address"] != source:
+                continue
+            del self._outstanding[sequence]
+            job, sent_at = entry
+            job["sequences"].discard(sequence)
+            job["rtts"].append((received_at - sent_at) * 1000)
+            if job["sent"] == job["count"] and not job["sequences"]:
+                self._finish(job)  # Every echo answered, no need to wait for the deadline
+
+    def _finish(self, job):
+        for sequence in job["sequences"]:
+            self._outstanding.pop(sequence, None)
+        job["sequences"].clear()
+        job["future"].set_result(_outcome(job["count"], job["rtts"]))
+
+
+def _outcome(count, rtts, error=None):
+    """Summarize one endpoint's echoes; times in ms"""
+    received = len(rtts)
+    outcome = {
+        "sent": count,
+        "received": received,
+        "packet_loss": round((count - received) / count * 100, 1) if count else None,
+        "rtt_min": round(min(rtts), 2) if rtts else None,
+        "rtt_avg": round(sum(rtts) / received, 2) if rtts else None,
+        "rtt_max": round(max(rtts), 2) if rtts else None,
+        # Mean difference between consecutive round trips, as in RFC 3550
+        "jitter": round(sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / (received - 1), 2) if received > 1 else None,
+        "error": error,
+    }
+    return outcome
+
+
+class ICMPProbeExecutor:
+    """Executor-style facade so a sweep can submit endpoints to the pinger.
+
+    targets maps a threaded check function to a callable returning
+    (hostname, base status dict) for one endpoint; results are completed
+    with status_for(base, outcome).
+    """
+
+    def __init__(self, pinger, targets, status_for):
+        self.pinger = pinger
+        self.targets = targets
+        self.status_for = status_for
+        self.futures = []
+
+    def submit(self, check, endpoint):
+        hostname, status = self.targets[check](endpoint)
+        future = Future()
+
+        def publish(ping):
+            try:
+                future.set_result(self.status_for(status, ping.result()))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.pinger.submit(hostname).add_done_callback(publish)
+        self.futures.append(future)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        wait(self.futures)
+        return False
+
+
+def loopback_test(hosts):
+    """Ping 127.0.0.1 upwards from one socket and print the per-host results"""
+    pinger = ICMPPinger()
+    print(f"🏓 Pinging {hosts} loopback addresses ({'raw' if pinger.raw else 'datagram'} socket)")
+    start = time.perf_counter()
+    futures = {f"127.0.0.{i}": pinger.submit(f"127.0.0.{i}") for i in range(1, hosts + 1)}
+    results = {address: future.result() for address, future in futures.items()}
+    elapsed = time.perf_counter() - start
+    for address, outcome in results.items():
+        print(f"  {address}: {outcome['received']}/{outcome['sent']} replies, avg {outcome['rtt_avg']} ms, jitter {outcome['jitter']} ms")
+    lost = sum(o["sent"] - o["received"] for o in results.values())
+    print(f"📊 {hosts * ICMP_COUNT} echoes in {elapsed:.2f}s, {lost} lost")
+    return lost == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched ICMP prober self-test")
+    parser.add_argument("--loopback", type=int, default=50, metavar="HOSTS",
+                        help="Number of 127.0.0.x addresses to ping (default: 50)")
+    args = parser.parse_args()
+    raise SystemExit(0 if loopback_test(min(args.loopback, 254)) else 1)
@@ -0,0 +1,408 @@
+"""Unified probe pipeline.
+
+Every monitored catalog (websites, EC2 regions, Azure regions, ...) is a
+ProbeKind: a list of targets, the check that probes one target, and the live
+status map its results are published into. The pipeline runs sweeps for all
+kinds on one long-lived worker pool under a global concurrency budget, and
+publishes finished sweeps through a single publisher thread that swaps the
+live map and writes history. Adding a catalog means registering a ProbeKind,
+not writing another updater and scheduler thread.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from functools import partial
+
+from dns_cache import dns_cache
+from hedging import HedgedProbe, Timers
+
+
+class ProbeKind:
+    """A catalog of targets, how to probe one of them, and where results go"""
+
+    def __init__(self, name, label, targets, check, executor, results, lock, interval,
+                 hostname=None, before_sweep=None, after_sweep=None, history=True, hedge=None, breaker=None,
+                 limits=None):
+        self.name = name
+        self.label = label  # Used in log lines, e.g. "EC2"
+        self.targets = targets  # () -> iterable of (key, target, extra fields for its result)
+        self.check = check  # Threaded check function; other engines mirror it
+        self.executor = executor  # () -> executor-style object the checks are submitted to
+        self.results = results  # Live status map served by the API
+        self.lock = lock
+        self.interval = interval  # Seconds between sweeps
+        self.hostname = hostname  # target -> hostname, for DNS prefetching
+        self.before_sweep = before_sweep
+        self.after_sweep = after_sweep  # (results) -> None, for extra log lines
+        self.history = history  # Whether results are written to the history table
+        self.hedge = hedge  # HedgePolicy for hedged attempts and confirmation retries, or None
+        self.breaker = breaker  # CircuitBreaker for persistently failing targets, or None
+        self.limits = limits  # LatencyLimits learning per-target timeouts and thresholds, or None
+
+
+class Sweep:
+    """One run of a probe kind over its targets, or over the ones in a scope"""
+
+    def __init__(self, kind, total, scope=None):
+        self.kind = kind
+        self.total = total
+        self.scope = scope  # None for the whole catalog
+        self.results = {}
+        self.started = time.time()
+        self.finished = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self._remaining = total
+
+    def add(self, key, status):
+        """Record one result; returns True when it was the last one outstanding"""
+        with self._lock:
+            if status is not None:
+                self.results[key] = status
+            self._remaining -= 1
+            return self._remaining == 0
+
+
+def in_scope(job, scope):
+    """Whether a (key, target, extra) job matches every (field, value) pair of scope.
+
+    Fields are looked up in the extra fields, then the target; strings compare
+    case-insensitively like the /api/status/<website_name> lookup.
+    """
+    if not scope:
+        return True
+    _, target, extra = job
+    for field, value in scope:
+        actual = extra.get(field, target.get(field))
+        if isinstance(actual, str) and isinstance(value, str):
+            actual, value = actual.lower(), value.lower()
+        if actual != value:
+            return False
+    return True
+
+
+class SharedPoolExecutor:
+    """Executor-style handle for one sweep on the pipeline's long-lived thread pool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.futures = []
+
+    def submit(self, check, target):
+        future = self.pool.submit(check, target)
+        self.futures.append(future)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        wait(self.futures)
+        return False
+
+
+class ProbePipeline:
+    """Runs sweeps for every registered ProbeKind on shared workers"""
+
+    def __init__(self, workers, budget, store, flush=None):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="probe")
+        self.budget = threading.BoundedSemaphore(budget)  # Probes in flight across all kinds and engines
+        self.store = store  # (kind name, status dict) -> None, queues one history row
+        self.flush = flush  # () -> None, writes queued rows; called once per published sweep or batch
+        self.forward = None  # (name, {key: status}) -> None; when set, results go there instead
+        self.kinds = {}
+        self._running = {}  # (name, scope) -> Sweep in flight
+        self._running_lock = threading.Lock()
+        self._last_sweep = {}  # (name, scope) -> most recently published Sweep
+        self._refresh_locks = {}
+        self._timers = Timers()
+        self._published = queue.Queue()
+        threading.Thread(target=self._publisher, name="probe-publisher", daemon=True).start()
+
+    def register(self, kind):
+        self.kinds[kind.name] = kind
+        self._refresh_locks[kind.name] = threading.Lock()
+        return kind
+
+    def thread_executor(self):
+        return SharedPoolExecutor(self.pool)
+
+    def is_running(self, name):
+        with self._running_lock:
+            return (name, None) in self._running
+
+    # --- sweeps ---
+
+    def start_sweep(self, name, scope=None):
+        """Submit every target of a kind and return its Sweep without waiting for it.
+
+        scope narrows the sweep to matching targets, e.g. (("page", 2),); see in_scope().
+        """
+        kind = self.kinds[name]
+        label = kind.label + (" " + ", ".join(f"{field}={value}" for field, value in scope) if scope else "")
+        print(f"\n🔄 Updating {label} status data... [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]")
+        jobs = [job for job in kind.targets() if in_scope(job, scope)]
+        if kind.hostname:
+            self._prefetch_dns(kind.hostname(target) for _, target, _ in jobs)
+        if kind.before_sweep:
+            kind.before_sweep()
+
+        sweep = Sweep(kind, len(jobs), scope)
+        with self._running_lock:
+            self._running[(name, scope)] = sweep
+        if not jobs:
+            self._published.put(partial(self._finish_sweep, sweep))
+            return sweep
+
+        executor = kind.executor()
+        for key, target, extra in jobs:
+            self.budget.acquire()
+            try:
+                future = self._submit(kind, executor, key, target)
+            except Exception:
+                self.budget.release()
+                raise
+            future.add_done_callback(partial(self._collect, sweep, key, extra))
+        return sweep
+
+    def probe(self, name, key, target, extra, on_done=None):
+        """Probe a single target and publish its result into the live map by itself.
+
+        on_done(status) is called once the probe finishes (status is None if it failed).
+        """
+        kind = self.kinds[name]
+        self.budget.acquire()
+        try:
+            future = self._submit(kind, kind.executor(), key, target)
+        except Exception:
+            self.budget.release()
+            raise
+        future.add_done_callback(partial(self._collect_one, kind, key, extra, on_done))
+        return future
+
+    def run(self, name):
+        """Run one sweep of a kind and wait until its results are published"""
+        sweep = self.start_sweep(name)
+        sweep.done.wait()
+        return sweep
+
+    def refresh(self, name, max_age=0, scope=None):
+        """Single-flight sweep for on-demand refreshes.
+
+        Joins a sweep covering the scope if one is in flight, reuses the last
+        one if it finished less than max_age seconds ago, and otherwise starts
+        one. A whole-catalog sweep covers every scope.
+        Returns (sweep, "joined" | "reused" | "started") once results are published.
+        """
+        covering = [(name, scope), (name, None)] if scope else [(name, None)]
+        with self._refresh_locks[name]:
+            with self._running_lock:
+                self._evict_scoped(max_age)
+                sweep = next((self._running[k] for k in covering if k in self._running), None)
+                last = [self._last_sweep[k] for k in covering if k in self._last_sweep]
+            last = max(last, key=lambda s: s.finished, default=None)
+            if sweep is not None:
+                outcome = "joined"
+            elif last is not None and time.time() - last.finished < max_age:
+                return last, "reused"
+            else:
+                sweep = self.start_sweep(name, scope)
+                outcome = "started"
+        sweep.done.wait()
+        return sweep, outcome
+
+    def _evict_scoped(self, max_age):
+        """Forget scoped sweeps too old to be reused, so one-off scopes do not pile up"""
+        now = time.time()
+        expired = [key for key, sweep in self._last_sweep.items()
+                   if key[1] is not None and now - sweep.finished >= max_age]
+        for key in expired:
+            del self._last_sweep[key]
+
+    def run_forever(self, poll_interval=1):
+        """Start each kind's sweep every `interval` seconds from one scheduler thread"""
+        next_run = {name: 0 for name in self.kinds}
+        while True:
+            now = time.time()
+            for name, kind in self.kinds.items():
+                if now >= next_run[name] and not self.is_running(name):
+                    next_run[name] = now + kind.interval
+                    try:
+                        self.start_sweep(name)
+                    except Exception as e:
+                        print(f"Error in scheduler: {e}")
+            time.sleep(poll_interval)
+
+    # --- collection and publishing ---
+
+    def _submit(self, kind, executor, key, target):
+        """Submit one probe through the kind's circuit breaker and hedging policy, if any"""
+        with kind.lock:
+            previous = kind.results.get(key)
+
+        learned = kind.limits.limits(key) if kind.limits else None
+        if learned:
+            target = {**target, "degraded_ms": learned["degraded_ms"]}
+            if "timeout" not in target:  # A timeout set in the catalog wins
+                target["timeout"] = learned["timeout"]
+
+        planned = False
+        if kind.breaker:
+            planned, timeout = kind.breaker.plan(key)
+            if not planned:
+                if previous is not None:
+                    # Breaker open: serve the last result instead of waiting on a dead host
+                    future = Future()
+                    future.set_result(kind.breaker.skipped(key, previous))
+                    return future
+                # Nothing to serve in its place, so probe, but fail as fast as a retry would
+                timeout = kind.breaker.probe_timeout
+            if timeout is not None:
+                target = {**target, "timeout": min(timeout, target.get("timeout", timeout))}
+
+        try:
+            if kind.hedge is None:
+                future = executor.submit(kind.check, target)
+            else:
+                future = HedgedProbe(
+                    partial(executor.submit, kind.check, target),
+                    kind.hedge,
+                    self._timers,
+                    previous and previous.get("status"),
+                    try_acquire=partial(self.budget.acquire, blocking=False),
+                    release=self.budget.release,
+                ).start()
+        except Exception:
+            if planned:
+                kind.breaker.abandon(key)  # Else a half-open target would never be probed again
+            raise
+        if kind.breaker:
+            # Added before the caller's callback, so the breaker state is in the result it publishes
+            future.add_done_callback(partial(self._update_breaker, kind, key))
+        if kind.limits:
+            future.add_done_callback(partial(self._learn_limits, kind, key, learned))
+        return future
+
+    def _learn_limits(self, kind, key, learned, future):
+        try:
+            status = future.result()
+        except Exception:
+            return
+        status["limits"] = learned  # The limits this probe ran with; None while still learning
+        kind.limits.observe(key, status)
+
+    def _update_breaker(self, kind, key, future):
+        try:
+            status = future.result()
+        except Exception:
+            kind.breaker.record(key, {"status": "down", "error": "other"})
+            return
+        status["breaker"] = kind.breaker.record(key, status)
+
+    def _record(self, kind, status):
+        """Write a history row, unless the kind opts out, results are forwarded
+        elsewhere, or the result is one the circuit breaker served again"""
+        if kind.history and not self.forward and not status.get("breaker", {}).get("skipped"):
+            self.store(kind.name, status)
+
+    def _collect(self, sweep, key, extra, future):
+        # Runs on whichever thread finished the probe, so keep it short
+        self.budget.release()
+        status = None
+        try:
+            status = future.result()
+            status.update(extra)
+        except Exception as e:
+            print(f"  ✗ {key}: Error - {str(e)}")
+        if sweep.add(key, status):
+            self._published.put(partial(self._finish_sweep, sweep))
+
+    def _collect_one(self, kind, key, extra, on_done, future):
+        self.budget.release()
+        status = None
+        try:
+            status = future.result()
+            status.update(extra)
+            self._published.put(partial(self._publish_one, kind, key, status))
+        except Exception as e:
+            print(f"  ✗ {key}: Error - {str(e)}")
+        if on_done:
+            on_done(status)
+
+    def _publisher(self):
+        # Every result reaches the live maps and history through this one thread
+        while True:
+            job = self._published.get()
+            try:
+                job()
+            except Exception as e:
+                print(f"Error publishing results: {e}")
+
+    def _finish_sweep(self, sweep):
+        try:
+            self._publish(sweep)
+        finally:
+            sweep.finished = time.time()
+            key = (sweep.kind.name, sweep.scope)
+            with self._running_lock:
+                if self._running.get(key) is sweep:
+                    del self._running[key]
+                self._last_sweep[key] = sweep
+            sweep.done.set()
+
+    def publish_results(self, name, results):
+        """Merge results probed elsewhere (e.g. a shard worker) into the live map and history"""
+        self._published.put(partial(self._merge, self.kinds[name], results))
+
+    def _merge(self, kind, results):
+        with kind.lock:
+            kind.results.update(results)
+        for status in results.values():
+            self._record(kind, status)
+        self._flush_history()
+
+    def _publish_one(self, kind, key, status):
+        with kind.lock:
+            kind.results[key] = status
+        if self.forward:
+            self.forward(kind.name, {key: status})
+        self._record(kind, status)
+        print(f"  ✓ {status['name']}: {status['status']}")
+
+    def _publish(self, sweep):
+        kind = sweep.kind
+        results = sweep.results
+        # Thread-safe update; the map is swapped in place so routes keep their
+        # reference, and a scoped sweep only replaces the targets it probed
+        with kind.lock:
+            if sweep.scope is None:
+                kind.results.clear()
+            kind.results.update(results)
+        if self.forward:
+            self.forward(kind.name, results)
+
+        for status in results.values():
+            self._record(kind, status)
+            print(f"  ✓ {status['name']}: {status['status']}")
+        self._flush_history()
+
+        update_duration = time.time() - sweep.started
+        operational_count = len([s for s in results.values() if s['status'] == 'operational'])
+        degraded_count = len([s for s in results.values() if s['status'] == 'degraded'])
+        down_count = len([s for s in results.values() if s['status'] == 'down'])
+
+        print(f"📊 {kind.label} update complete: {len(results)} targets checked in {update_duration:.2f}s")
+        print(f"   Status: {operational_count} operational, {degraded_count} degraded, {down_count} down")
+        if kind.after_sweep:
+            kind.after_sweep(results)
+
+    def _flush_history(self):
+        if self.flush and not self.forward:
+            self.flush()
+
+    def _prefetch_dns(self, hostnames):
+        """Warm the shared DNS cache for a sweep's hostnames in one parallel batch"""
+        summary = dns_cache.prefetch(list(hostnames))
+        print(f"   🔎 DNS: looked up {summary['resolved']} of {summary['hosts']} hosts in {summary['duration_ms']} ms ({summary['failed']} failed)")
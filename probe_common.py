@@ -0,0 +1,129 @@
+"""Request headers, probe modes and status classification rules shared by every probe engine."""
+import os
+import time
+from datetime import datetime
+
+# Headers to make requests look more like a real browser
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+# How much of each website response to read:
+#   "full"    - download the whole body (the original behaviour)
+#   "headers" - stop as soon as the status line and headers have arrived
+#   "bounded" - read at most HTTP_PROBE_MAX_BYTES of the body
+HTTP_PROBE_MODES = ("full", "headers", "bounded")
+HTTP_PROBE_MODE = os.environ.get("HTTP_PROBE_MODE", "full")
+HTTP_PROBE_MAX_BYTES = int(os.environ.get("HTTP_PROBE_MAX_BYTES", "16384"))
+
+# Default timeouts in seconds; a target dict may carry its own "timeout"
+HTTP_TIMEOUT = 15
+TCP_TIMEOUT = 10
+
+
+def probe_plan(site):
+    """Return (method, mode) for a website, honouring per-site "method"/"probe_mode" keys"""
+    method = site.get("method", "GET").upper()
+    mode = site.get("probe_mode", HTTP_PROBE_MODE)
+    if mode not in HTTP_PROBE_MODES:
+        mode = "full"
+    return method, mode
+
+
+def classify_website(status_code, response_time, degraded_ms=None):
+    """Return (status, message) for an HTTP response code and response time in ms.
+
+    degraded_ms replaces the fixed 5 s slow-response threshold with a learned one.
+    """
+    if status_code >= 500:
+        return "down", f"Server error (HTTP {status_code})"
+    if status_code == 429:
+        return "degraded", "Rate limited"
+    if status_code >= 400 and status_code != 403:
+        return "degraded", f"Client error (HTTP {status_code})"
+    if response_time > 15000:  # 15 seconds
+        return "down", f"Very slow response ({response_time} ms)"
+    if degraded_ms is not None:
+        if response_time > degraded_ms:
+            return "degraded", f"Slower than usual ({response_time} ms, limit {degraded_ms} ms)"
+    elif response_time > 5000:  # 5 seconds
+        return "degraded", f"Slow response ({response_time} ms)"
+    if status_code == 403:
+        # Many sites return 403 for automated requests - consider operational if fast
+        return "operational", f"Access restricted (HTTP 403) - {response_time} ms"
+    return "operational", f"OK - {response_time} ms"
+
+
+def classify_tcp(connect_time, degraded_ms=None):
+    """Return (status, message) for a successful TCP connect time in ms"""
+    if degraded_ms is not None:
+        if connect_time > degraded_ms:
+            return "degraded", f"Slower than usual ({connect_time} ms, limit {degraded_ms} ms)"
+        return "operational", f"TCP connection OK ({connect_time} ms)"
+    if connect_time > 5000:  # 5 seconds
+        return "degraded", f"High latency ({connect_time} ms)"
+    if connect_time > 2000:  # 2 seconds
+        return "degraded", f"Elevated latency ({connect_time} ms)"
+    return "operational", f"TCP connection OK ({connect_time} ms)"
+
+
+def completed_at():
+    """When a probe completed: "checked_at_ms" (UTC epoch ms, what history stores)
+    and "last_checked" (the same moment in local time, for display)"""
+    now = time.time()
+    return {"checked_at_ms": int(now * 1000), "last_checked": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def tcp_status(status, outcome, port=443, degraded_ms=None):
+    """Fill in a TCP check status dict from a probe outcome and return it.
+
+    outcome holds dns_time, connect_time and response_time in ms plus an
+    "error" of None, "dns", "refused", "timeout" or "other" (with "detail").
+    """
+    status["dns_time"] = outcome.get("dns_time")
+    status["connect_time"] = outcome.get("connect_time")
+    status["connection_time"] = outcome.get("connect_time")
+    status["response_time"] = outcome.get("response_time")
+
+    error = status["error"] = outcome.get("error")
+    if error is None:
+        # Determine status based on total check time
+        status["status"], status["message"] = classify_tcp(outcome["response_time"], degraded_ms)
+    else:
+        status["status"] = "down"
+        if error == "dns":
+            status["message"] = "DNS resolution failed"
+        elif error == "refused":
+            status["message"] = f"TCP connection failed (port {port} blocked or service down)"
+        elif error == "timeout":
+            status["message"] = f"TCP connection timeout ({outcome['timeout']:g}s)"
+        else:
+            status["message"] = f"TCP connection error: {str(outcome.get('detail'))[:30]}"
+    status.update(completed_at())
+    return status
+
+
+def icmp_status(status, outcome):
+    """Fill in an ICMP check status dict from an echo outcome (see icmp_probe) and return it"""
+    for field in ("sent", "received", "packet_loss", "rtt_min", "rtt_avg", "rtt_max", "jitter"):
+        status[field] = outcome.get(field)
+    status["response_time"] = outcome.get("rtt_avg")
+
+    if outcome.get("error") == "dns":
+        status["status"], status["message"] = "down", "DNS resolution failed"
+    elif not outcome["received"]:
+        # Many cloud endpoints drop ICMP, so this does not override the TCP status
+        status["status"], status["message"] = "down", "No ICMP echo replies"
+    elif outcome["packet_loss"] >= 20 or outcome["rtt_avg"] > 2000:
+        status["status"] = "degraded"
+        status["message"] = f"{outcome['packet_loss']}% loss, {outcome['rtt_avg']} ms average"
+    else:
+        status["status"] = "operational"
+        status["message"] = f"ICMP OK ({outcome['rtt_avg']} ms, jitter {outcome['jitter']} ms)"
+    status.update(completed_at())
+    return status
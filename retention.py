@@ -0,0 +1,158 @@
+"""Retention for status_history.db.
+
+Raw checks are kept forever unless an operator sets HISTORY_RETENTION_DAYS;
+older data then survives only in the rollups (history_store.ROLLUPS), and the finer rollups expire in turn, so
+old history is downsampled to hourly and then daily aggregates. Expired rows
+are deleted in small batches, each its own short transaction with a pause in
+between, so the history writer is never locked out for long. Freed pages are
+then handed back to the filesystem a few at a time with incremental vacuum.
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from history_store import ROLLUPS, connect, migrate
+
+HISTORY_RETENTION_DAYS = float(os.environ.get("HISTORY_RETENTION_DAYS", "0"))  # 0 keeps raw checks forever
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", "3600"))  # seconds between runs
+RETENTION_BATCH = int(os.environ.get("RETENTION_BATCH", "2000"))  # rows deleted per transaction
+RETENTION_PAUSE = float(os.environ.get("RETENTION_PAUSE", "0.05"))  # seconds between batches
+VACUUM_PAGES = int(os.environ.get("VACUUM_PAGES", "500"))  # pages reclaimed per step
+
+
+class RetentionWorker:
+    """Deletes expired history and rollups in the background"""
+
+    def __init__(self, connect):
+        self.connect = connect  # () -> sqlite3.Connection
+        self.runs = 0
+        self.last_run = None
+        self._lock = threading.Lock()  # One run at a time
+        self._warned_vacuum = False
+        self._warned_raw = False
+
+    def start(self):
+        threading.Thread(target=self._run_forever, name="history-retention", daemon=True).start()
+
+    def run_once(self):
+        """Run every retention step once; returns a summary"""
+        with self._lock:
+            started = time.perf_counter()
+            now = datetime.now()
+            conn = self.connect()
+            try:
+                summary = {"raw_deleted": 0, "rollups_deleted": 0}
+                if HISTORY_RETENTION_DAYS > 0:
+                    summary["raw_deleted"] = self._delete_raw(conn, now - timedelta(days=HISTORY_RETENTION_DAYS))
+                for table, width, keep in ROLLUPS:
+                    if keep is not None:
+                        cutoff = int((now - keep).timestamp() * 1000)
+                        summary["rollups_deleted"] += self._delete_rollups(conn, table, cutoff - cutoff % width)
+                summary["pages_reclaimed"] = self._vacuum(conn)
+            finally:
+                conn.close()
+            summary["duration_ms"] = int((time.perf_counter() - started) * 1000)
+            summary["finished_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.runs += 1
+            self.last_run = summary
+        if summary["raw_deleted"] or summary["rollups_deleted"] or summary["pages_reclaimed"]:
+            print(f"🧹 Retention: deleted {summary['raw_deleted']} checks and {summary['rollups_deleted']} rollup rows, "
+                  f"reclaimed {summary['pages_reclaimed']} pages in {summary['duration_ms']} ms")
+        return summary
+
+    def stats(self):
+        return {
+            "raw_retention_days": HISTORY_RETENTION_DAYS or None,
+            "rollup_retention_days": {table: keep / timedelta(days=1) if keep else None for table, _, keep in ROLLUPS},
+            "interval": RETENTION_INTERVAL,
+            "runs": self.runs,
+            "last_run": self.last_run,
+        }
+
+    def _batches(self, conn, sql, params):
+        """Repeat a LIMITed DELETE until it deletes nothing; returns rows deleted"""
+        deleted = 0
+        while True:
+            with conn:
+                count = conn.execute(sql, (*params, RETENTION_BATCH)).rowcount
+            deleted += count
+            if count < RETENTION_BATCH:
+                return deleted
+            time.sleep(RETENTION_PAUSE)  # Let the history writer in
+
+    def _delete_raw(self, conn, cutoff):
+        cutoff_ms = int(cutoff.timestamp() * 1000)
+        if not self._warned_raw and conn.execute("SELECT 1 FROM checks WHERE checked_at < ? LIMIT 1", (cutoff_ms,)).fetchone():
+            print(f"⚠️ HISTORY_RETENTION_DAYS={HISTORY_RETENTION_DAYS:g}: deleting raw checks from before "
+                  f"{cutoff:%Y-%m-%d %H:%M}; only the uptime rollups keep them (unset it to keep every check)")
+            self._warned_raw = True
+        # Oldest first through the checks_time index; the rollups already hold these checks
+        return self._batches(
+            conn,
+            "DELETE FROM checks WHERE id IN (SELECT id FROM checks WHERE checked_at < ? ORDER BY checked_at LIMIT ?)",
+            (cutoff_ms,),
+        )
+
+    def _delete_rollups(self, conn, table, cutoff):
+        # Per target, so each batch is a range of the (target_id, bucket) primary key
+        target_ids = [row[0] for row in conn.execute(f"SELECT DISTINCT target_id FROM {table}")]
+        return sum(
+            self._batches(
+                conn,
+                f"DELETE FROM {table} WHERE target_id = ? AND bucket IN "
+                f"(SELECT bucket FROM {table} WHERE target_id = ? AND bucket < ? ORDER BY bucket LIMIT ?)",
+                (target_id, target_id, cutoff),
+            )
+            for target_id in target_ids
+        )
+
+    def _vacuum(self, conn):
+        """Reclaim free pages in small steps; returns how many"""
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            if not self._warned_vacuum and conn.execute("PRAGMA freelist_count").fetchone()[0]:
+                print("⚠️ status_history.db predates incremental vacuum; free space is reused but not "
+                      "returned to the filesystem until `python retention.py --vacuum` is run once")
+                self._warned_vacuum = True
+            return 0
+        reclaimed = 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free:
+            # executescript() steps the pragma to completion; execute() frees a single page
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                break
+            reclaimed += free - remaining
+            free = remaining
+            time.sleep(RETENTION_PAUSE)
+        return reclaimed
+
+    def _run_forever(self):
+        while True:
+            try:
+                self.run_once()
+            except sqlite3.Error as e:
+                print(f"Error applying history retention: {e}")
+            time.sleep(RETENTION_INTERVAL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="History retention")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "status_history.db"),
+                        help="Database file (default: status_history.db next to this script)")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Rebuild the file once with incremental vacuum enabled (blocks writers while it runs)")
+    args = parser.parse_args()
+    conn = connect(args.db)  # Requests auto_vacuum=INCREMENTAL, which VACUUM then applies
+    migrate(conn)
+    if args.vacuum:
+        started = time.perf_counter()
+        conn.execute("VACUUM")
+        print(f"🧹 Vacuumed {args.db} in {time.perf_counter() - started:.1f}s "
+              f"(auto_vacuum={conn.execute('PRAGMA auto_vacuum').fetchone()[0]})")
+    else:
+        print(RetentionWorker(lambda: connect(args.db)).run_once())
+    conn.close()
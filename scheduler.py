@@ -0,0 +1,213 @@
+"""Per-target probe scheduler.
+
+Instead of sweeping a whole catalog and sleeping, every target gets its own
+slot in a heap keyed on its next due time. A catalog's targets are spread
+evenly across their interval, each slot is nudged by a little jitter, and the
+next slot is computed from the previous one (not from when the probe ran), so
+the real period does not drift by however long probes take. Outbound traffic
+and history writes arrive as a steady trickle instead of one burst a minute.
+
+In adaptive mode a target's interval follows its health: every unchanged
+result stretches it (healthy targets up to ADAPTIVE_MAX_INTERVAL), while a
+state change or a latency jump drops it to ADAPTIVE_MIN_INTERVAL so the
+target is re-checked quickly until it settles.
+"""
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+# Fraction of a target's interval its slot may be moved by, in either direction
+SCHEDULER_JITTER = float(os.environ.get("SCHEDULER_JITTER", "0.05"))
+
+# Adaptive mode: how fast an unsettled target is re-probed, how far a stable
+# one may back off, and by how much its interval grows per unchanged result
+ADAPTIVE_MIN_INTERVAL = float(os.environ.get("ADAPTIVE_MIN_INTERVAL", "15"))
+ADAPTIVE_MAX_INTERVAL = float(os.environ.get("ADAPTIVE_MAX_INTERVAL", "600"))
+ADAPTIVE_BACKOFF = float(os.environ.get("ADAPTIVE_BACKOFF", "1.5"))
+# A response this many times slower than the target's average counts as a change
+ADAPTIVE_LATENCY_JUMP = float(os.environ.get("ADAPTIVE_LATENCY_JUMP", "2.0"))
+LATENCY_JUMP_FLOOR_MS = 100  # Ignore jumps smaller than this, e.g. 5 ms -> 12 ms
+
+
+class ScheduledTarget:
+    """One target's place in the schedule"""
+
+    def __init__(self, kind, key, target, extra, interval, anchor):
+        self.kind = kind
+        self.key = key
+        self.target = target
+        self.extra = extra
+        self.base_interval = interval  # Configured interval
+        self.interval = interval  # Seconds between probes; adapts in adaptive mode
+        self.anchor = anchor  # Un-jittered slot time; the next slot is anchor + interval
+        self.due = anchor
+        self.fired = anchor  # Slot of the probe currently or last running
+        self.running = False
+        self.last_state = None
+        self.latency_avg = None  # Moving average of response_time, ms
+        self.changes = 0
+        self.probes = 0
+        self.skipped = 0  # Slots missed because the previous probe was still running
+        self.lateness = 0.0  # Seconds the last probe started after its slot
+        self.seq = None  # Heap entries with another seq are stale
+
+
+class TargetScheduler:
+    """Probes every target of every registered kind on its own interval"""
+
+    def __init__(self, pipeline, jitter=SCHEDULER_JITTER, adaptive=False):
+        self.pipeline = pipeline
+        self.jitter = jitter
+        self.adaptive = adaptive  # Re-probe changing targets quickly, back off stable ones
+        self.entries = {}  # (kind, key) -> ScheduledTarget
+        self._heap = []  # (due, seq, entry)
+        self._sequence = itertools.count()
+        self._wakeup = threading.Condition()
+
+    def load(self, now=None):
+        """Build the schedule, spreading each kind's targets evenly over its interval"""
+        now = time.monotonic() if now is None else now
+        with self._wakeup:
+            for name, kind in self.pipeline.kinds.items():
+                jobs = list(kind.targets())
+                for index, (key, target, extra) in enumerate(jobs):
+                    interval = target.get("interval", kind.interval)
+                    anchor = now + interval * index / len(jobs)
+                    self._push(ScheduledTarget(name, key, target, extra, interval, anchor))
+            self._wakeup.notify()
+
+    def run_forever(self):
+        """Sweep every kind once so the API has data, then probe each target on its slot"""
+        for name in self.pipeline.kinds:
+            try:
+                self.pipeline.run(name)
+            except Exception as e:
+                print(f"Error in scheduler: {e}")
+        self.load()
+        print(f"🗓️ Scheduling {len(self.entries)} targets individually")
+
+        while True:
+            for entry in self._pop_due():
+                try:
+                    self._dispatch(entry)
+                except Exception as e:
+                    entry.running = False
+                    print(f"Error in scheduler: {e}")
+
+    def stats(self):
+        """Schedule summary per kind"""
+        now = time.monotonic()
+        with self._wakeup:
+            entries = list(self.entries.values())
+        summary = {}
+        for entry in entries:
+            kind = summary.setdefault(entry.kind, {
+                "targets": 0, "probes": 0, "skipped": 0, "running": 0, "state_changes": 0,
+                "min_interval": None, "max_interval": None, "max_lateness_ms": 0, "next_due_in": None,
+            })
+            kind["targets"] += 1
+            kind["probes"] += entry.probes
+            kind["skipped"] += entry.skipped
+            kind["running"] += entry.running
+            kind["state_changes"] += entry.changes
+            kind["min_interval"] = min(kind["min_interval"] or entry.interval, entry.interval)
+            kind["max_interval"] = max(kind["max_interval"] or entry.interval, entry.interval)
+            kind["max_lateness_ms"] = max(kind["max_lateness_ms"], int(entry.lateness * 1000))
+            due_in = round(max(entry.due - now, 0), 1)
+            if kind["next_due_in"] is None or due_in < kind["next_due_in"]:
+                kind["next_due_in"] = due_in
+        return summary
+
+    # --- heap ---
+
+    def _push(self, entry):
+        # Must hold self._wakeup
+        entry.due = entry.anchor + random.uniform(-self.jitter, self.jitter) * entry.interval
+        entry.seq = next(self._sequence)
+        self.entries[(entry.kind, entry.key)] = entry
+        heapq.heappush(self._heap, (entry.due, entry.seq, entry))
+
+    def _pop_due(self):
+        """Block until at least one target is due and return every due target"""
+        with self._wakeup:
+            while True:
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    _, seq, entry = heapq.heappop(self._heap)
+                    if seq == entry.seq:
+                        due.append(entry)
+                if due:
+                    for entry in due:
+                        self._advance(entry, now)
+                    return due
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._wakeup.wait(timeout)
+
+    def _advance(self, entry, now):
+        # Must hold self._wakeup. Next slot follows the previous one, so probe
+        # duration never stretches the period; slots missed while the process was
+        # stalled are skipped rather than fired back to back.
+        entry.lateness = max(now - entry.due, 0.0)
+        entry.fired = entry.anchor
+        entry.anchor += entry.interval
+        if entry.anchor <= now:
+            entry.anchor += entry.interval * ((now - entry.anchor) // entry.interval + 1)
+        self._push(entry)
+
+    # --- probing ---
+
+    def _dispatch(self, entry):
+        if entry.running:
+            entry.skipped += 1
+            return
+        entry.running = True
+        entry.probes += 1
+        self.pipeline.probe(entry.kind, entry.key, entry.target, entry.extra,
+                            on_done=lambda status, entry=entry: self._finished(entry, status))
+
+    def _finished(self, entry, status):
+        entry.running = False
+        if status is None:
+            return
+        changed = self._observe(entry, status)
+        if self.adaptive:
+            self._adapt(entry, status, changed)
+
+    def _observe(self, entry, status):
+        """Track state and latency; returns True if this result differs from the last ones"""
+        state = status.get("status")
+        response_time = status.get("response_time")
+        changed = entry.last_state is not None and state != entry.last_state
+        if response_time is not None and entry.latency_avg is not None:
+            jump = response_time - entry.latency_avg
+            if response_time > entry.latency_avg * ADAPTIVE_LATENCY_JUMP and jump > LATENCY_JUMP_FLOOR_MS:
+                changed = True
+        if response_time is not None:
+            entry.latency_avg = response_time if entry.latency_avg is None else 0.8 * entry.latency_avg + 0.2 * response_time
+        if changed:
+            entry.changes += 1
+        entry.last_state = state
+        return changed
+
+    def _adapt(self, entry, status, changed):
+        if changed:
+            interval = min(ADAPTIVE_MIN_INTERVAL, entry.base_interval)
+        else:
+            interval = entry.interval * ADAPTIVE_BACKOFF
+            # Only healthy targets back off past their configured interval
+            ceiling = ADAPTIVE_MAX_INTERVAL if status.get("status") == "operational" else entry.base_interval
+            interval = min(interval, max(ceiling, entry.base_interval))
+        if interval == entry.interval:
+            return
+        if changed:
+            print(f"  ⚡ {entry.key}: {status.get('status')}, re-probing every {interval:g}s")
+
+        with self._wakeup:
+            entry.interval = interval
+            entry.anchor = max(entry.fired + interval, time.monotonic())
+            self._push(entry)
+            self._wakeup.notify()
@@ -0,0 +1,114 @@
+"""Multi-process sharded probing.
+
+With PROBE_SHARDS set, the web process stops probing and starts that many
+worker processes instead. Each worker owns a stable slice of every catalog
+(targets are assigned by a hash of their key), runs its own scheduler on its
+own interpreter and GIL, and streams its results back over its stdout as one
+JSON line per publish. The web process merges them into the live status maps
+and remains the only writer of the history database.
+
+A worker can also be started by hand:
+
+    python sharded.py --shard 0 --shards 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+# Seconds to wait before restarting a worker that exited
+SHARD_RESTART_DELAY = float(os.environ.get("SHARD_RESTART_DELAY", "5"))
+
+
+def shard_of(name, key, shards):
+    """Stable shard index for one target of a catalog"""
+    return zlib.crc32(f"{name}:{key}".encode("utf-8")) % shards
+
+
+def restrict_to_shard(pipeline, shard, shards):
+    """Make every kind of pipeline yield only the targets belonging to one shard"""
+    for kind in pipeline.kinds.values():
+        def targets(all_targets=kind.targets, name=kind.name):
+            return (job for job in all_targets() if shard_of(name, job[0], shards) == shard)
+        kind.targets = targets
+
+
+# --- web process side ---
+
+class ShardSupervisor:
+    """Starts the shard workers, restarts them if they exit and merges their results"""
+
+    def __init__(self, pipeline, shards):
+        self.pipeline = pipeline
+        self.shards = shards
+        self.processes = {}
+        self.received = 0
+
+    def start(self):
+        print(f"🧩 Starting {self.shards} probe shard workers")
+        for shard in range(self.shards):
+            threading.Thread(target=self._supervise, args=(shard,), name=f"shard-{shard}", daemon=True).start()
+
+    def _supervise(self, shard):
+        script = os.path.abspath(__file__)
+        while True:
+            process = subprocess.Popen(
+                [sys.executable, script, "--shard", str(shard), "--shards", str(self.shards)],
+                stdout=subprocess.PIPE,
+                cwd=os.path.dirname(script),
+            )
+            self.processes[shard] = process
+            for line in process.stdout:
+                try:
+                    message = json.loads(line)
+                    self.pipeline.publish_results(message["kind"], message["results"])
+                    self.received += len(message["results"])
+                except (ValueError, KeyError) as e:
+                    print(f"Error reading shard {shard} results: {e}")
+            code = process.wait()
+            print(f"⚠️ Shard worker {shard} exited with code {code}, restarting in {SHARD_RESTART_DELAY:g}s")
+            time.sleep(SHARD_RESTART_DELAY)
+
+    def stats(self):
+        return {
+            "shards": self.shards,
+            "alive": len([p for p in self.processes.values() if p.poll() is None]),
+            "results_received": self.received,
+        }
+
+
+# --- worker process side ---
+
+def run_worker(shard, shards):
+    """Probe one shard of every catalog and write its results to stdout"""
+    results_out = sys.stdout
+    sys.stdout = sys.stderr  # Keep log lines out of the results stream
+    write_lock = threading.Lock()
+
+    import app  # Imported here so the web process does not load it twice
+
+    def forward(name, results):
+        line = json.dumps({"kind": name, "results": results})
+        with write_lock:
+            results_out.write(line + "\n")
+            results_out.flush()
+
+    restrict_to_shard(app.pipeline, shard, shards)
+    app.pipeline.forward = forward
+    print(f"🧩 Shard worker {shard}/{shards} started (pid {os.getpid()})")
+    if app.SCHEDULER_MODE == "sweep":
+        app.pipeline.run_forever()
+    else:
+        app.scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one probe shard worker")
+    parser.add_argument("--shard", type=int, required=True)
+    parser.add_argument("--shards", type=int, required=True)
+    args = parser.parse_args()
+    run_worker(args.shard, args.shards)
@@ -0,0 +1,247 @@
+"""Event-driven TCP connectivity prober.
+
+Starts non-blocking connects to every endpoint at once and waits for all of
+them on one selectors loop (epoll on Linux, kqueue on macOS), so a single
+thread can time tens of thousands of handshakes and a regional outage costs
+one timer per socket instead of one blocked worker thread.
+"""
+import errno
+import heapq
+import itertools
+import os
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+
+from dns_cache import dns_cache, address_family
+from probe_common import TCP_TIMEOUT, tcp_status
+
+IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+def _default_max_inflight():
+    """Stay well below the open-file limit so Flask and SQLite keep their descriptors"""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, ValueError):
+        return 1000
+    if soft == resource.RLIM_INFINITY:
+        return 50000
+    return max(soft - 256, 64)
+
+
+TCP_MULTIPLEX_MAX_INFLIGHT = int(os.environ.get("TCP_MULTIPLEX_MAX_INFLIGHT", "0")) or _default_max_inflight()
+
+
+class TCPMultiplexer:
+    """Runs non-blocking connect probes for many endpoints on one selector thread"""
+
+    def __init__(self, max_inflight=TCP_MULTIPLEX_MAX_INFLIGHT):
+        self.max_inflight = max_inflight
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._pending = deque()  # Jobs waiting for a free in-flight slot
+        self._deadlines = []  # Heap of (deadline, seq, job)
+        self._sequence = itertools.count()
+        self._inflight = 0
+
+        # Lets submit() wake the loop out of select()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ, None)
+
+        self._thread = threading.Thread(target=self._run, name="tcp-multiplex", daemon=True)
+        self._thread.start()
+
+    def submit(self, hostname, port=443, timeout=TCP_TIMEOUT):
+        """Queue a connect probe and return a Future resolving to its outcome dict"""
+        future = Future()
+        job = {"future": future, "port": port, "timeout": timeout}
+        if not self._thread.is_alive():
+            job["dns_time"] = None
+            self._resolve(job, "other", detail="TCP multiplexer stopped")
+            return future
+
+        # Resolve in the caller's thread so the loop never blocks on DNS
+        start = time.perf_counter()
+        try:
+            job["address"] = dns_cache.resolve(hostname)[0]
+        except socket.gaierror:
+            elapsed = int((time.perf_counter() - start) * 1000)
+            future.set_result({"dns_time": None, "connect_time": None, "response_time": elapsed, "error": "dns"})
+            return future
+        job["dns_time"] = int((time.perf_counter() - start) * 1000)
+
+        with self._lock:
+            self._pending.append(job)
+        try:
+            self._wake_writer.send(b"\0")
+        except BlockingIOError:
+            pass  # Already a wake-up byte waiting
+        return future
+
+    # --- event loop ---
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    self._start_pending()
+                    timeout = max(self._deadlines[0][0] - time.perf_counter(), 0) if self._deadlines else None
+                    events = self._selector.select(timeout)
+                    now = time.perf_counter()  # One timestamp per wake-up keeps completions comparable
+                    for key, _ in events:
+                        if key.data is None:
+                            self._drain_wakeups()
+                        else:
+                            self._guarded(self._complete, key.data, now)
+                    self._expire(now)
+                except Exception as e:
+                    # Not tied to one job, so fail the in-flight ones rather than leave sweeps waiting
+                    print(f"Error in TCP multiplexer: {e}")
+                    self._fail_all(e)
+        finally:
+            print("⚠️ TCP multiplexer stopped; failing its outstanding probes")
+            self._fail_all("TCP multiplexer stopped")
+
+    def _guarded(self, step, job, *args):
+        """Run one job's step; if it raises, resolve the job as an "other" error"""
+        try:
+            step(job, *args)
+        except Exception as e:
+            print(f"Error in TCP multiplexer probe: {e}")
+            self._fail(job, e)
+
+    def _fail(self, job, detail):
+        if job.pop("registered", False):
+            try:
+                self._selector.unregister(job["socket"])
+            except (KeyError, ValueError):
+                pass
+            self._inflight -= 1
+        if not job["future"].done():
+            self._resolve(job, "other", detail=detail)
+
+    def _fail_all(self, detail):
+        for _, _, job in self._deadlines:
+            self._fail(job, detail)
+        self._deadlines = []
+        with self._lock:
+            pending, self._pending = list(self._pending), deque()
+        for job in pending:
+            self._fail(job, detail)
+
+    def _drain_wakeups(self):
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _start_pending(self):
+        while self._inflight < self.max_inflight:
+            with self._lock:
+                if not self._pending:
+                    return
+                job = self._pending.popleft()
+
+            self._guarded(self._start, job)
+
+    def _start(self, job):
+        sock = socket.socket(address_family(job["address"]), socket.SOCK_STREAM)
+        job["socket"] = sock
+        sock.setblocking(False)
+        job["started"] = time.perf_counter()
+        result = sock.connect_ex((job["address"], job["port"]))
+        if result == 0:
+            self._resolve(job, None, connect_time=time.perf_counter() - job["started"])
+        elif result in IN_PROGRESS:
+            self._selector.register(sock, selectors.EVENT_WRITE, job)
+            job["registered"] = True
+            self._inflight += 1
+            heapq.heappush(self._deadlines, (job["started"] + job["timeout"], next(self._sequence), job))
+        else:
+            self._resolve(job, "refused")
+
+    def _complete(self, job, now):
+        sock = job["socket"]
+        self._selector.unregister(sock)
+        del job["registered"]
+        self._inflight -= 1
+        error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error == 0:
+            self._resolve(job, None, connect_time=now - job["started"])
+        else:
+            self._resolve(job, "refused")
+
+    def _expire(self, now):
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, job = heapq.heappop(self._deadlines)
+            if job["future"].done():
+                continue  # Completed before its deadline
+            self._guarded(self._timed_out, job)
+
+    def _timed_out(self, job):
+        self._selector.unregister(job["socket"])
+        del job["registered"]
+        self._inflight -= 1
+        self._resolve(job, "timeout")
+
+    def _resolve(self, job, error, connect_time=None, detail=None):
+        sock = job.get("socket")
+        if sock is not None:
+            sock.close()
+        outcome = {"dns_time": job["dns_time"], "connect_time": None, "error": error, "timeout": job["timeout"]}
+        if error is None:
+            outcome["connect_time"] = int(connect_time * 1000)
+            outcome["response_time"] = outcome["dns_time"] + outcome["connect_time"]
+        elif error == "timeout":
+            outcome["response_time"] = int(job["timeout"] * 1000)  # Timeout time
+        elif error == "refused":
+            outcome["response_time"] = job["dns_time"] + int((time.perf_counter() - job["started"]) * 1000)
+        else:
+            outcome["response_time"] = None
+            outcome["detail"] = detail
+        job["future"].set_result(outcome)
+
+
+class MultiplexProbeExecutor:
+    """Executor-style facade so the EC2/Azure sweeps can submit checks to the multiplexer.
+
+    targets maps a threaded check function to a callable returning
+    (hostname, base status dict) for one endpoint.
+    """
+
+    def __init__(self, multiplexer, targets, port=443, timeout=TCP_TIMEOUT):
+        self.multiplexer = multiplexer
+        self.targets = targets
+        self.port = port
+        self.timeout = timeout
+        self.futures = []
+
+    def submit(self, check, endpoint):
+        hostname, status = self.targets[check](endpoint)
+        timeout = endpoint.get("timeout", self.timeout)
+        future = Future()
+
+        def publish(probe):
+            try:
+                future.set_result(tcp_status(status, probe.result(), self.port, endpoint.get("degraded_ms")))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.multiplexer.submit(hostname, self.port, timeout).add_done_callback(publish)
+        self.futures.append(future)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        wait(self.futures)
+        return False
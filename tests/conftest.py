@@ -0,0 +1,133 @@
+"""Shared fixtures. The modules live next to app.py, so the repository root goes on sys.path."""
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from werkzeug.serving import make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from history_store import HistoryWriter, _epoch_ms, connect, insert_checks, migrate, update_rollups  # noqa: E402
+from pipeline import ProbeKind, ProbePipeline  # noqa: E402
+
+
+def wait_for(condition, timeout=5, interval=0.01):
+    """Poll condition() until it is truthy; fails the test on timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(interval)
+    pytest.fail(f"timed out after {timeout}s waiting for {condition}")
+
+
+def serve(wsgi_app):
+    """Serve a WSGI app on a free localhost port from a daemon thread; returns (server, base url)"""
+    server = make_server("127.0.0.1", 0, wsgi_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def serve_keep_alive(respond):
+    """Like serve(), but HTTP/1.1 with keep-alive, which werkzeug's server always closes.
+
+    respond(handler) handles each GET or HEAD; returns (server, base url).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            respond(self)
+
+        do_HEAD = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def fake_kind(pipeline, name="websites", count=10, check=None, interval=3600, **options):
+    """A ProbeKind over count fake targets whose check succeeds instantly unless given one"""
+    def targets():
+        for i in range(count):
+            yield f"k{i}", {"name": f"site{i}", "url": f"http://site{i}.test/", "group": i % 2}, {"group": i % 2}
+
+    def operational(target):
+        return {"name": target["name"], "url": target["url"], "status": "operational", "status_code": 200,
+                "response_time": 10, "last_checked": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    return pipeline.register(ProbeKind(
+        name=name, label=name.title(), targets=targets, check=check or operational,
+        executor=pipeline.thread_executor, results={}, lock=threading.Lock(), interval=interval, **options,
+    ))
+
+
+def seed(conn, *checks, name="site", kind="websites"):
+    """Write (moment, status, response_time) checks through the same path as the history writer"""
+    rows = [(kind, name, f"http://{name}.test/", status, "200" if response_time else "Timeout", response_time,
+             int(moment.timestamp() * 1000), None, None, None, None, None)
+            for moment, status, response_time in checks]
+    with conn:
+        insert_checks(conn, rows)
+        update_rollups(conn, rows)
+
+
+@pytest.fixture
+def pipeline():
+    """A ProbePipeline whose history rows land in pipeline.stored"""
+    stored = []
+    probe_pipeline = ProbePipeline(workers=8, budget=100, store=lambda kind, status: stored.append(status))
+    probe_pipeline.stored = stored
+    return probe_pipeline
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A migrated, empty history database"""
+    conn = connect(str(tmp_path / "history.db"))
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """app.py with its history in a temporary database and empty live status maps"""
+    import app
+
+    monkeypatch.setattr(app, "DB_PATH", str(tmp_path / "status_history.db"))
+    app.init_db()
+    writer = HistoryWriter(lambda: connect(app.DB_PATH), insert_checks, after_insert=update_rollups)
+    monkeypatch.setattr(app, "history_writer", writer)
+    monkeypatch.setattr(app.pipeline, "flush", writer.flush)
+    for kind in app.pipeline.kinds.values():
+        kind.results.clear()
+    yield app
+    writer.close()
+    for kind in app.pipeline.kinds.values():
+        kind.results.clear()
+
+
+@pytest.fixture
+def local_tz():
+    """Run with a local time zone that is not UTC, so offsets matter"""
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "Asia/Kolkata"
+    time.tzset()
+    _epoch_ms.cache_clear()
+    yield
+    if previous is None:
+        os.environ.pop("TZ")
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+    _epoch_ms.cache_clear()
@@ -0,0 +1,87 @@
+"""Per-target timeouts and degraded thresholds learned from latency history."""
+import time
+
+import pytest
+
+import adaptive_limits
+from adaptive_limits import LatencyLimits
+from conftest import fake_kind, serve
+
+
+def learned(response_times, default_timeout=15):
+    limits = LatencyLimits(default_timeout)
+    for response_time in response_times:
+        limits.observe("k", {"status": "operational", "response_time": response_time})
+    return limits.limits("k")
+
+
+def test_nothing_is_learned_from_too_few_samples_or_failures():
+    limits = LatencyLimits(15)
+    for _ in range(50):
+        limits.observe("k", {"status": "down", "response_time": 15000})
+        limits.observe("k", {"status": "operational", "response_time": None})
+    for _ in range(19):
+        limits.observe("k", {"status": "operational", "response_time": 100})
+    assert limits.limits("k") is None and limits.stats() == {}
+    limits.observe("k", {"status": "degraded", "response_time": 100})
+    assert limits.limits("k")["samples"] == 20
+
+
+@pytest.mark.parametrize("response_time, timeout, degraded_ms", [
+    (100, 2, 250),  # Both floors
+    (1000, 4, 2000),
+    (5000, 15, 10000),  # Capped by the kind's default timeout
+    (9000, 15, 15000),  # ...and the threshold by the timeout
+])
+def test_limits_follow_the_p99(response_time, timeout, degraded_ms):
+    limits = learned([response_time] * 20)
+    assert (limits["timeout"], limits["degraded_ms"], limits["p99_ms"]) == (timeout, degraded_ms, response_time)
+
+
+def test_the_window_forgets_old_samples():
+    limits = LatencyLimits(15, window=20)
+    for response_time in [4000] * 20 + [100] * 20:
+        limits.observe("k", {"status": "operational", "response_time": response_time})
+    assert limits.limits("k")["p99_ms"] == 100
+
+
+def test_the_pipeline_probes_with_learned_limits(pipeline, monkeypatch):
+    monkeypatch.setattr(adaptive_limits, "ADAPTIVE_MIN_SAMPLES", 2)
+    seen = []
+
+    def check(target):
+        seen.append(target)
+        return {"name": target["name"], "url": target["url"], "status": "operational", "response_time": 1000}
+
+    kind = fake_kind(pipeline, count=2, check=check, limits=LatencyLimits(15))
+    pipeline.run("websites")
+    pipeline.run("websites")
+    assert all("timeout" not in target for target in seen) and kind.results["k0"]["limits"] is None
+
+    seen.clear()
+    pipeline.run("websites")
+    assert [(target["timeout"], target["degraded_ms"]) for target in seen] == [(4, 2000)] * 2
+    assert kind.results["k0"]["limits"]["timeout"] == 4
+
+    kind.targets = lambda: iter([("k0", {"name": "site0", "url": "http://site0.test/", "timeout": 9}, {})])
+    seen.clear()
+    pipeline.run("websites")
+    assert (seen[0]["timeout"], seen[0]["degraded_ms"]) == (9, 2000)  # A catalog timeout wins
+
+
+def slow_site(environ, start_response):
+    time.sleep(float(environ["QUERY_STRING"] or 0))
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+def test_a_learned_threshold_and_timeout_apply_to_a_real_check(app_module):
+    server, url = serve(slow_site)
+    try:
+        site = {"name": "local", "icon": "🧪", "degraded_ms": 20, "timeout": 0.5}
+        slow = app_module.check_website_status({**site, "url": url + "/?0.1"})
+        assert slow["status"] == "degraded" and slow["message"].startswith("Slower than usual")
+        hung = app_module.check_website_status({**site, "url": url + "/?2"})
+        assert (hung["status_code"], hung["message"]) == ("Timeout", "Connection timeout (0.5s)")
+    finally:
+        server.shutdown()
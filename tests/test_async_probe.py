@@ -0,0 +1,136 @@
+"""The asyncio probe engine against a local test site."""
+import asyncio
+import socket
+import threading
+import time
+from concurrent.futures import as_completed
+
+import pytest
+
+from async_probe import MAX_REDIRECTS, AsyncProbeEngine
+from conftest import serve
+
+
+class Site:
+    """A WSGI app with redirect chains, slow bodies and an in-flight counter"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    def __call__(self, environ, start_response):
+        path = environ["PATH_INFO"]
+        self.methods.append(environ["REQUEST_METHOD"])
+        if path.startswith("/hop/"):
+            left = int(path.rsplit("/", 1)[1])
+            if left:
+                start_response("302 Found", [("Location", f"/hop/{left - 1}")])
+                return [b""]
+        elif path == "/error":
+            start_response("503 Service Unavailable", [("Content-Type", "text/plain")])
+            return [b"down"]
+        elif path == "/slow-body":
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return self.slow_body()
+        elif path == "/held":
+            with self.lock:
+                self.in_flight += 1
+                self.most_in_flight = max(self.most_in_flight, self.in_flight)
+            time.sleep(0.2)
+            with self.lock:
+                self.in_flight -= 1
+        elif path == "/hang":
+            time.sleep(2)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"ok"]
+
+    def slow_body(self):
+        yield b"x" * 65536  # Past HTTP_PROBE_MAX_BYTES, so a bounded probe stops here
+        time.sleep(2)
+        yield b"x"
+
+
+@pytest.fixture(scope="module")
+def site():
+    app = Site()
+    server, app.url = serve(app)
+    yield app
+    server.shutdown()
+
+
+@pytest.fixture(scope="module")
+def engine():
+    probe_engine = AsyncProbeEngine(concurrency=2)
+    yield probe_engine
+    probe_engine.loop.call_soon_threadsafe(probe_engine.loop.stop)
+
+
+def check(engine, url, **site):
+    target = {"name": "local", "url": url, "icon": "🧪", **site}
+    return engine.submit(AsyncProbeEngine.check_website_status, target).result(10)
+
+
+def test_a_live_site_is_operational_with_phase_timings(engine, site):
+    status = check(engine, site.url + "/")
+    assert (status["status"], status["status_code"], status["redirects"]) == ("operational", 200, 0)
+    for phase in ("dns_time", "connect_time", "tls_time", "ttfb", "download_time"):
+        assert status[phase] >= 0
+    assert status["checked_at_ms"] and status["last_checked"]
+
+
+def test_redirects_are_followed_up_to_the_limit(engine, site):
+    assert check(engine, site.url + "/hop/3")["redirects"] == 3
+    looping = check(engine, site.url + f"/hop/{MAX_REDIRECTS + 1}")
+    assert (looping["status"], looping["status_code"]) == ("down", "Error")
+    assert "redirects" in looping["message"]
+
+
+def test_server_errors_refusals_and_timeouts_are_down(engine, site):
+    assert check(engine, site.url + "/error")["status"] == "down"
+
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    assert check(engine, f"http://127.0.0.1:{port}/")["status_code"] == "Connection Error"
+
+    hung = check(engine, site.url + "/hang", timeout=0.3)
+    assert (hung["status_code"], hung["message"]) == ("Timeout", "Connection timeout (0.3s)")
+
+
+def test_header_and_bounded_probes_skip_the_slow_rest_of_the_body(engine, site):
+    for mode in ("headers", "bounded"):
+        start = time.monotonic()
+        status = check(engine, site.url + "/slow-body", probe_mode=mode)
+        assert status["status"] == "operational" and status["probe_mode"] == mode
+        assert time.monotonic() - start < 1.5
+    full = check(engine, site.url + "/slow-body", probe_mode="full")
+    assert full["response_time"] >= 2000
+
+    check(engine, site.url + "/", method="head")
+    assert site.methods[-1] == "HEAD"
+
+
+def test_concurrency_is_capped_across_a_sweep(engine, site):
+    targets = [{"name": f"site{i}", "url": site.url + "/held", "icon": "🧪"} for i in range(6)]
+    with engine.executor() as executor:
+        futures = [executor.submit(AsyncProbeEngine.check_website_status, target) for target in targets]
+        names = {future.result()["name"] for future in as_completed(futures, timeout=10)}
+    assert names == {target["name"] for target in targets}
+    assert site.most_in_flight == 2
+
+
+def test_tcp_checks_connect_or_report_refused(engine):
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        port = listener.getsockname()[1]
+        base = {"name": "local", "ip": "127.0.0.1", "icon": "🧪"}
+        open_port = asyncio.run_coroutine_threadsafe(engine._check_tcp("127.0.0.1", dict(base), port=port),
+                                                     engine.loop).result(5)
+    assert open_port["status"] == "operational" and open_port["connect_time"] >= 0
+
+    closed = asyncio.run_coroutine_threadsafe(engine._check_tcp("127.0.0.1", dict(base), port=port),
+                                              engine.loop).result(5)
+    assert closed["error"] == "refused" and f"port {port}" in closed["message"]
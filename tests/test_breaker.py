@@ -0,0 +1,108 @@
+"""Circuit breaker state transitions, alone and inside the pipeline."""
+import pytest
+
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from conftest import fake_kind
+
+TIMEOUT = {"status": "down", "status_code": "Timeout"}
+REFUSED = {"status": "down", "error": "refused"}
+SERVER_ERROR = {"status": "down", "status_code": 503}
+OK = {"status": "operational", "status_code": 200}
+
+
+def open_breaker(breaker, key="k"):
+    for _ in range(breaker.failures):
+        payload = breaker.record(key, TIMEOUT)
+    return payload
+
+
+def test_unreachable_results_open_the_breaker():
+    breaker = CircuitBreaker(failures=3, retry_interval=60)
+    assert breaker.record("k", TIMEOUT)["state"] == CLOSED
+    assert breaker.record("k", REFUSED)["state"] == CLOSED
+    payload = breaker.record("k", {"status": "down", "error": "dns"})
+    assert payload["state"] == OPEN
+    assert payload["consecutive_failures"] == 3
+    assert payload["message"].startswith("Unreachable for 3 checks")
+    assert breaker.plan("k") == (False, None)
+
+
+@pytest.mark.parametrize("status", [SERVER_ERROR, {"status": "down", "error": "other"}, {"status": "degraded"}])
+def test_answers_from_the_host_do_not_count_as_failures(status):
+    breaker = CircuitBreaker(failures=2)
+    breaker.record("k", TIMEOUT)
+    for _ in range(3):
+        payload = breaker.record("k", status)
+    assert payload == {"state": CLOSED, "consecutive_failures": 0}
+
+
+def test_retry_goes_half_open_and_an_answer_closes():
+    breaker = CircuitBreaker(failures=1, retry_interval=0, probe_timeout=2)
+    open_breaker(breaker)
+    assert breaker.plan("k") == (True, 2)
+    assert breaker.plan("k") == (False, None)  # One fail-fast probe at a time
+    assert breaker.record("k", SERVER_ERROR)["state"] == CLOSED
+    assert breaker.plan("k") == (True, None)
+
+
+def test_failed_retry_reopens():
+    breaker = CircuitBreaker(failures=3, retry_interval=0)
+    open_breaker(breaker)
+    breaker.plan("k")
+    payload = breaker.record("k", TIMEOUT)
+    assert payload["state"] == OPEN
+    assert payload["consecutive_failures"] == 4
+
+
+def test_abandon_returns_half_open_to_open():
+    breaker = CircuitBreaker(failures=1, retry_interval=0)
+    open_breaker(breaker)
+    breaker.plan("k")
+    assert breaker.stats()["open"] == 1
+    breaker.abandon("k")
+    assert breaker._states["k"]["state"] == OPEN
+    assert breaker.plan("k") == (True, breaker.probe_timeout)
+
+
+def test_submit_error_does_not_leave_the_target_half_open(pipeline):
+    breaker = CircuitBreaker(failures=1, retry_interval=0)
+    kind = fake_kind(pipeline, count=1, breaker=breaker)
+    kind.results["k0"] = {"name": "site0", **TIMEOUT}
+    open_breaker(breaker, "k0")
+
+    class BrokenExecutor:
+        def submit(self, check, target):
+            raise RuntimeError("pool shut down")
+
+    with pytest.raises(RuntimeError):
+        pipeline._submit(kind, BrokenExecutor(), "k0", {"name": "site0", "url": "http://site0.test/"})
+    assert breaker._states["k0"]["state"] == OPEN
+    assert breaker.plan("k0")[0]
+
+
+def test_open_breaker_serves_the_last_result_in_a_sweep(pipeline):
+    breaker = CircuitBreaker(failures=1, retry_interval=3600)
+    kind = fake_kind(pipeline, count=2, breaker=breaker)
+    kind.results["k0"] = {"name": "site0", **TIMEOUT}
+    open_breaker(breaker, "k0")
+
+    pipeline.run("websites")
+    assert kind.results["k0"]["breaker"]["skipped"]
+    assert kind.results["k1"]["breaker"]["state"] == CLOSED
+    assert [s["name"] for s in pipeline.stored] == ["site1"]  # Served-again results write no history
+
+
+def test_open_breaker_without_a_last_result_probes_with_the_retry_timeout(pipeline):
+    breaker = CircuitBreaker(failures=1, retry_interval=3600, probe_timeout=2)
+    timeouts = []
+
+    def check(target):
+        timeouts.append(target.get("timeout"))
+        return {"name": target["name"], "url": target["url"], **TIMEOUT}
+
+    kind = fake_kind(pipeline, count=1, check=check, breaker=breaker)
+    open_breaker(breaker, "k0")  # Opened, but its results were not kept
+    pipeline.run("websites")
+    assert timeouts == [2]
+    assert "skipped" not in kind.results["k0"]["breaker"]
+    assert breaker._states["k0"]["state"] == OPEN
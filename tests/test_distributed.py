@@ -0,0 +1,241 @@
+"""Coordinator leases and pushed-result validation, plus localhost runs with two workers."""
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import distributed
+from conftest import ROOT, fake_kind, serve, wait_for
+from distributed import Coordinator, Worker
+from pipeline import ProbeKind, ProbePipeline
+from sharded import shard_of
+
+TOKEN = "test-token"
+
+# A worker node, started the way distributed.py is, whose websites all point
+# at a local test site. argv: site url, coordinator url, worker id
+WORKER = """
+import runpy
+import sys
+
+import app
+
+site_url, coordinator_url, worker_id = sys.argv[1:]
+for name in [name for name in app.pipeline.kinds if name != "websites"]:
+    del app.pipeline.kinds[name]
+app.pipeline.kinds["websites"].interval = 0.5
+for page in app.PAGES.values():
+    for website in page["websites"]:
+        website["url"] = site_url
+sys.argv = ["distributed.py", "--coordinator", coordinator_url, "--id", worker_id]
+runpy.run_path("distributed.py", run_name="__main__")
+"""
+
+
+def status(name="site0", **fields):
+    return {"name": name, "status": "operational", "response_time": 12, "last_checked": "2026-01-01 00:00:00", **fields}
+
+
+@pytest.fixture
+def coordinator(pipeline):
+    fake_kind(pipeline, count=20)
+    return Coordinator(pipeline, shards=4, lease_seconds=30)
+
+
+def held_keys(coordinator, lease):
+    return [f"k{i}" for i in range(20) if shard_of("websites", f"k{i}", coordinator.shards) in lease["shards"]]
+
+
+def test_lease_splits_shards_fairly_and_rebalances(coordinator):
+    first = coordinator.lease("a")
+    assert first["shards"] == [0, 1, 2, 3]
+    assert coordinator.lease("b")["shards"] == []  # Nothing free until "a" gives shards back
+    assert len(coordinator.lease("a")["shards"]) == 2
+    assert len(coordinator.lease("b")["shards"]) == 2
+    assert coordinator.stats()["unleased_shards"] == 0
+
+
+def test_expired_leases_are_handed_out_again(pipeline):
+    fake_kind(pipeline)
+    coordinator = Coordinator(pipeline, shards=4, lease_seconds=0.05)
+    coordinator.lease("a")
+    time.sleep(0.1)
+    assert coordinator.lease("b")["shards"] == [0, 1, 2, 3]
+
+
+def test_accept_merges_results_from_held_shards(coordinator, pipeline):
+    lease = coordinator.lease("a")
+    keys = held_keys(coordinator, lease)
+    accepted = coordinator.accept("a", {"websites": {key: status(key) for key in keys}})
+    assert accepted == len(keys)
+    results = wait_for(lambda: len(pipeline.kinds["websites"].results) == len(keys) and pipeline.kinds["websites"].results)
+    assert {s["worker"] for s in results.values()} == {"a"}
+    assert coordinator.stats()["workers"]["a"]["results"] == len(keys)
+
+
+@pytest.mark.parametrize("batches", [
+    [],
+    {"websites": []},
+    {"websites": {"k0": "down"}},
+    {"websites": {"k0": {"name": "site0"}}},
+    {"websites": {"k0": status(status="sideways")}},
+    {"websites": {"k0": status(response_time="fast")}},
+    {"websites": {"k0": status(last_checked="yesterday")}},
+    {"websites": {"k0": status(checked_at_ms="2026-01-01")}},
+    {"websites": {"k0": status(status_code="200")}},
+    {"websites": {"k0": status(status_code=True)}},
+    {"websites": {"k0": status(status_code=[500])}},
+    {"websites": {"k0": status(error={"kind": "timeout"})}},
+    {"websites": {"nope": status()}},
+    {"nothing": {"k0": status()}},
+])
+def test_accept_rejects_malformed_batches(coordinator, pipeline, batches):
+    coordinator.lease("a")  # Holds every shard
+    with pytest.raises(ValueError):
+        coordinator.accept("a", batches)
+    assert pipeline.kinds["websites"].results == {}
+
+
+def test_accept_takes_status_codes_and_error_labels(coordinator, pipeline):
+    coordinator.lease("a")
+    batch = {"k0": status(status_code=503), "k1": status(status="down", status_code="Timeout"),
+             "k2": status(status="down", status_code=None, error="refused")}
+    assert coordinator.accept("a", {"websites": batch}) == 3
+
+
+def test_accept_rejects_targets_outside_the_workers_shards(coordinator, pipeline):
+    coordinator.lease("a")
+    coordinator.lease("b")
+    coordinator.lease("a")  # Gives half back
+    lease_b = coordinator.lease("b")
+    foreign = next(f"k{i}" for i in range(20) if shard_of("websites", f"k{i}", 4) not in lease_b["shards"])
+    with pytest.raises(ValueError, match="not in a shard leased to b"):
+        coordinator.accept("b", {"websites": {foreign: status()}})
+
+
+@pytest.fixture
+def coordinator_app(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "coordinator", Coordinator(app_module.pipeline, shards=8, lease_seconds=1.5))
+    monkeypatch.setattr(app_module, "COORDINATOR_TOKEN", TOKEN)
+    return app_module
+
+
+def test_results_route_rejects_bad_payloads_with_400(coordinator_app):
+    client = coordinator_app.app.test_client()
+    headers = {"X-Worker-Token": TOKEN}
+    client.post("/api/workers/lease", json={"worker": "a"}, headers=headers)
+    key = next(key for key, _, _ in coordinator_app.website_targets())
+
+    for results in ([], {"websites": {key: "down"}}, {"websites": {key: {"name": "x"}}}):
+        response = client.post("/api/workers/results", json={"worker": "a", "results": results}, headers=headers)
+        assert response.status_code == 400
+    assert client.post("/api/workers/results", json={"worker": "a", "results": {}}).status_code == 403
+    wrong = {"X-Worker-Token": "tökén".encode().decode("latin-1")}  # Non-ASCII, as a client may send it
+    assert client.post("/api/workers/lease", json={"worker": "a"}, headers=wrong).status_code == 403
+    assert client.get("/api/status").status_code == 200
+
+
+def test_force_refresh_is_delegated_to_the_workers(coordinator_app, monkeypatch):
+    def refresh(*args, **kwargs):
+        raise AssertionError("swept locally on a coordinator")
+
+    monkeypatch.setattr(coordinator_app.pipeline, "refresh", refresh)
+    live = {"k0": status(worker="a")}
+    monkeypatch.setattr(coordinator_app, "status_data", live)
+    client = coordinator_app.app.test_client()
+    response = client.get("/api/status", query_string={"force": "1"}).get_json()
+    assert (response["refresh"], response["websites"]) == ("delegated", [live["k0"]])
+    assert client.get("/api/ec2/status", query_string={"fresh": "1"}).get_json()["refresh"] == "delegated"
+
+
+def test_coordinator_refuses_to_start_without_a_token():
+    env = {**os.environ, "PROBE_ROLE": "coordinator", "COORDINATOR_TOKEN": ""}
+    result = subprocess.run([sys.executable, "-c", "import app"], cwd=ROOT, env=env, capture_output=True, text=True,
+                            timeout=60)
+    assert result.returncode != 0
+    assert "COORDINATOR_TOKEN" in result.stderr
+
+
+def test_two_workers_split_the_catalog_on_localhost(coordinator_app, monkeypatch):
+    """End to end over HTTP: a real coordinator server and two in-process workers"""
+    monkeypatch.setattr(distributed, "COORDINATOR_TOKEN", TOKEN)
+    monkeypatch.setattr(distributed, "WORKER_PUSH_INTERVAL", 0.1)
+    server, url = serve(coordinator_app.app)
+
+    def check(site):
+        return {"name": site["name"], "url": site["url"], "status": "operational", "status_code": 200,
+                "response_time": 5, "last_checked": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    workers = []
+    try:
+        for worker_id in ("w1", "w2"):
+            pipeline = ProbePipeline(workers=4, budget=50, store=lambda kind, status: None)
+            pipeline.register(ProbeKind(
+                name="websites", label="Website", targets=coordinator_app.website_targets, check=check,
+                executor=pipeline.thread_executor, results={}, lock=threading.Lock(), interval=0.5,
+            ))
+            worker = Worker(url, worker_id, pipeline)
+            threading.Thread(target=worker.start, daemon=True).start()
+            workers.append(worker)
+
+        expected = {key for key, _, _ in coordinator_app.website_targets()}
+        live = coordinator_app.status_data
+
+        def both_workers_reported():
+            with coordinator_app.status_data_lock:
+                return set(live) == expected and {s["worker"] for s in live.values()} == {"w1", "w2"}
+
+        wait_for(both_workers_reported, timeout=20)
+        stats = coordinator_app.app.test_client().get("/api/workers").get_json()
+        assert {worker: info["shards"] for worker, info in stats["workers"].items()} == {"w1": 4, "w2": 4}
+    finally:
+        for worker in workers:
+            worker.shards = set()  # Stop probing; the daemon threads end with the test run
+        server.shutdown()
+
+
+def site(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+def test_a_killed_worker_process_loses_its_shards(coordinator_app, tmp_path):
+    """Worker processes over real sockets; when one dies its shards move once the lease runs out"""
+    site_server, site_url = serve(site)
+    server, url = serve(coordinator_app.app)
+    env = {**os.environ, "COORDINATOR_TOKEN": TOKEN, "WORKER_PUSH_INTERVAL": "0.1", "PROBE_HEDGING": "0"}
+    expected = {key for key, _, _ in coordinator_app.website_targets()}
+    live = coordinator_app.status_data
+    client = coordinator_app.app.test_client()
+
+    def reported_by(*workers):
+        with coordinator_app.status_data_lock:
+            return set(live) == expected and {s["worker"] for s in live.values()} == set(workers)
+
+    def shards():
+        return {worker: info["shards"] for worker, info in client.get("/api/workers").get_json()["workers"].items()}
+
+    processes = {}
+    try:
+        for worker_id in ("w1", "w2"):
+            with open(tmp_path / f"{worker_id}.log", "w") as log:
+                processes[worker_id] = subprocess.Popen([sys.executable, "-c", WORKER, site_url, url, worker_id],
+                                                        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+        wait_for(lambda: reported_by("w1", "w2"), timeout=30)
+        assert shards() == {"w1": 4, "w2": 4}
+
+        processes["w1"].kill()
+        processes["w1"].wait(10)
+        wait_for(lambda: shards() == {"w1": 0, "w2": 8}, timeout=30)
+        wait_for(lambda: reported_by("w2"), timeout=30)
+        with coordinator_app.status_data_lock:
+            assert {s["status_code"] for s in live.values()} == {200}  # Probed the local site
+    finally:
+        for process in processes.values():
+            process.kill()
+            process.wait(10)
+        server.shutdown()
+        site_server.shutdown()
@@ -0,0 +1,118 @@
+"""The TTL-aware DNS cache, with a scripted resolver in place of the network."""
+import asyncio
+import socket
+import time
+from types import SimpleNamespace
+
+import dns.exception
+import dns.resolver
+import pytest
+
+import dns_cache as dns_cache_module
+from dns_cache import DNSCache
+
+
+class Answer(list):
+    def __init__(self, addresses, ttl):
+        super().__init__(SimpleNamespace(address=address) for address in addresses)
+        self.rrset = SimpleNamespace(ttl=ttl)
+
+
+class Resolver:
+    """Answers from a {(hostname, record type): addresses} table and counts queries"""
+
+    def __init__(self, records, ttl=300, error=None):
+        self.records = records
+        self.ttl = ttl
+        self.error = error
+        self.queries = []
+
+    def resolve(self, hostname, record_type, lifetime=None):
+        self.queries.append((hostname, record_type))
+        if self.error:
+            raise self.error
+        if not any(host == hostname for host, _ in self.records):
+            raise dns.resolver.NXDOMAIN()
+        if (hostname, record_type) not in self.records:
+            raise dns.resolver.NoAnswer()
+        return Answer(self.records[hostname, record_type], self.ttl)
+
+
+class AsyncResolver(Resolver):
+    async def resolve(self, hostname, record_type, lifetime=None):
+        return Resolver.resolve(self, hostname, record_type, lifetime)
+
+
+@pytest.fixture
+def cache():
+    return DNSCache()
+
+
+def test_answers_are_cached_for_their_ttl(cache):
+    cache._resolver = Resolver({("site.test", "A"): ["192.0.2.1", "192.0.2.2"]}, ttl=300)
+    assert cache.resolve("site.test") == ["192.0.2.1", "192.0.2.2"]
+    assert cache.resolve("site.test") == ["192.0.2.1", "192.0.2.2"]
+    assert cache._resolver.queries == [("site.test", "A")]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert 299 < cache._entries["site.test"][1] - time.time() <= 300
+
+
+def test_ttls_are_clamped(cache, monkeypatch):
+    monkeypatch.setattr(dns_cache_module, "DNS_MAX_TTL", 60)
+    cache._resolver = Resolver({("long.test", "A"): ["192.0.2.1"]}, ttl=86400)
+    cache.resolve("long.test")
+    assert cache._entries["long.test"][1] - time.time() <= 60
+
+    monkeypatch.setattr(dns_cache_module, "DNS_MIN_TTL", 0)
+    cache._resolver = Resolver({("short.test", "A"): ["192.0.2.3"]}, ttl=0)
+    cache.resolve("short.test")
+    cache.resolve("short.test")  # Already expired, so asked again
+    assert len(cache._resolver.queries) == 2
+
+
+def test_aaaa_is_asked_when_there_is_no_a_record(cache):
+    cache._resolver = Resolver({("v6.test", "AAAA"): ["2001:db8::1"]})
+    assert cache.resolve("v6.test") == ["2001:db8::1"]
+    assert cache._resolver.queries == [("v6.test", "A"), ("v6.test", "AAAA")]
+    assert dns_cache_module.address_family("2001:db8::1") == socket.AF_INET6
+
+
+def test_nxdomain_is_cached_as_a_failure(cache):
+    cache._resolver = Resolver({})
+    for _ in range(2):
+        with pytest.raises(socket.gaierror, match="NXDOMAIN"):
+            cache.resolve("missing.invalid")
+    assert cache._resolver.queries == [("missing.invalid", "A")]
+    assert cache.stats()["negative_entries"] == 1
+
+
+def test_an_unreachable_resolver_falls_back_to_the_system_uncached(cache):
+    cache._resolver = Resolver({}, error=dns.exception.Timeout())
+    assert "127.0.0.1" in cache.resolve("localhost")
+    assert cache.stats()["entries"] == 0
+
+
+def test_ip_addresses_skip_the_resolver(cache):
+    cache._resolver = Resolver({})
+    assert cache.resolve("198.51.100.7") == ["198.51.100.7"]
+    assert cache._resolver.queries == []
+
+
+def test_prefetch_resolves_only_what_is_not_cached(cache):
+    cache._resolver = Resolver({("a.test", "A"): ["192.0.2.1"], ("b.test", "A"): ["192.0.2.2"]})
+    cache.resolve("a.test")
+    summary = cache.prefetch(["a.test", "b.test", "b.test", "missing.invalid"])
+    assert (summary["hosts"], summary["resolved"], summary["failed"]) == (3, 2, 1)
+    assert cache.resolve("b.test") == ["192.0.2.2"]
+    assert len(cache._resolver.queries) == 3  # a, b and missing once each
+
+
+def test_async_lookups_share_the_cache(cache):
+    cache._async_resolver = AsyncResolver({("site.test", "A"): ["192.0.2.1"]})
+    cache._resolver = Resolver({})
+    assert asyncio.run(cache.resolve_async("site.test")) == ["192.0.2.1"]
+    assert cache.resolve("site.test") == ["192.0.2.1"]  # Answered from the cache
+    with pytest.raises(socket.gaierror):
+        asyncio.run(cache.resolve_async("missing.invalid"))
+    assert cache._resolver.queries == []
@@ -0,0 +1,124 @@
+"""Hedged attempts and confirmation retries."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from hedging import HEDGE_MIN_SAMPLES, HedgedProbe, HedgePolicy, Timers
+
+TIMERS = Timers()
+
+
+class Budget:
+    """try_acquire/release pair that counts what is held"""
+
+    def __init__(self, slots=10):
+        self.slots = slots
+        self.held = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.held >= self.slots:
+                return False
+            self.held += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.held -= 1
+
+
+class Script:
+    """Submits attempts that answer in turn with the given (delay, status) pairs"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.pool = ThreadPoolExecutor(max_workers=4)
+
+    def submit(self):
+        delay, status = self.answers.pop(0)
+
+        def attempt():
+            time.sleep(delay)
+            return {"name": "site", "status": status, "response_time": int(delay * 1000)}
+
+        return self.pool.submit(attempt)
+
+
+def probe(script, policy, previous=None, budget=None):
+    budget = budget or Budget()
+    future = HedgedProbe(script.submit, policy, TIMERS, previous, budget.try_acquire, budget.release).start()
+    return future.result(5), budget
+
+
+def trained(delay_ms=10, **options):
+    policy = HedgePolicy(min_delay_ms=0, **options)
+    for _ in range(HEDGE_MIN_SAMPLES):
+        policy.observe({"status": "operational", "response_time": delay_ms})
+    return policy
+
+
+def test_hedge_delay_is_learned_from_answers():
+    policy = HedgePolicy(percentile=50, min_delay_ms=100)
+    for response_time in range(HEDGE_MIN_SAMPLES - 1):
+        policy.observe({"status": "operational", "response_time": response_time * 20})
+    assert policy.hedge_delay() is None
+    policy.observe({"status": "down", "response_time": 5})  # Failures are not learned from
+    assert policy.hedge_delay() is None
+    policy.observe({"status": "operational", "response_time": 380})
+    assert policy.hedge_delay() == 0.2
+    assert HedgePolicy(min_delay_ms=100).hedge_delay() is None
+
+
+def test_a_new_down_is_confirmed_by_a_retry():
+    policy = HedgePolicy(confirm_retries=1)
+    status, budget = probe(Script((0, "down"), (0, "operational")), policy)
+    assert (status["status"], status["attempts"], status["hedged"]) == ("operational", 2, False)
+    assert policy.counters["retries"] == policy.counters["retry_recoveries"] == 1
+    assert budget.held == 0
+
+
+def test_a_confirmed_down_is_reported_after_the_retries():
+    policy = HedgePolicy(confirm_retries=2)
+    status, budget = probe(Script((0, "down"), (0, "down"), (0, "down")), policy)
+    assert (status["status"], status["attempts"]) == ("down", 3)
+    assert policy.counters["retry_recoveries"] == 0
+    assert budget.held == 0
+
+
+@pytest.mark.parametrize("previous, slots", [("down", 10), ("operational", 0)])
+def test_no_retry_when_already_down_or_out_of_budget(previous, slots):
+    policy = HedgePolicy(confirm_retries=1)
+    status, _ = probe(Script((0, "down"), (0, "operational")), policy, previous, Budget(slots))
+    assert (status["status"], status["attempts"]) == ("down", 1)
+    assert policy.counters["retries"] == 0
+
+
+def test_a_slow_primary_is_hedged_and_the_first_answer_wins():
+    policy = trained(delay_ms=20)
+    status, budget = probe(Script((1, "operational"), (0, "operational")), policy)
+    assert (status["attempts"], status["hedged"]) == (2, True)
+    assert status["hedged_latency"] < 1000
+    assert policy.counters["hedges"] == policy.counters["hedge_wins"] == 1
+    time.sleep(1.1)  # The losing primary still hands its slot back
+    assert budget.held == 0
+
+
+def test_a_fast_primary_is_not_hedged():
+    policy = trained(delay_ms=200)
+    status, _ = probe(Script((0, "operational")), policy)
+    assert (status["attempts"], status["hedged"]) == (1, False)
+    time.sleep(0.25)
+    assert policy.counters["hedges"] == 0
+
+
+def test_a_failed_submit_fails_the_probe():
+    def submit():
+        raise RuntimeError("pool shut down")
+
+    future = HedgedProbe(submit, HedgePolicy(confirm_retries=0), TIMERS, None, Budget().try_acquire,
+                         Budget().release).start()
+    with pytest.raises(RuntimeError, match="pool shut down"):
+        future.result(5)
@@ -0,0 +1,90 @@
+"""Keyset-paged history and its status filters."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import seed
+from history_store import connect, history_page, parse_cursor
+
+START = datetime(2026, 5, 1, 12, 0)
+STATES = ("operational", "operational", "down", "operational", "degraded")
+
+
+def fill(conn, count=23):
+    """count checks of two sites, two at each second, so pages split ties"""
+    for i in range(count):
+        seed(conn, (START + timedelta(seconds=i // 2), STATES[i % len(STATES)], i), name=f"site{i % 2}")
+
+
+def pages(conn, limit, **filters):
+    """Every page from the first, following next_cursor"""
+    result, cursor = [], None
+    while True:
+        page, cursor = history_page(conn, limit, cursor=cursor, **filters)
+        result.append(page)
+        if cursor is None:
+            return result
+
+
+def test_cursor_pages_cover_every_check_once_newest_first(db):
+    fill(db)
+    everything = history_page(db, 100)[0]
+    assert [check["response_time"] for check in everything] == list(range(22, -1, -1))
+    paged = pages(db, 5)
+    assert [len(page) for page in paged] == [5, 5, 5, 5, 3]
+    assert [check for page in paged for check in page] == everything
+    assert history_page(db, 5, offset=10)[0] == paged[2]
+
+
+def test_new_checks_do_not_shift_later_pages(db):
+    fill(db)
+    cursor = history_page(db, 5)[1]
+    second = history_page(db, 5, offset=5)[0]
+    seed(db, (START + timedelta(hours=1), "operational", 99))
+    assert history_page(db, 5, cursor=cursor)[0] == second
+    assert history_page(db, 5, offset=5)[0] != second  # An offset page moves by the new row
+
+
+def test_status_filters(db):
+    fill(db)
+    down = [check for page in pages(db, 2, statuses=["down"]) for check in page]
+    assert [check["response_time"] for check in down] == [22, 17, 12, 7, 2]
+    problems = [check for page in pages(db, 3, statuses=["down", "degraded"]) for check in page]
+    assert {check["status"] for check in problems} == {"down", "degraded"}
+    assert len(problems) == 9
+    healthy = [check for page in pages(db, 4, statuses=["operational"]) for check in page]
+    assert len(healthy) == 14 and {check["status"] for check in healthy} == {"operational"}
+    assert history_page(db, 10, statuses=["unknown"]) == ([], None)
+
+
+def test_one_site_with_a_time_range(db):
+    fill(db)
+    checks = [check for page in pages(db, 2, name="site1", start=START + timedelta(seconds=3),
+                                      end=START + timedelta(seconds=8)) for check in page]
+    assert [check["response_time"] for check in checks] == [15, 13, 11, 9, 7]
+    assert "name" not in checks[0]
+
+
+def test_parse_cursor():
+    assert parse_cursor("1777636800000:42") == (1777636800000, 42)
+    for cursor in ("", "12", "a:b", "1:2:3"):
+        with pytest.raises(ValueError):
+            parse_cursor(cursor)
+
+
+def test_history_routes_page_with_next_cursor(app_module):
+    conn = connect(app_module.DB_PATH)
+    fill(conn)
+    conn.close()
+    client = app_module.app.test_client()
+    first = client.get("/api/history", query_string={"limit": 10, "status": "operational,down"}).get_json()
+    assert first["count"] == 10 and first["next_cursor"]
+    second = client.get("/api/history", query_string={"limit": 10, "status": "operational,down",
+                                                      "cursor": first["next_cursor"]}).get_json()
+    assert second["count"] == 9 and second["next_cursor"] is None
+    one_site = client.get("/api/history/site0", query_string={"limit": 50, "status": "down"}).get_json()
+    assert [check["response_time"] for check in one_site["history"]] == [22, 12, 2]
+
+    for query in ({"status": "sideways"}, {"cursor": "yesterday"}):
+        assert client.get("/api/history", query_string=query).status_code == 400
+        assert client.get("/api/history/site0", query_string=query).status_code == 400
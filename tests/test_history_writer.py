@@ -0,0 +1,164 @@
+"""The write-behind history queue."""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import history_store
+from conftest import fake_kind, wait_for
+from history_store import HistoryWriter, connect, insert_checks, update_rollups
+from pipeline import ProbePipeline
+
+
+def row(name="site", checked_at=1777636800000, status="operational"):
+    return ("websites", name, f"http://{name}.test/", status, "200", 10, checked_at, None, None, None, None, None)
+
+
+@pytest.fixture
+def make_writer(db, tmp_path):
+    """Build HistoryWriters on the db fixture's file; closed after the test"""
+    writers = []
+
+    def make(insert=insert_checks, **options):
+        options = {"flush_interval": 0.05, "after_insert": update_rollups, **options}
+        history_writer = HistoryWriter(lambda: connect(str(tmp_path / "history.db")), insert, **options)
+        writers.append(history_writer)
+        return history_writer
+
+    yield make
+    for history_writer in writers:
+        history_writer.close()
+
+
+@pytest.fixture
+def writer(make_writer):
+    return make_writer()
+
+
+class LockedInsert:
+    """insert_checks, but failing like a locked database while `locked` is set"""
+
+    def __init__(self):
+        self.locked = threading.Event()
+        self.locked.set()
+        self.attempts = 0
+
+    def __call__(self, conn, rows):
+        self.attempts += 1
+        if self.locked.is_set():
+            raise sqlite3.OperationalError("database is locked")
+        insert_checks(conn, rows)
+
+
+def stored(db):
+    return db.execute("SELECT COUNT(*) FROM checks").fetchone()[0]
+
+
+def test_a_row_that_cannot_be_written_does_not_stop_the_writer(writer, db):
+    writer.add(row(checked_at="yesterday"))
+    assert writer.flush(wait=True, timeout=5)
+    assert writer.stats()["rows_dropped"] == 1 and writer._thread.is_alive()
+    for i in range(3):
+        writer.add(row(checked_at=1777636800000 + i))
+    assert writer.flush(wait=True, timeout=5)
+    assert stored(db) == 3 and writer.stats()["rows_written"] == 3
+
+
+def test_a_sweep_is_written_in_one_transaction(make_writer, db):
+    writer = make_writer(flush_interval=3600)
+    pipeline = ProbePipeline(workers=4, budget=50, store=lambda kind, status: writer.add(row(status["name"])),
+                             flush=writer.flush)
+    fake_kind(pipeline, count=10)
+    pipeline.run("websites")
+    wait_for(lambda: writer.stats()["rows_written"] == 10)
+    assert writer.stats()["batches"] == 1
+    assert db.execute("SELECT SUM(checks) FROM history_rollup_minute").fetchone() == (10,)  # Rollups in the same batch
+
+
+def test_rows_wait_for_a_full_batch_or_the_interval(make_writer, db):
+    sized = make_writer(flush_interval=3600, flush_size=4)
+    for i in range(3):
+        sized.add(row(checked_at=1777636800000 + i))
+    time.sleep(0.1)
+    assert stored(db) == 0
+    sized.add(row(checked_at=1777636800003))
+    wait_for(lambda: stored(db) == 4)
+    assert sized.stats()["batches"] == 1
+
+    timed = make_writer(flush_interval=0.1)
+    timed.add(row(name="other"))
+    wait_for(lambda: stored(db) == 5, timeout=2)
+
+
+def test_a_batch_commits_or_rolls_back_as_a_whole(make_writer, db):
+    def failing_rollups(conn, rows):
+        raise ValueError("rollup bug")
+
+    writer = make_writer(after_insert=failing_rollups)
+    writer.add(row())
+    writer.add(row(checked_at=1777636800001))
+    assert writer.flush(wait=True, timeout=5)
+    assert stored(db) == 0 and writer.stats()["rows_dropped"] == 2  # The inserted checks went with it
+
+
+@pytest.fixture
+def locked(monkeypatch):
+    monkeypatch.setattr(history_store, "HISTORY_RETRY_DELAY", 0.02)
+    insert = LockedInsert()
+    yield insert
+    insert.locked.clear()
+
+
+def test_queued_rows_survive_a_locked_database(make_writer, db, locked):
+    writer = make_writer(insert=locked, flush_size=1)
+    start = time.monotonic()
+    for i in range(5):
+        writer.add(row(checked_at=1777636800000 + i))
+    assert time.monotonic() - start < 0.1  # Adding never waits on the database
+    wait_for(lambda: locked.attempts >= 3)
+    assert stored(db) == 0 and writer.stats()["write_errors"] >= 3
+
+    locked.locked.clear()
+    assert writer.flush(wait=True, timeout=5)
+    assert stored(db) == 5 and writer.stats()["rows_dropped"] == 0
+
+
+def test_a_full_queue_drops_new_rows(make_writer, db, locked):
+    writer = make_writer(insert=locked, flush_size=1, queue_size=2, policy="drop")
+    writer.add(row(checked_at=1777636800000))
+    wait_for(lambda: locked.attempts)  # The writer holds that row and retries it
+    for i in range(1, 5):
+        writer.add(row(checked_at=1777636800000 + i))
+    stats = writer.stats()
+    assert (stats["rows_dropped"], stats["enqueued"], stats["high_water"]) == (2, 3, 2)
+
+    locked.locked.clear()
+    assert writer.flush(wait=True, timeout=5)
+    assert stored(db) == 3
+
+
+def test_a_full_queue_blocks_under_the_block_policy(make_writer, db, locked):
+    writer = make_writer(insert=locked, flush_size=1, queue_size=1, policy="block")
+    writer.add(row(checked_at=1777636800000))
+    wait_for(lambda: locked.attempts)
+    writer.add(row(checked_at=1777636800001))
+    blocked = threading.Thread(target=writer.add, args=(row(checked_at=1777636800002),))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+
+    locked.locked.clear()
+    blocked.join(5)
+    assert writer.flush(wait=True, timeout=5)
+    stats = writer.stats()
+    assert stored(db) == 3 and stats["blocked"] == 1 and stats["blocked_ms"] >= 150
+
+
+def test_close_writes_out_the_queue(make_writer, db):
+    writer = make_writer(flush_interval=3600)
+    for i in range(3):
+        writer.add(row(checked_at=1777636800000 + i))
+    assert writer.close(timeout=5)
+    assert stored(db) == 3 and not writer._thread.is_alive()
+    assert writer.close()  # Closing again is harmless
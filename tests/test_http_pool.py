@@ -0,0 +1,100 @@
+"""Pooled keep-alive sessions for the website checks."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from urllib3.exceptions import EmptyPoolError
+
+import http_pool
+from conftest import serve_keep_alive, wait_for
+from http_pool import PooledAdapter
+
+
+class Site:
+    """A keep-alive site that counts requests, remembers which client port each
+    came from and holds them while `hold` is clear"""
+
+    def __init__(self):
+        self.requests = 0
+        self.ports = []
+        self.hold = threading.Event()
+        self.hold.set()
+
+    def __call__(self, handler):
+        self.requests += 1
+        self.ports.append(handler.client_address[1])
+        self.hold.wait(5)
+        handler.send_response(200)
+        handler.send_header("Content-Length", "2")
+        handler.send_header("Set-Cookie", "visited=1; Path=/")
+        handler.end_headers()
+        handler.wfile.write(b"ok")
+
+
+@pytest.fixture
+def site():
+    app = Site()
+    server, url = serve_keep_alive(app)
+    app.url = url + "/"
+    yield app
+    app.hold.set()
+    server.shutdown()
+    server.server_close()
+
+
+def session_for(adapter):
+    session = requests.Session()
+    session.mount("http://", adapter)
+    return session
+
+
+def test_a_full_host_pool_fails_after_the_pool_timeout(site, monkeypatch):
+    monkeypatch.setattr(http_pool, "HTTP_POOL_TIMEOUT", 0.2)
+    adapter = PooledAdapter(pool_connections=1, pool_maxsize=1, pool_block=True)
+    site.hold.clear()
+    first = ThreadPoolExecutor(max_workers=1).submit(session_for(adapter).get, site.url, timeout=5)
+    wait_for(lambda: site.requests == 1)
+
+    start = time.monotonic()
+    with pytest.raises(EmptyPoolError):
+        session_for(adapter).get(site.url, timeout=5)
+    assert time.monotonic() - start < 2
+    site.hold.set()
+    assert first.result(5).status_code == 200
+    assert session_for(adapter).get(site.url, timeout=5).status_code == 200  # The connection went back
+
+
+def test_requests_from_different_sessions_reuse_one_connection(site):
+    adapter = PooledAdapter(pool_connections=1, pool_maxsize=1, pool_block=True)
+    for _ in range(3):
+        assert session_for(adapter).get(site.url, timeout=5).status_code == 200
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(lambda: session_for(adapter).get(site.url, timeout=5)).result()
+    assert len(site.ports) == 4 and len(set(site.ports)) == 1
+
+
+def test_idle_connections_are_evicted(site, monkeypatch):
+    adapter = PooledAdapter(pool_connections=1, pool_maxsize=1, pool_block=True)
+    session_for(adapter).get(site.url, timeout=5)
+    (pool,) = [adapter.poolmanager.pools.get(key) for key in adapter.poolmanager.pools.keys()]
+    assert pool.evict_idle(time.monotonic()) == 0
+
+    monkeypatch.setattr(http_pool, "HTTP_POOL_IDLE_TIMEOUT", 0)
+    time.sleep(0.01)
+    assert pool.evict_idle(time.monotonic()) == 1
+    session_for(adapter).get(site.url, timeout=5)
+    assert site.ports[0] != site.ports[1]  # The evicted connection was not reused
+
+
+def test_each_thread_has_its_own_stateless_session_on_the_shared_adapter(site):
+    session = http_pool.get_session()
+    assert http_pool.get_session() is session
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        other = executor.submit(http_pool.get_session).result()
+    assert other is not session
+    assert other.get_adapter("http://") is session.get_adapter("https://") is http_pool.get_adapter()
+
+    session.get(site.url, timeout=5)
+    assert not session.cookies  # Cookies are never sent back to the next check
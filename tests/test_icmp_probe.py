@@ -0,0 +1,77 @@
+"""Batched ICMP echoes: packet checksums, outcome summaries, status mapping and loopback pings."""
+import socket
+import struct
+
+import pytest
+
+import icmp_probe
+from icmp_probe import ICMPPinger, ICMPProbeExecutor, _outcome, checksum
+from probe_common import icmp_status
+
+
+@pytest.fixture(scope="module")
+def pinger():
+    try:
+        return ICMPPinger()
+    except OSError as e:
+        pytest.skip(f"no ICMP socket here: {e}")
+
+
+def test_checksum_matches_rfc_1071():
+    data = bytes.fromhex("0001f203f4f5f6f7")
+    assert checksum(data) == 0x220D
+    packet = data + struct.pack("!H", checksum(data))
+    assert checksum(packet) == 0  # A packet carrying its checksum sums to zero
+    assert checksum(b"\x01") == checksum(b"\x01\x00")  # Odd lengths are padded
+
+
+def test_outcome_summarizes_round_trips():
+    assert _outcome(5, [10.0, 20.0, 15.0]) == {
+        "sent": 5, "received": 3, "packet_loss": 40.0, "rtt_min": 10.0, "rtt_avg": 15.0, "rtt_max": 20.0,
+        "jitter": 7.5, "error": None,
+    }
+    assert _outcome(3, [])["rtt_avg"] is None and _outcome(3, [4.0])["jitter"] is None
+
+
+@pytest.mark.parametrize("rtts, expected", [
+    ([1.0] * 5, "operational"),
+    ([1.0] * 4, "degraded"),  # 20% loss
+    ([2500.0] * 5, "degraded"),
+    ([], "down"),
+])
+def test_icmp_status_from_loss_and_latency(rtts, expected):
+    status = icmp_status({"name": "local"}, _outcome(5, rtts))
+    assert status["status"] == expected
+    assert status["response_time"] == status["rtt_avg"] and status["checked_at_ms"]
+
+
+def test_loopback_echoes_are_all_answered(pinger):
+    futures = [pinger.submit(f"127.0.0.{i}", count=3, interval=0.01, timeout=1) for i in range(1, 6)]
+    outcomes = [future.result(5) for future in futures]
+    assert [(o["sent"], o["received"], o["packet_loss"]) for o in outcomes] == [(3, 3, 0.0)] * 5
+    assert all(o["rtt_min"] <= o["rtt_avg"] <= o["rtt_max"] for o in outcomes)
+
+
+def test_late_and_unresolvable_hosts(pinger, monkeypatch):
+    # The deadline passes as the echo goes out, so its reply comes too late to count
+    late = pinger.submit("127.0.0.1", count=1, timeout=0).result(5)
+    assert (late["received"], late["packet_loss"]) == (0, 100.0)
+    assert pinger.submit("127.0.0.1", count=1, timeout=1).result(5)["received"] == 1  # Not left outstanding
+
+    def no_such_host(hostname):
+        raise socket.gaierror(socket.EAI_NONAME, hostname)
+
+    monkeypatch.setattr(icmp_probe.dns_cache, "resolve", no_such_host)
+    assert pinger.submit("missing.invalid").result(1)["error"] == "dns"
+
+
+def test_the_executor_fills_in_status_dicts(pinger):
+    def target(endpoint):
+        return endpoint["ip"], {"name": endpoint["name"], "ip": endpoint["ip"]}
+
+    def check(endpoint):
+        pass
+
+    with ICMPProbeExecutor(pinger, {check: target}, icmp_status) as executor:
+        future = executor.submit(check, {"name": "loopback", "ip": "127.0.0.1"})
+    assert future.result()["status"] == "operational" and future.result()["name"] == "loopback"
@@ -0,0 +1,72 @@
+"""The history read paths are served by the checks indexes, not table scans or sorts."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import seed
+from history_store import CHECKS_INDEXES, history_page, uptime_counts
+
+START = datetime(2026, 5, 1, 12, 0)
+HOUR = (START + timedelta(hours=1), START + timedelta(hours=2))
+
+
+@pytest.fixture
+def history(db):
+    for site in range(5):
+        seed(db, *[(START + timedelta(minutes=i), "down" if i % 20 == 0 else "operational", 10) for i in range(200)],
+             name=f"site{site}")
+    return db
+
+
+def plans(conn, query):
+    """EXPLAIN QUERY PLAN details of every SELECT query() runs, one list per statement"""
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        query()
+    finally:
+        conn.set_trace_callback(None)
+    return [[row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+
+
+def uses(conn, query, index):
+    """The plan of query's main statement, after checking it reads checks through index without a full sort"""
+    plan = plans(conn, query)[0]
+    assert any(step.startswith("S") and " c USING " in step and f"INDEX {index}" in step for step in plan), plan
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
+    return plan
+
+
+def test_migrate_creates_every_index(history):
+    names = {row[0] for row in history.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert set(CHECKS_INDEXES) <= names
+
+
+def test_one_target_pages_seek_by_target(history):
+    uses(history, lambda: history_page(history, 50, "site1", kind="websites"), "checks_target_time")
+    ranged = uses(history, lambda: history_page(history, 50, "site1", start=HOUR[0], end=HOUR[1], kind="websites"),
+                  "checks_target_time")
+    assert any("target_id=? AND checked_at>? AND checked_at<?" in step for step in ranged)
+
+
+def test_every_target_pages_walk_the_time_index(history):
+    uses(history, lambda: history_page(history, 50), "checks_time")
+    uses(history, lambda: history_page(history, 50, kind="websites"), "checks_time")
+    ranged = uses(history, lambda: history_page(history, 50, start=HOUR[0], end=HOUR[1]), "checks_time")
+    assert any("checked_at>? AND checked_at<?" in step for step in ranged)
+    deep = uses(history, lambda: history_page(history, 50, cursor=f"{int(HOUR[1].timestamp() * 1000)}:0"),
+                "checks_time")
+    assert any("checked_at<?" in step for step in deep)
+
+
+def test_problem_status_filters_use_the_partial_index(history):
+    uses(history, lambda: history_page(history, 50, statuses=["down"]), "checks_problem_time")
+    uses(history, lambda: history_page(history, 50, statuses=["down", "degraded"], kind="websites"),
+         "checks_problem_time")
+
+
+def test_uptime_counts_are_answered_from_the_index_alone(history):
+    for window in ((None, None), HOUR):
+        plan = plans(history, lambda: uptime_counts(history, "site1", *window, kind="websites"))[0]
+        assert any("USING COVERING INDEX checks_target_time" in step for step in plan), plan
@@ -0,0 +1,103 @@
+"""Upgrading older databases from the original history table, and check timestamps."""
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+
+from conftest import ROOT, seed
+from history_store import (
+    HISTORY_FIELDS, LegacyHistoryMigration, PHASE_COLUMNS, connect, history_page, migrate, rollup_uptime,
+)
+
+LEGACY_SCHEMA = """
+    CREATE TABLE history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        url TEXT,
+        status TEXT,
+        status_code TEXT,
+        response_time INTEGER,
+        checked_at TEXT
+    )
+"""
+
+
+def legacy_database(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO history (name, url, status, status_code, response_time, checked_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def moved(path):
+    """Migrate and move the whole history table the way app.py does at startup"""
+    conn = connect(path)
+    migrate(conn)
+    migration = LegacyHistoryMigration(lambda: connect(path), batch=2, pause=0)
+    migration.run()
+    return conn, migration
+
+
+def test_history_moves_to_checks_with_the_same_api_output(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    rows = [
+        ("site", "http://site.test/", "operational", "200", 120, "2026-03-01 10:00:00"),
+        ("site", "http://site.test/", "down", "Timeout", None, "2026-03-01 10:05:00"),
+        ("other", "http://other.test/", "degraded", "503", 900, "2026-03-01 10:05:00"),  # Same second
+        ("site", "http://site.test/", "operational", "None", 80, "2026-03-01 10:10:00"),
+        (None, None, "down", "Error", None, "2026-03-01 10:11:00"),
+    ]
+    legacy_database(path, rows)
+    conn, migration = moved(path)
+
+    assert migration.stats() == {"state": "done", "moved": 4, "remaining": 0}
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'history'").fetchone() is None
+    assert conn.execute("SELECT id FROM checks ORDER BY id").fetchall() == [(1,), (2,), (3,), (4,)]
+    history, _ = history_page(conn, 10)
+    expected = [
+        {"kind": "websites", "name": name, "url": url, "status": status, "status_code": code, "response_time": response_time,
+         "checked_at": checked_at, **dict.fromkeys(PHASE_COLUMNS)}
+        for name, url, status, code, response_time, checked_at in reversed(rows[:4])
+    ]
+    assert history == expected
+    assert rollup_uptime(conn, "site")["total_checks"] == 3
+
+    seed(conn, (datetime.now(), "operational", 10))  # New checks land after every moved one
+    assert conn.execute("SELECT MAX(id) FROM checks").fetchone() == (5,)
+    conn.close()
+
+
+def test_the_committed_database_migrates(tmp_path):
+    path = str(tmp_path / "status_history.db")
+    shutil.copy(os.path.join(ROOT, "status_history.db"), path)
+    source = sqlite3.connect(path)
+    before = source.execute(f"SELECT {', '.join(HISTORY_FIELDS[1:7])} FROM history ORDER BY id DESC").fetchall()
+    source.close()
+
+    conn, migration = moved(path)
+    assert migration.state == "done"
+    after = [(c["name"], c["url"], c["status"], c["status_code"], c["response_time"], c["checked_at"])
+             for c in history_page(conn, len(before) + 1)[0]]
+    assert after == before
+    for name in {row[0] for row in before}:
+        assert rollup_uptime(conn, name)["total_checks"] == sum(row[0] == name for row in before)
+    conn.close()
+
+
+def test_results_are_stored_at_their_completion_time(app_module):
+    completed = int(datetime(2026, 5, 1, 12, 0, 7).timestamp() * 1000)
+    app_module.store_status("websites", {"name": "site", "url": "http://site.test/", "status": "operational",
+                                         "status_code": 200, "response_time": 42, "checked_at_ms": completed,
+                                         "last_checked": "2026-05-01 12:00:09"})
+    # A result with only the display time is stored at that local time
+    app_module.store_status("websites", {"name": "display-only", "url": "http://other.test/", "status": "down",
+                                         "status_code": "Timeout", "response_time": None,
+                                         "last_checked": "2026-05-01 12:00:09"})
+    assert app_module.history_writer.flush(wait=True, timeout=5)
+    conn = connect(app_module.DB_PATH)
+    stored = conn.execute("SELECT t.name, c.checked_at FROM checks c JOIN targets t ON t.id = c.target_id").fetchall()
+    assert sorted(stored) == [("display-only", int(datetime(2026, 5, 1, 12, 0, 9).timestamp() * 1000)),
+                              ("site", completed)]
+    conn.close()
@@ -0,0 +1,75 @@
+"""Per-phase latency: DNS, TCP connect, TLS, time to first byte and transfer."""
+import socket
+
+import pytest
+
+from conftest import serve_keep_alive
+from history_store import connect, history_page
+
+
+def respond(handler):
+    if handler.path == "/moved":
+        handler.send_response(302)
+        handler.send_header("Location", "/")
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+        return
+    handler.send_response(200)
+    handler.send_header("Content-Length", "2")
+    handler.end_headers()
+    handler.wfile.write(b"ok")
+
+
+@pytest.fixture
+def site_url():
+    server, url = serve_keep_alive(respond)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def check(app_module, url):
+    return app_module.check_website_status({"name": "local", "url": url, "icon": "🧪"})
+
+
+def test_a_fresh_connection_reports_its_setup_and_a_reused_one_does_not(app_module, site_url):
+    fresh = check(app_module, site_url + "/")
+    assert fresh["connection_reused"] is False
+    assert fresh["dns_time"] >= 0 and fresh["connect_time"] >= 0 and fresh["tls_time"] >= 0
+    assert fresh["ttfb"] >= 0 and fresh["download_time"] >= 0
+
+    reused = check(app_module, site_url + "/")
+    assert reused["connection_reused"] is True
+    assert (reused["dns_time"], reused["connect_time"], reused["tls_time"]) == (None, None, None)
+    assert reused["ttfb"] <= reused["response_time"]
+
+
+def test_a_redirect_over_a_fresh_connection_is_not_reused(app_module, site_url):
+    status = check(app_module, site_url + "/moved")
+    assert status["redirects"] == 1 and status["status_code"] == 200
+    # The second hop rode the first hop's connection, but the check as a whole opened one
+    assert status["connection_reused"] is False and status["connect_time"] is not None
+
+
+def test_tcp_checks_split_dns_from_the_connect(app_module):
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        port = listener.getsockname()[1]
+        status = app_module.check_tcp_port("localhost", {"name": "local"}, port=port)
+    assert status["status"] == "operational"
+    assert status["dns_time"] >= 0 and status["connect_time"] >= 0
+    assert status["dns_time"] + status["connect_time"] <= status["response_time"] + 1
+
+
+def test_phases_are_kept_in_history(app_module):
+    app_module.store_status("websites", {"name": "local", "url": "http://local.test/", "status": "operational",
+                                         "status_code": 200, "response_time": 40, "checked_at_ms": 1777636800000,
+                                         "dns_time": 1, "connect_time": 2, "tls_time": None, "ttfb": 30,
+                                         "download_time": 7})
+    assert app_module.history_writer.flush(wait=True, timeout=5)
+    conn = connect(app_module.DB_PATH)
+    (entry,) = history_page(conn, 10, "local")[0]
+    conn.close()
+    assert {phase: entry[phase] for phase in ("dns_time", "connect_time", "tls_time", "ttfb", "download_time")} == {
+        "dns_time": 1, "connect_time": 2, "tls_time": None, "ttfb": 30, "download_time": 7}
@@ -0,0 +1,202 @@
+"""Sweeps, shared workers and single-flight force refreshes in the probe pipeline."""
+import threading
+import time
+
+from conftest import fake_kind, wait_for
+
+
+class GatedCheck:
+    """A check that counts its calls and holds them until the gate opens"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, target):
+        with self._lock:
+            self.calls.append(target["name"])
+        self.gate.wait(5)
+        return {"name": target["name"], "url": target["url"], "status": "operational", "response_time": 5}
+
+
+def refresh_in_threads(pipeline, count, **options):
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.append(pipeline.refresh("websites", **options)))
+               for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_a_sweep_publishes_every_result_and_writes_history(pipeline):
+    kind = fake_kind(pipeline, count=5)
+    sweep = pipeline.run("websites")
+    assert sorted(kind.results) == [f"k{i}" for i in range(5)]
+    assert kind.results["k3"]["group"] == 1  # Extra fields are added to the result
+    assert len(pipeline.stored) == 5
+    assert sweep.finished is not None and not pipeline.is_running("websites")
+
+
+def test_concurrent_refreshes_share_one_sweep(pipeline):
+    check = GatedCheck()
+    fake_kind(pipeline, count=4, check=check)
+    # A refresh that comes in after the sweep finished reuses it instead of joining
+    threads, outcomes = refresh_in_threads(pipeline, 8, max_age=60)
+    wait_for(lambda: len(check.calls) == 4)
+    time.sleep(0.05)
+    check.gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(check.calls) == 4
+    assert [outcome for _, outcome in outcomes].count("started") == 1
+    assert len(outcomes) == 8 and len({id(sweep) for sweep, _ in outcomes}) == 1
+
+
+def test_a_recent_sweep_is_reused_within_max_age(pipeline):
+    check = GatedCheck()
+    check.gate.set()
+    fake_kind(pipeline, count=3, check=check)
+    first, outcome = pipeline.refresh("websites")
+    assert outcome == "started"
+    assert pipeline.refresh("websites", max_age=60) == (first, "reused")
+    assert pipeline.refresh("websites", max_age=0)[1] == "started"
+    assert len(check.calls) == 6
+
+
+def test_scoped_refresh_probes_and_replaces_only_its_targets(pipeline):
+    check = GatedCheck()
+    check.gate.set()
+    kind = fake_kind(pipeline, count=6, check=check)
+    pipeline.run("websites")
+    before = dict(kind.results)
+    check.calls.clear()
+
+    sweep, outcome = pipeline.refresh("websites", scope=(("group", 1),))
+    assert outcome == "started"
+    assert sorted(check.calls) == ["site1", "site3", "site5"]
+    assert sorted(kind.results) == sorted(before)  # The other targets keep their results
+    assert all(kind.results[key] is before[key] for key in ("k0", "k2", "k4"))
+    assert all(kind.results[key] is not before[key] for key in ("k1", "k3", "k5"))
+    assert pipeline.refresh("websites", scope=(("name", "SITE2"),))[0].results.keys() == {"k2"}
+
+
+def test_scoped_refresh_joins_a_whole_catalog_sweep(pipeline):
+    check = GatedCheck()
+    fake_kind(pipeline, count=4, check=check)
+    threads, outcomes = refresh_in_threads(pipeline, 1)
+    wait_for(lambda: len(check.calls) == 4)
+    scoped = []
+    thread = threading.Thread(target=lambda: scoped.append(pipeline.refresh("websites", scope=(("group", 0),))))
+    thread.start()
+    time.sleep(0.05)
+    check.gate.set()
+    for waiting in threads + [thread]:
+        waiting.join(5)
+
+    assert len(check.calls) == 4
+    assert scoped[0] == (outcomes[0][0], "joined")
+    # ...and once it finished, the whole-catalog sweep is reused for any scope
+    assert pipeline.refresh("websites", max_age=60, scope=(("group", 1),))[1] == "reused"
+
+
+def test_old_scoped_sweeps_are_evicted(pipeline):
+    fake_kind(pipeline, count=4)
+    for i in range(4):
+        pipeline.refresh("websites", max_age=60, scope=(("name", f"site{i}"),))
+    assert len(pipeline._last_sweep) == 4
+    time.sleep(0.05)
+    pipeline.refresh("websites", max_age=60, scope=(("name", "site0"),))  # Still young enough to be kept
+    assert len(pipeline._last_sweep) == 4
+    pipeline.refresh("websites", max_age=0.01)
+    assert list(pipeline._last_sweep) == [("websites", None)]
+
+
+def test_unknown_website_is_404_without_probing(app_module, monkeypatch):
+    def refresh(*args, **kwargs):
+        raise AssertionError("probed an unknown website")
+
+    monkeypatch.setattr(app_module.pipeline, "refresh", refresh)
+    response = app_module.app.test_client().get("/api/status/no-such-site", query_string={"force": "1"})
+    assert response.status_code == 404
+
+
+class CountingCheck:
+    """A check that records the threads it ran on and the most probes in flight at once"""
+
+    def __init__(self, delay=0.02, fail=()):
+        self.delay = delay
+        self.fail = fail
+        self.threads = set()
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, target):
+        with self._lock:
+            self.threads.add(threading.get_ident())
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        if target["name"] in self.fail:
+            raise RuntimeError("probe crashed")
+        return {"name": target["name"], "url": target["url"], "status": "operational", "response_time": 5}
+
+
+def test_sweeps_of_every_kind_share_the_budget_and_the_workers(pipeline):
+    pipeline.budget = threading.BoundedSemaphore(3)
+    check = CountingCheck()
+    fake_kind(pipeline, "websites", count=6, check=check)
+    fake_kind(pipeline, "ec2", count=6, check=check)
+    threads = [threading.Thread(target=pipeline.run, args=(name,)) for name in ("websites", "ec2")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert check.most_in_flight == 3
+    pipeline.run("websites")
+    assert len(check.threads) <= 8  # The same long-lived workers for every sweep and kind
+
+
+def test_a_crashed_probe_drops_only_its_target(pipeline):
+    kind = fake_kind(pipeline, count=3, check=CountingCheck(delay=0, fail=("site1",)))
+    pipeline.run("websites")
+    assert sorted(kind.results) == ["k0", "k2"] and len(pipeline.stored) == 2
+    assert pipeline.budget.acquire(blocking=False)  # Every slot came back
+    pipeline.budget.release()
+
+
+def test_a_whole_sweep_replaces_the_live_map_in_place(pipeline):
+    kind = fake_kind(pipeline, count=2)
+    live = kind.results
+    live["gone"] = {"name": "removed from the catalog", "status": "down"}
+    pipeline.run("websites")
+    assert kind.results is live and sorted(live) == ["k0", "k1"]
+
+
+def test_sweep_hooks_and_history_opt_out(pipeline):
+    calls = []
+    fake_kind(pipeline, "ec2", count=2, history=False,
+              hostname=lambda target: "127.0.0.1",
+              before_sweep=lambda: calls.append("before"),
+              after_sweep=lambda results: calls.append(sorted(results)))
+    pipeline.run("ec2")
+    assert calls == ["before", ["k0", "k1"]]
+    assert pipeline.stored == []
+
+
+def test_forwarded_results_skip_history(pipeline):
+    forwarded = []
+    pipeline.forward = lambda name, results: forwarded.append((name, sorted(results)))
+    kind = fake_kind(pipeline, count=2)
+    pipeline.run("websites")
+    done = threading.Event()
+    pipeline.probe("websites", "k0", {"name": "site0", "url": "http://site0.test/"}, {},
+                   on_done=lambda status: done.set())
+    assert done.wait(5)
+    wait_for(lambda: len(forwarded) == 2)
+    assert forwarded == [("websites", ["k0", "k1"]), ("websites", ["k0"])]
+    assert sorted(kind.results) == ["k0", "k1"] and pipeline.stored == []
@@ -0,0 +1,54 @@
+"""Header-only and bounded website probes."""
+import time
+
+import pytest
+
+from conftest import serve
+from probe_common import probe_plan
+
+
+def slow_body_site(environ, start_response):
+    """Sends its headers and 64 KB at once, then the rest of the body two seconds later"""
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    if environ["REQUEST_METHOD"] == "HEAD":
+        return [b""]
+    return slow_body()
+
+
+def slow_body():
+    yield b"x" * 65536
+    time.sleep(2)
+    yield b"x"
+
+
+@pytest.fixture(scope="module")
+def site_url():
+    server, url = serve(slow_body_site)
+    yield url + "/"
+    server.shutdown()
+
+
+def check(app_module, url, **site):
+    return app_module.check_website_status({"name": "local", "url": url, "icon": "🧪", **site})
+
+
+@pytest.mark.parametrize("options", [{"probe_mode": "headers"}, {"probe_mode": "bounded"}, {"method": "HEAD"}])
+def test_partial_probes_return_before_the_body_finishes(app_module, site_url, options):
+    start = time.monotonic()
+    status = check(app_module, site_url, **options)
+    assert time.monotonic() - start < 1.5
+    assert (status["status"], status["status_code"]) == ("operational", 200)
+    assert status["probe_mode"] == options.get("probe_mode", "full")
+
+
+def test_a_full_probe_downloads_the_whole_body(app_module, site_url):
+    status = check(app_module, site_url, probe_mode="full")
+    assert status["response_time"] >= 2000 and status["download_time"] >= 1900
+
+
+def test_probe_plan_honours_per_site_settings(monkeypatch):
+    assert probe_plan({}) == ("GET", "full")
+    assert probe_plan({"method": "head", "probe_mode": "headers"}) == ("HEAD", "headers")
+    assert probe_plan({"probe_mode": "sideways"}) == ("GET", "full")
+    monkeypatch.setattr("probe_common.HTTP_PROBE_MODE", "bounded")
+    assert probe_plan({}) == ("GET", "bounded")
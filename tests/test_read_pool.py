@@ -0,0 +1,97 @@
+"""WAL mode and the pool of read-only connections."""
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from conftest import seed
+from history_store import ReadPool, connect
+
+
+@pytest.fixture
+def pool(db, tmp_path):
+    return ReadPool(lambda: str(tmp_path / "history.db"), size=2)
+
+
+def count(conn):
+    return conn.execute("SELECT COUNT(*) FROM checks").fetchone()[0]
+
+
+def test_the_writer_connection_switches_to_wal(db):
+    assert db.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert db.execute("PRAGMA synchronous").fetchone() == (1,)  # NORMAL
+
+
+def test_readers_are_not_blocked_by_an_open_write(db, pool):
+    seed(db, (datetime(2026, 5, 1, 12), "operational", 10))
+    db.execute("BEGIN IMMEDIATE")
+    db.execute("INSERT INTO checks (target_id, checked_at, status) SELECT target_id, checked_at + 1, status FROM checks")
+    start = time.monotonic()
+    with pool.connection() as conn:
+        assert count(conn) == 1  # The committed state, without waiting on the writer
+    assert time.monotonic() - start < 1
+    db.commit()
+    with pool.connection() as conn:
+        assert count(conn) == 2
+
+
+def test_connections_are_reused_up_to_the_pool_size(pool):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as again:
+        assert again is first
+    assert (pool.stats()["opened"], pool.stats()["reused"]) == (1, 1)
+
+    held = threading.Barrier(4)  # Three borrowers and this thread
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.wait(5)
+            release.wait(5)
+
+    threads = [threading.Thread(target=hold) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    held.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    stats = pool.stats()
+    assert stats["opened"] == 3 and stats["idle"] == 2  # The third was closed, not kept
+
+
+def test_pooled_connections_are_read_only_and_returned_clean(pool):
+    with pool.connection() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM checks")
+        assert conn.in_transaction
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+
+
+def test_a_moved_database_gets_new_connections(db, tmp_path):
+    paths = [str(tmp_path / "history.db")]
+    pool = ReadPool(lambda: paths[0])
+    with pool.connection() as old:
+        pass
+    other = connect(str(tmp_path / "other.db"))
+    other.execute("CREATE TABLE checks (id INTEGER)")
+    other.close()
+    paths[0] = str(tmp_path / "other.db")
+    with pool.connection() as conn:
+        assert conn is not old and count(conn) == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        old.execute("SELECT 1")  # Closed when it was passed over
+
+
+def test_history_routes_borrow_from_the_pool(app_module):
+    client = app_module.app.test_client()
+    before = app_module.read_pool.stats()
+    for _ in range(3):
+        assert client.get("/api/history").status_code == 200
+    after = app_module.read_pool.stats()
+    assert after["opened"] + after["reused"] - before["opened"] - before["reused"] == 3
+    assert after["opened"] - before["opened"] <= 1
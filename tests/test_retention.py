@@ -0,0 +1,30 @@
+"""Raw history retention is opt-in, and warns the first time it deletes checks."""
+from datetime import datetime, timedelta
+
+import retention
+from conftest import seed
+from history_store import connect, history_page
+from retention import RetentionWorker
+
+
+def test_raw_checks_are_kept_by_default(db, tmp_path, capsys):
+    seed(db, (datetime.now() - timedelta(days=400), "operational", 10))
+    summary = RetentionWorker(lambda: connect(str(tmp_path / "history.db"))).run_once()
+    assert retention.HISTORY_RETENTION_DAYS == 0
+    assert summary["raw_deleted"] == 0
+    assert len(history_page(db, 10)[0]) == 1
+    assert "⚠️" not in capsys.readouterr().out
+
+
+def test_opted_in_retention_warns_once(db, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(retention, "HISTORY_RETENTION_DAYS", 30)
+    now = datetime.now()
+    seed(db, (now - timedelta(days=40), "down", None), (now - timedelta(days=1), "operational", 10))
+    worker = RetentionWorker(lambda: connect(str(tmp_path / "history.db")))
+    assert worker.run_once()["raw_deleted"] == 1
+    assert "HISTORY_RETENTION_DAYS=30" in capsys.readouterr().out
+
+    seed(db, (now - timedelta(days=50), "down", None))
+    assert worker.run_once()["raw_deleted"] == 1
+    assert "⚠️" not in capsys.readouterr().out
+    assert [check["status"] for check in history_page(db, 10)[0]] == ["operational"]
@@ -0,0 +1,120 @@
+"""Per-target slots: spreading, drift-free advancing and adaptive intervals."""
+import threading
+
+import pytest
+
+import scheduler
+from conftest import fake_kind, wait_for
+from scheduler import TargetScheduler
+
+
+def result(state="operational", response_time=50):
+    return {"name": "site0", "status": state, "response_time": response_time}
+
+
+@pytest.fixture
+def schedule(pipeline):
+    fake_kind(pipeline, count=10, interval=100)
+    fake_kind(pipeline, name="ec2", count=4, interval=60)
+    target_scheduler = TargetScheduler(pipeline, jitter=0)
+    target_scheduler.load(now=1000)
+    return target_scheduler
+
+
+def test_each_kind_is_spread_evenly_over_its_interval(schedule):
+    assert [schedule.entries[("websites", f"k{i}")].due for i in range(10)] == [1000 + 10 * i for i in range(10)]
+    assert [schedule.entries[("ec2", f"k{i}")].due for i in range(4)] == [1000, 1015, 1030, 1045]
+
+
+def test_jitter_stays_within_its_fraction_of_the_interval(pipeline):
+    fake_kind(pipeline, count=50, interval=100)
+    jittered = TargetScheduler(pipeline, jitter=0.05)
+    jittered.load(now=0)
+    offsets = [entry.due - entry.anchor for entry in jittered.entries.values()]
+    assert all(-5 <= offset <= 5 for offset in offsets)
+    assert len(set(offsets)) > 1
+
+
+def test_slots_follow_the_previous_slot_not_the_probe(schedule):
+    entry = schedule.entries[("websites", "k0")]
+    schedule._advance(entry, 1003)
+    assert (entry.anchor, entry.fired, entry.lateness) == (1100, 1000, 3)
+    # After a stall the missed slots are skipped instead of fired back to back
+    schedule._advance(entry, 1350)
+    assert entry.anchor == 1400
+
+
+def test_a_slot_is_skipped_while_the_last_probe_runs(schedule, monkeypatch):
+    probes = []
+    monkeypatch.setattr(schedule.pipeline, "probe", lambda *args, **kwargs: probes.append(args))
+    entry = schedule.entries[("websites", "k0")]
+    schedule._dispatch(entry)
+    schedule._dispatch(entry)
+    assert (len(probes), entry.probes, entry.skipped) == (1, 1, 1)
+    schedule._finished(entry, result())
+    schedule._dispatch(entry)
+    assert len(probes) == 2
+
+
+def test_targets_are_probed_on_their_own_slots(pipeline):
+    fake_kind(pipeline, count=4, interval=0.2)
+    target_scheduler = TargetScheduler(pipeline, jitter=0)
+    threading.Thread(target=target_scheduler.run_forever, daemon=True).start()
+    wait_for(lambda: target_scheduler.entries and all(e.probes >= 3 for e in target_scheduler.entries.values()))
+    stats = target_scheduler.stats()["websites"]
+    assert stats["targets"] == 4 and stats["skipped"] == 0
+    with target_scheduler._wakeup:
+        target_scheduler._heap.clear()  # Leaves the daemon thread waiting for nothing
+
+
+@pytest.fixture
+def adaptive(schedule):
+    schedule.adaptive = True
+    return schedule
+
+
+def test_stable_healthy_targets_back_off_up_to_the_maximum(adaptive, monkeypatch):
+    monkeypatch.setattr(scheduler, "ADAPTIVE_MAX_INTERVAL", 400)
+    entry = adaptive.entries[("websites", "k0")]
+    intervals = []
+    for _ in range(5):
+        adaptive._finished(entry, result())
+        intervals.append(entry.interval)
+    assert intervals == [150, 225, 337.5, 400, 400]
+
+
+def test_unhealthy_targets_do_not_back_off_past_their_interval(adaptive):
+    entry = adaptive.entries[("websites", "k0")]
+    for _ in range(3):
+        adaptive._finished(entry, result("down", None))
+    assert entry.interval == 100
+
+
+def test_a_state_change_re_probes_quickly(adaptive):
+    entry = adaptive.entries[("websites", "k0")]
+    adaptive._finished(entry, result())
+    adaptive._finished(entry, result())
+    adaptive._finished(entry, result("down", None))
+    assert (entry.interval, entry.changes) == (scheduler.ADAPTIVE_MIN_INTERVAL, 1)
+    assert entry.anchor >= entry.fired + entry.interval
+    intervals = []
+    for _ in range(6):  # Settling: backs off again, but not past the configured interval while down
+        adaptive._finished(entry, result("down", None))
+        intervals.append(round(entry.interval, 2))
+    assert intervals == [22.5, 33.75, 50.62, 75.94, 100, 100]
+
+
+def test_only_large_latency_jumps_count_as_changes(adaptive):
+    entry = adaptive.entries[("websites", "k0")]
+    adaptive._finished(entry, result(response_time=5))
+    adaptive._finished(entry, result(response_time=12))
+    assert entry.changes == 0
+    adaptive._finished(entry, result(response_time=400))
+    assert (entry.changes, entry.interval) == (1, scheduler.ADAPTIVE_MIN_INTERVAL)
+
+
+def test_fixed_mode_keeps_intervals(schedule):
+    entry = schedule.entries[("websites", "k0")]
+    for state in ("operational", "operational", "down"):
+        schedule._finished(entry, result(state))
+    assert (entry.interval, entry.changes) == (100, 1)
@@ -0,0 +1,90 @@
+"""Shard assignment, and shard worker processes supervised from a test pipeline."""
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import sharded
+from conftest import ROOT, fake_kind, serve, wait_for
+from sharded import ShardSupervisor, restrict_to_shard, shard_of
+
+# A shard worker, started the way sharded.py is, whose websites all point at a
+# local test site and that sweeps only the websites. argv: site url, then sharded.py's
+SHARD = """
+import runpy
+import sys
+
+import app
+
+site_url = sys.argv.pop(1)
+for name in [name for name in app.pipeline.kinds if name != "websites"]:
+    del app.pipeline.kinds[name]
+app.pipeline.kinds["websites"].interval = 0.5
+app.SCHEDULER_MODE = "sweep"
+for page in app.PAGES.values():
+    for website in page["websites"]:
+        website["url"] = site_url
+sys.argv[0] = "sharded.py"
+runpy.run_path("sharded.py", run_name="__main__")
+"""
+
+
+def site(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+def test_every_target_belongs_to_exactly_one_stable_shard(pipeline):
+    kind = fake_kind(pipeline, count=40)
+    all_targets = kind.targets
+    everything = [key for key, _, _ in all_targets()]
+    assert shard_of("websites", "k1", 4) == shard_of("websites", "k1", 4)
+    assert shard_of("websites", "k1", 1) == 0
+
+    slices = []
+    for shard in range(4):
+        restrict_to_shard(pipeline, shard, 4)
+        slices.append([key for key, _, _ in kind.targets()])
+        kind.targets = all_targets
+    assert sorted(key for keys in slices for key in keys) == sorted(everything)
+    assert all(slices)  # 40 keys spread over every shard
+
+
+def test_shard_processes_feed_the_live_map_and_are_restarted(pipeline, app_module, monkeypatch):
+    site_server, site_url = serve(site)
+    env = {**os.environ, "PROBE_HEDGING": "0"}
+
+    def popen(args, **kwargs):
+        # args is [python, sharded.py, --shard, N, --shards, M]
+        return subprocess.Popen([args[0], "-c", SHARD, site_url, *args[2:]], env=env, **{**kwargs, "cwd": ROOT})
+
+    monkeypatch.setattr(sharded, "subprocess", SimpleNamespace(Popen=popen, PIPE=subprocess.PIPE))
+    monkeypatch.setattr(sharded, "SHARD_RESTART_DELAY", 0.1)
+    kind = fake_kind(pipeline)
+    expected = {key for key, _, _ in app_module.website_targets()}
+    supervisor = ShardSupervisor(pipeline, 2)
+
+    def all_reported():
+        with kind.lock:
+            return set(kind.results) == expected and all(s["status_code"] == 200 for s in kind.results.values())
+
+    try:
+        supervisor.start()
+        wait_for(lambda: supervisor.stats()["alive"] == 2, timeout=10)
+        wait_for(all_reported, timeout=30)
+        assert len(pipeline.stored) >= len(expected)  # The web process writes the history
+
+        killed = supervisor.processes[0]
+        killed.kill()
+        wait_for(lambda: supervisor.processes[0] is not killed and supervisor.stats()["alive"] == 2, timeout=10)
+        with kind.lock:
+            kind.results.clear()
+        wait_for(all_reported, timeout=30)
+    finally:
+        monkeypatch.setattr(sharded, "SHARD_RESTART_DELAY", 3600)  # Park the supervisor threads
+        for process in supervisor.processes.values():
+            process.kill()
+            process.wait(10)
+        time.sleep(0.2)
+        site_server.shutdown()
@@ -0,0 +1,57 @@
+"""Targets are keyed by kind and name, so a website and an endpoint may share a name."""
+from datetime import datetime, timedelta
+
+from conftest import seed
+from history_store import connect, history_page, rollup_uptime, uptime_counts
+
+NOW = datetime.now().replace(microsecond=0)
+
+
+def shared_name(conn):
+    seed(conn, (NOW - timedelta(minutes=2), "operational", 100), (NOW - timedelta(minutes=1), "operational", 120),
+         name="Prod")
+    seed(conn, (NOW - timedelta(minutes=1), "down", None), name="Prod", kind="ec2")
+
+
+def test_same_name_in_two_kinds_is_two_targets(db):
+    shared_name(db)
+    targets = db.execute("SELECT kind, name, url FROM targets ORDER BY kind").fetchall()
+    assert targets == [("ec2", "Prod", "http://Prod.test/"), ("websites", "Prod", "http://Prod.test/")]
+    assert rollup_uptime(db, "Prod", kind="websites")["uptime_percentage"] == 100
+    assert rollup_uptime(db, "Prod", kind="ec2")["down_checks"] == 1
+    assert rollup_uptime(db, "Prod")["total_checks"] == 3  # A name alone matches every kind
+    assert uptime_counts(db, "Prod", kind="ec2") == (1, 0)
+    assert [c["status"] for c in history_page(db, 10, "Prod", kind="ec2")[0]] == ["down"]
+    assert {c["kind"] for c in history_page(db, 10)[0]} == {"websites", "ec2"}
+    assert len(history_page(db, 10, kind="websites")[0]) == 2
+
+
+def test_a_url_change_in_one_kind_leaves_the_other(db):
+    shared_name(db)
+    with db:
+        db.execute("UPDATE targets SET url = 'http://old.test/' WHERE kind = 'ec2'")
+    seed(db, (NOW, "operational", 90), name="Prod")
+    assert db.execute("SELECT url FROM targets WHERE kind = 'ec2'").fetchone() == ("http://old.test/",)
+
+
+def test_routes_filter_by_kind(app_module):
+    conn = connect(app_module.DB_PATH)
+    shared_name(conn)
+    conn.close()
+    client = app_module.app.test_client()
+    website = client.get("/api/history/Prod").get_json()
+    assert (website["kind"], website["count"]) == ("websites", 2)
+    assert client.get("/api/history/Prod", query_string={"kind": "ec2"}).get_json()["count"] == 1
+    assert client.get("/api/uptime/Prod", query_string={"kind": "ec2"}).get_json()["down_checks"] == 1
+    assert client.get("/api/uptime/Prod").get_json()["down_checks"] == 0
+    assert client.get("/api/history", query_string={"kind": "ec2"}).get_json()["count"] == 1
+    assert client.get("/api/history", query_string={"website": "Prod"}).get_json()["count"] == 2
+    for route in ("/api/history/Prod", "/api/uptime/Prod", "/api/history"):
+        assert client.get(route, query_string={"kind": "ec2_icmp"}).status_code == 400
+
+
+def test_store_status_queues_the_kind(app_module, monkeypatch):
+    stored = []
+    monkeypatch.setattr(app_module.history_writer, "add", stored.append)
+    app_module.store_status("azure", {"name": "Prod", "endpoint": "prod.example.net", "status": "operational"})
+    assert stored[0][:3] == ("azure", "Prod", "prod.example.net")
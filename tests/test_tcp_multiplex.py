@@ -0,0 +1,88 @@
+"""The selectors-based TCP prober against local sockets."""
+import socket
+import time
+
+import pytest
+
+import tcp_multiplex
+from tcp_multiplex import MultiplexProbeExecutor, TCPMultiplexer
+
+
+@pytest.fixture
+def open_port():
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        yield listener.getsockname()[1]
+
+
+@pytest.fixture
+def closed_port():
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        return unused.getsockname()[1]
+
+
+@pytest.fixture
+def black_hole():
+    """A port whose connects hang: its backlog of one is taken and nothing accepts"""
+    with socket.socket() as listener, socket.socket() as filler:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(0)
+        port = listener.getsockname()[1]
+        filler.connect(("127.0.0.1", port))
+        yield port
+
+
+@pytest.fixture
+def multiplexer():
+    return TCPMultiplexer(max_inflight=100)
+
+
+def test_connects_and_refusals(multiplexer, open_port, closed_port):
+    connected = multiplexer.submit("127.0.0.1", open_port, timeout=2).result(5)
+    assert connected["error"] is None and connected["connect_time"] >= 0
+    assert connected["response_time"] == connected["dns_time"] + connected["connect_time"]
+    assert multiplexer.submit("127.0.0.1", closed_port, timeout=2).result(5)["error"] == "refused"
+
+
+def test_a_connect_that_hangs_times_out_at_its_own_deadline(multiplexer, black_hole, open_port):
+    start = time.monotonic()
+    hung = multiplexer.submit("127.0.0.1", black_hole, timeout=0.3)
+    assert multiplexer.submit("127.0.0.1", open_port, timeout=2).result(1)["error"] is None
+    outcome = hung.result(5)
+    assert (outcome["error"], outcome["response_time"]) == ("timeout", 300)
+    assert 0.25 < time.monotonic() - start < 2
+
+
+def test_connects_past_the_in_flight_cap_wait_for_a_slot(black_hole):
+    capped = TCPMultiplexer(max_inflight=1)
+    start = time.monotonic()
+    futures = [capped.submit("127.0.0.1", black_hole, timeout=0.3) for _ in range(3)]
+    assert [future.result(5)["error"] for future in futures] == ["timeout"] * 3
+    assert time.monotonic() - start >= 0.85  # One after another
+
+
+def test_unresolvable_hosts_fail_before_the_loop(multiplexer, monkeypatch):
+    def no_such_host(hostname):
+        raise socket.gaierror(socket.EAI_NONAME, hostname)
+
+    monkeypatch.setattr(tcp_multiplex.dns_cache, "resolve", no_such_host)
+    assert multiplexer.submit("missing.invalid").result(1)["error"] == "dns"
+
+
+def test_the_executor_fills_in_status_dicts(multiplexer, open_port, closed_port):
+    def target(endpoint):
+        return "127.0.0.1", {"name": endpoint["name"], "ip": "127.0.0.1"}
+
+    def check(endpoint):
+        pass
+
+    with MultiplexProbeExecutor(multiplexer, {check: target}, port=open_port) as executor:
+        up = executor.submit(check, {"name": "up"})
+    assert up.result()["status"] == "operational" and up.result()["name"] == "up"
+
+    with MultiplexProbeExecutor(multiplexer, {check: target}, port=closed_port) as executor:
+        down = executor.submit(check, {"name": "down", "timeout": 1})
+    assert down.result()["status"] == "down"
+    assert down.result()["message"] == f"TCP connection failed (port {closed_port} blocked or service down)"
@@ -0,0 +1,74 @@
+"""Uptime summed from the rollups, and the from/to bounds of the history and uptime routes."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import seed
+from history_store import connect, rollup_uptime, uptime_counts
+
+NOW = datetime.now().replace(second=0, microsecond=0)
+
+
+def test_windows_match_the_raw_checks(db):
+    seed(db,
+         (NOW - timedelta(minutes=5), "operational", 100),
+         (NOW - timedelta(minutes=90), "down", None),
+         (NOW - timedelta(hours=26), "degraded", 300),
+         (NOW - timedelta(hours=40, minutes=7), "operational", 50))
+    for start, end in [(NOW - timedelta(hours=2), NOW),
+                       (NOW - timedelta(hours=30, minutes=13), NOW - timedelta(minutes=1)),
+                       (NOW - timedelta(hours=47), NOW + timedelta(minutes=1)),
+                       (NOW - timedelta(minutes=4), NOW)]:
+        uptime = rollup_uptime(db, "site", start, end)
+        assert (uptime["total_checks"], uptime["operational_checks"]) == uptime_counts(db, "site", start, end)
+
+
+def test_all_time_and_latency(db):
+    seed(db,
+         (NOW - timedelta(minutes=1), "operational", 100),
+         (NOW - timedelta(days=3), "degraded", 300),
+         (NOW - timedelta(days=200), "down", None))
+    uptime = rollup_uptime(db, "site")
+    assert uptime == {
+        "total_checks": 3, "operational_checks": 1, "degraded_checks": 1, "down_checks": 1,
+        "uptime_percentage": 33.33, "avg_response_time": 200, "min_response_time": 100, "max_response_time": 300,
+    }
+    assert rollup_uptime(db, "nobody")["uptime_percentage"] is None
+
+
+def test_old_bounds_widen_to_the_rollups_still_kept(db):
+    hour = (NOW - timedelta(days=10)).replace(minute=0)
+    day = (NOW - timedelta(days=200)).replace(hour=0, minute=0)
+    seed(db, (hour + timedelta(minutes=10), "operational", 10), (day + timedelta(hours=3), "down", None))
+    # Minute rollups are gone after two days and hourly ones after 120, so these bounds widen
+    assert rollup_uptime(db, "site", hour + timedelta(minutes=20), hour + timedelta(minutes=30))["total_checks"] == 1
+    assert rollup_uptime(db, "site", day + timedelta(hours=5), day + timedelta(hours=6))["total_checks"] == 1
+    assert rollup_uptime(db, "site", day + timedelta(days=1), hour)["total_checks"] == 0
+
+
+@pytest.mark.parametrize("offset", [timezone.utc, timezone(timedelta(hours=2))])
+def test_routes_convert_bounds_with_an_offset_to_local_time(app_module, local_tz, offset):
+    base = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+    conn = connect(app_module.DB_PATH)
+    seed(conn, (base, "operational", 100), (base + timedelta(hours=2), "down", None))
+    conn.close()
+
+    def iso(moment):
+        text = moment.astimezone(offset).isoformat()
+        return text.replace("+00:00", "Z")
+
+    client = app_module.app.test_client()
+    for moment, status in [(base, "operational"), (base + timedelta(hours=2), "down")]:
+        bounds = {"from": iso(moment - timedelta(minutes=30)), "to": iso(moment + timedelta(minutes=30))}
+        history = client.get("/api/history/site", query_string=bounds)
+        assert history.status_code == 200
+        assert [check["status"] for check in history.get_json()["history"]] == [status]
+        uptime = client.get("/api/uptime/site", query_string=bounds)
+        assert uptime.status_code == 200
+        assert uptime.get_json()["total_checks"] == 1
+
+
+def test_routes_reject_bad_bounds(app_module):
+    client = app_module.app.test_client()
+    for route in ("/api/history/site", "/api/uptime/site", "/api/history"):
+        assert client.get(route, query_string={"from": "last tuesday"}).status_code == 400